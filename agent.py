@@ -0,0 +1,304 @@
+"""
+NetEase Music World - Local Agent
+
+This module lets CLI commands reuse a resident process: the agent keeps
+a warm client (HTTP connection pool, parsed cookies, cached account
+state) per account and answers status and refresh requests over a Unix
+socket. The client side only needs the standard library, so a command
+talking to a running agent skips importing the HTTP and crypto stacks.
+
+Requests and responses are single lines of JSON.
+"""
+
+import contextlib
+import io
+import json
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger('NetEaseAgent')
+
+DEFAULT_SOCKET = 'netease_agent.sock'
+
+# Commands the agent runs on behalf of the CLI
+AGENT_COMMANDS = ('status', 'refresh')
+
+
+def account_key(cookie_file: str, store: Optional[str] = None) -> str:
+    """
+    Normalise how a single account is identified.
+
+    Ledger and checkpoint entries, and the agent's warm clients, are keyed
+    by this value, so the CLI, the agent, the fleet and an in-process run
+    must all derive it the same way.
+
+    Args:
+        cookie_file: Cookie file path, or the account name inside the store
+        store: Optional SQLite cookie database path
+
+    Returns:
+        The account name with a store, otherwise the absolute cookie path
+    """
+    return cookie_file if store else os.path.abspath(cookie_file)
+
+
+def call_agent(request: dict, socket_path: str = DEFAULT_SOCKET,
+               timeout: float = 120.0) -> Optional[dict]:
+    """
+    Send one request to a running agent.
+
+    Args:
+        request: Request dictionary with at least a 'command'
+        socket_path: Agent socket path
+        timeout: Seconds to wait for the response
+
+    Returns:
+        Response dictionary, or None if no agent answered (nothing is
+        listening, the socket is unusable, the agent timed out or broke
+        the connection), so the caller runs the command itself
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as stream:
+            line = stream.readline()
+        return json.loads(line) if line else None
+    except OSError as e:
+        logger.debug(f'No agent answered on {socket_path}: {e}')
+        return None
+    except ValueError as e:
+        logger.warning(f'Invalid agent response: {e}')
+        return None
+    finally:
+        sock.close()
+
+
+class _ThreadStdout(io.TextIOBase):
+    """
+    sys.stdout replacement sending each thread's output to its own buffer.
+
+    Threads that are not capturing write to the original stream, so
+    requests for different accounts can run at once without mixing their
+    reports.
+    """
+
+    _install_lock = threading.Lock()
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+
+    @classmethod
+    def install(cls) -> '_ThreadStdout':
+        """Replace sys.stdout with a _ThreadStdout unless one is in place."""
+        with cls._install_lock:
+            if not isinstance(sys.stdout, cls):
+                sys.stdout = cls(sys.stdout)
+            return sys.stdout
+
+    def _target(self):
+        return getattr(self._local, 'buffer', None) or self.stream
+
+    @property
+    def encoding(self) -> str:
+        return self._target().encoding
+
+    def isatty(self) -> bool:
+        return self._target().isatty()
+
+    def fileno(self) -> int:
+        return self.stream.fileno()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        return self._target().write(text)
+
+    def flush(self):
+        self._target().flush()
+
+    @contextlib.contextmanager
+    def capture(self) -> Iterator[io.StringIO]:
+        """Collect the current thread's output in a buffer."""
+        buffer = io.StringIO()
+        self._local.buffer = buffer
+        try:
+            yield buffer
+        finally:
+            self._local.buffer = None
+
+
+class AgentServer:
+    """
+    Unix socket server running CLI commands against warm clients.
+
+    Requests for the same account are handled one at a time, requests for
+    different accounts run concurrently. Commands print their report to
+    stdout, which is captured per thread and sent back to the CLI.
+    """
+
+    def __init__(self, app_factory: Callable[[str, Optional[str], str], object],
+                 socket_path: str = DEFAULT_SOCKET):
+        """
+        Initialize the agent.
+
+        Args:
+            app_factory: Callable creating the application object for
+                (cookie_file, store, ledger_file); the object must provide
+                check_status(), refresh_session(), cookies_version() and
+                close()
+            socket_path: Path of the Unix socket to listen on
+        """
+        self.app_factory = app_factory
+        self.socket_path = socket_path
+        self.running = True
+        self.apps: Dict[Tuple[str, Optional[str], str], object] = {}
+        # Stored-cookie version each warm app last saw
+        self._versions: Dict[Tuple[str, Optional[str], str], object] = {}
+        self._sock: Optional[socket.socket] = None
+        # Guards _locks; each account's lock serializes its requests
+        self._lock = threading.Lock()
+        self._locks: Dict[Tuple[str, Optional[str], str], threading.Lock] = {}
+
+    @staticmethod
+    def _key(request: dict) -> Tuple[str, Optional[str], str]:
+        """Key of the warm application serving a request."""
+        return (request['cookies'], request.get('store'), request['ledger'])
+
+    def app_for(self, request: dict):
+        """
+        Get the warm application for a request's account.
+
+        The application is rebuilt when the account's stored cookies were
+        changed by another process (e.g. a CLI login or logout), so the
+        agent never reports or saves over a stale jar.
+        """
+        key = self._key(request)
+        app = self.apps.get(key)
+        if app is not None and app.cookies_version() != self._versions.get(key):
+            logger.info(f'Cookies of {key[0]} changed on disk, reloading client')
+            app.close()
+            app = None
+        if app is None:
+            logger.info(f'Warming client for {key[0]}')
+            app = self.apps[key] = self.app_factory(*key)
+            self._versions[key] = app.cookies_version()
+        return app
+
+    def handle(self, request: dict) -> dict:
+        """
+        Run one request.
+
+        Args:
+            request: Request dictionary
+
+        Returns:
+            Response dictionary with 'code', 'result' and 'output'
+        """
+        command = request.get('command')
+        if command == 'ping':
+            return {'code': 200, 'result': True, 'output': ''}
+        if command not in AGENT_COMMANDS:
+            return {'code': -1, 'message': f'Unknown command: {command}'}
+
+        key = self._key(request)
+        with self._lock:
+            account_lock = self._locks.setdefault(key, threading.Lock())
+        with account_lock:
+            app = self.app_for(request)
+            app.force_sign_in = request.get('force_sign_in', False)
+            with _ThreadStdout.install().capture() as output:
+                if command == 'status':
+                    result = app.check_status()
+                else:
+                    result = app.refresh_session()
+            # The app's own saves are not external changes
+            self._versions[key] = app.cookies_version()
+        return {'code': 200, 'result': bool(result), 'output': output.getvalue()}
+
+    def _serve_connection(self, conn: socket.socket):
+        """Read one request line from a connection and answer it."""
+        with conn, conn.makefile('rwb') as stream:
+            line = stream.readline()
+            if not line:
+                return
+            try:
+                response = self.handle(json.loads(line))
+            except (ValueError, KeyError) as e:
+                response = {'code': -1, 'message': f'Invalid request: {e}'}
+            except Exception as e:
+                logger.error(f'Agent request failed: {e}')
+                response = {'code': -1, 'message': str(e)}
+            stream.write(json.dumps(response).encode('utf-8') + b'\n')
+            stream.flush()
+
+    def _bind(self):
+        """Bind the socket, replacing a stale one left by a dead agent."""
+        if os.path.exists(self.socket_path):
+            if call_agent({'command': 'ping'}, self.socket_path, timeout=1.0) is not None:
+                raise RuntimeError(f'An agent is already listening on {self.socket_path}')
+            os.remove(self.socket_path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(self.socket_path)
+        # Cookies are credentials; only the owner may talk to the agent
+        os.chmod(self.socket_path, 0o600)
+        self._sock.listen(16)
+        self._sock.settimeout(1.0)
+
+    def serve(self):
+        """Accept requests until stop() is called."""
+        self._bind()
+        try:
+            while self.running:
+                try:
+                    conn, _ = self._sock.accept()
+                except socket.timeout:
+                    continue
+                except OSError:
+                    if not self.running:
+                        break
+                    raise
+                conn.settimeout(None)
+                threading.Thread(
+                    target=self._serve_connection, args=(conn,),
+                    name='NetEaseAgentConn', daemon=True
+                ).start()
+        finally:
+            self._sock.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def stop(self):
+        """Stop accepting requests; safe to call from a signal handler."""
+        self.running = False
+
+    def run_interactive(self):
+        """Run the agent from the command line until Ctrl+C."""
+        print('=' * 50)
+        print('NetEase Music World - Agent Mode')
+        print('网易云音乐海外版 - 常驻代理模式')
+        print('=' * 50)
+        print(f'\n监听 / Listening on {self.socket_path}')
+        print('status 和 refresh 命令将自动通过代理执行')
+        print('status and refresh commands now run through the agent')
+        print('按 Ctrl+C 停止 / Press Ctrl+C to stop\n')
+
+        def signal_handler(signum, frame):
+            self.stop()
+
+        signal.signal(signal.SIGINT, signal_handler)
+        signal.signal(signal.SIGTERM, signal_handler)
+
+        self.serve()
+        print('代理已停止')
+        print('Agent stopped')
@@ -0,0 +1,413 @@
+"""
+NetEase Cloud Music Async API Client
+
+This module provides an asyncio-native API client mirroring
+NetEaseClient, so many accounts can share one event loop and one
+keep-alive connection pool.
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from http.cookies import Morsel
+from typing import Optional
+
+import aiohttp
+from yarl import URL
+
+from cookie_store import CookieStore, JsonFileCookieStore
+from crypto_utils import NetEaseCrypto
+from netease_client import NetEaseClient
+from transport import EndpointPolicy
+
+logger = logging.getLogger('AsyncNetEaseClient')
+
+
+def create_connector(limit: int = 100, limit_per_host: int = 0) -> aiohttp.TCPConnector:
+    """
+    Create a keep-alive connection pool to share between async clients.
+
+    Must be called while an event loop is running.
+
+    Args:
+        limit: Maximum number of simultaneous connections
+        limit_per_host: Maximum connections per host (0 for no limit)
+
+    Returns:
+        TCP connector to pass to AsyncNetEaseClient
+    """
+    return aiohttp.TCPConnector(limit=limit, limit_per_host=limit_per_host)
+
+
+class AsyncNetEaseClient:
+    """Asyncio NetEase Cloud Music API Client."""
+
+    BASE_URL = NetEaseClient.BASE_URL
+    CHINA_IP = NetEaseClient.CHINA_IP
+    DEFAULT_HEADERS = NetEaseClient.DEFAULT_HEADERS
+    DEFAULT_ENCODING = NetEaseClient.DEFAULT_ENCODING
+    ENDPOINT_ENCODINGS = NetEaseClient.ENDPOINT_ENCODINGS
+
+    # QR rendering is pure CPU work shared with the blocking client
+    generate_qr_code = NetEaseClient.generate_qr_code
+    print_qr_code = NetEaseClient.print_qr_code
+
+    # Same connect and read timeouts as the blocking client's Transport
+    DEFAULT_TIMEOUT = aiohttp.ClientTimeout(
+        sock_connect=EndpointPolicy().connect_timeout,
+        sock_read=EndpointPolicy().read_timeout
+    )
+
+    def __init__(self, cookie_file: str = 'cookies.json',
+                 connector: Optional[aiohttp.BaseConnector] = None,
+                 crypto=None, cookie_store: Optional[CookieStore] = None,
+                 timeout: Optional[aiohttp.ClientTimeout] = None):
+        """
+        Initialize the async NetEase client.
+
+        Args:
+            cookie_file: Path to the cookie storage file
+            connector: Optional connector shared between clients; the
+                client creates and owns its own when omitted
+            crypto: Optional encryption engine providing encrypt_request
+                (defaults to NetEaseCrypto)
+            cookie_store: Optional store persisting the cookie jar
+                (defaults to one JSON file per account)
+            timeout: Request timeouts (DEFAULT_TIMEOUT if omitted)
+        """
+        self.cookie_file = cookie_file
+        self.cookie_store = cookie_store or JsonFileCookieStore()
+        self.crypto = crypto or NetEaseCrypto
+        self._connector = connector
+        self.timeout = timeout or self.DEFAULT_TIMEOUT
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.cookie_jar = aiohttp.CookieJar()
+        self._load_cookies()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Per-account session on top of the (possibly shared) connector."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=self._connector,
+                connector_owner=self._connector is None,
+                cookie_jar=self.cookie_jar,
+                headers=self.DEFAULT_HEADERS,
+                timeout=self.timeout,
+            )
+        return self._session
+
+    async def close(self):
+        """Close the session. A shared connector is left open."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def _load_cookies(self):
+        """Load cookies from the cookie store if present."""
+        try:
+            cookies = self.cookie_store.load(self.cookie_file)
+        except (json.JSONDecodeError, IOError, sqlite3.Error) as e:
+            logger.warning(f'Failed to load cookies: {e}')
+            return
+
+        if cookies is not None:
+            if isinstance(cookies, dict):
+                # Legacy layout: name -> value only
+                self.cookie_jar.update_cookies(cookies, response_url=URL(self.BASE_URL))
+            else:
+                self.cookie_jar.update_cookies(
+                    [(attrs['name'], self._morsel(attrs)) for attrs in cookies],
+                    response_url=URL(self.BASE_URL)
+                )
+            logger.info('Cookies loaded successfully')
+
+    @staticmethod
+    def _morsel(attrs: dict) -> Morsel:
+        """Build a cookie jar entry from the attributes NetEaseClient saves."""
+        morsel = Morsel()
+        morsel.set(attrs['name'], attrs['value'], attrs['value'])
+        if attrs.get('domain'):
+            morsel['domain'] = attrs['domain']
+        morsel['path'] = attrs.get('path') or '/'
+        if attrs.get('expires'):
+            morsel['expires'] = formatdate(attrs['expires'], usegmt=True)
+        if attrs.get('secure'):
+            morsel['secure'] = True
+        return morsel
+
+    @staticmethod
+    def _expires(morsel: Morsel) -> Optional[int]:
+        """Get a cookie's expiry as a Unix timestamp, or None for a session cookie."""
+        if not morsel['expires']:
+            return None
+        try:
+            return int(parsedate_to_datetime(morsel['expires']).timestamp())
+        except (TypeError, ValueError):
+            return None
+
+    def _save_cookies(self):
+        """Save cookies, including domain, path and expiry, if they changed."""
+        try:
+            # Same layout NetEaseClient writes, so either client can load it
+            cookies = [
+                {
+                    'name': cookie.key,
+                    'value': cookie.value,
+                    'domain': cookie['domain'],
+                    'path': cookie['path'] or '/',
+                    'expires': self._expires(cookie),
+                    'secure': bool(cookie['secure']),
+                }
+                for cookie in self.cookie_jar
+            ]
+            if self.cookie_store.save(self.cookie_file, cookies):
+                logger.info('Cookies saved successfully')
+            else:
+                logger.debug('Cookies unchanged, skipping save')
+        except (IOError, sqlite3.Error) as e:
+            logger.error(f'Failed to save cookies: {e}')
+
+    async def _request_json(self, method: str, url: str, **kwargs) -> dict:
+        """
+        Make a request and decode the JSON response.
+
+        Args:
+            method: HTTP method
+            url: Full request URL
+            **kwargs: Extra arguments for aiohttp
+
+        Returns:
+            JSON response as dictionary
+        """
+        try:
+            async with self.session.request(method, url, **kwargs) as response:
+                response.raise_for_status()
+                return await response.json(content_type=None)
+        except json.JSONDecodeError as e:
+            logger.error(f'Failed to decode JSON response: {e}')
+            return {'code': -1, 'message': f'Invalid JSON response: {e}'}
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f'Request failed: {e}')
+            return {'code': -1, 'message': str(e)}
+
+    async def _request(self, endpoint: str, data: dict) -> dict:
+        """
+        Make a request using the encoding selected for the endpoint.
+
+        Args:
+            endpoint: API endpoint path
+            data: Request data dictionary
+
+        Returns:
+            JSON response as dictionary
+        """
+        encoding = self.ENDPOINT_ENCODINGS.get(endpoint, self.DEFAULT_ENCODING)
+        if encoding == 'eapi':
+            return await self._eapi_request(endpoint, data)
+        if encoding == 'api':
+            return await self._api_request(endpoint, data)
+        return await self._weapi_request(endpoint, data)
+
+    async def _weapi_request(self, endpoint: str, data: dict) -> dict:
+        """
+        Make a request to the weapi endpoint.
+
+        Args:
+            endpoint: API endpoint path
+            data: Request data dictionary
+
+        Returns:
+            JSON response as dictionary
+        """
+        url = f'{self.BASE_URL}/weapi{endpoint}'
+        encrypted = self.crypto.encrypt_request(json.dumps(data))
+        return await self._request_json('POST', url, data=encrypted)
+
+    async def _eapi_request(self, endpoint: str, data: dict) -> dict:
+        """
+        Make a request to the eapi endpoint.
+
+        Args:
+            endpoint: API endpoint path
+            data: Request data dictionary
+
+        Returns:
+            JSON response as dictionary
+        """
+        url = f'{self.BASE_URL}/eapi{endpoint}'
+        encrypted = NetEaseCrypto.eapi_encrypt(f'/api{endpoint}', json.dumps(data))
+        return await self._request_json('POST', url, data=encrypted)
+
+    async def _api_request(self, endpoint: str, data: Optional[dict] = None) -> dict:
+        """
+        Make a request to the api endpoint.
+
+        Args:
+            endpoint: API endpoint path
+            data: Optional request data dictionary
+
+        Returns:
+            JSON response as dictionary
+        """
+        url = f'{self.BASE_URL}/api{endpoint}'
+        if data:
+            return await self._request_json('POST', url, data=data)
+        return await self._request_json('GET', url)
+
+    async def get_qr_key(self) -> Optional[str]:
+        """
+        Get QR code key for login.
+
+        Returns:
+            QR code unique key or None if failed
+        """
+        result = await self._request('/login/qrcode/unikey', {'type': 1})
+
+        if result.get('code') == 200:
+            unikey = result.get('unikey')
+            logger.info(f'QR key obtained: {unikey}')
+            return unikey
+        else:
+            logger.error(f'Failed to get QR key: {result}')
+            return None
+
+    async def check_qr_status(self, qr_key: str) -> dict:
+        """
+        Check QR code scan status.
+
+        Args:
+            qr_key: QR code unique key
+
+        Returns:
+            Status dictionary, see NetEaseClient.check_qr_status
+        """
+        data = {'key': qr_key, 'type': 1}
+        return await self._request('/login/qrcode/client/login', data)
+
+    async def qr_login(self, timeout: int = 120, save_path: str = 'qrcode.png') -> bool:
+        """
+        Perform QR code login flow without blocking the event loop.
+
+        Args:
+            timeout: Maximum time to wait for login in seconds
+            save_path: Path to save QR code image
+
+        Returns:
+            True if login successful, False otherwise
+        """
+        qr_key = await self.get_qr_key()
+        if not qr_key:
+            return False
+
+        qr = NetEaseClient.build_qr(qr_key)
+        qr_path = self.generate_qr_code(qr_key, save_path, qr=qr)
+        print(f'\n请使用网易云音乐APP扫描二维码登录')
+        print(f'QR code saved to: {qr_path}')
+        print('Please scan the QR code with NetEase Music app\n')
+        self.print_qr_code(qr_key, qr=qr)
+
+        start_time = time.time()
+        scanned_message_shown = False
+        while time.time() - start_time < timeout:
+            status = await self.check_qr_status(qr_key)
+            code = status.get('code')
+
+            if code == 800:
+                logger.warning('QR code expired, please try again')
+                return False
+            elif code == 802 and not scanned_message_shown:
+                print('\n扫描成功，请在手机上确认登录...')
+                print('Scanned! Please confirm on your phone...')
+                scanned_message_shown = True
+            elif code == 803:
+                print('\n登录成功！')
+                print('Login successful!')
+                self._save_cookies()
+                return True
+
+            await asyncio.sleep(2)
+
+        logger.warning('Login timeout')
+        return False
+
+    async def get_user_account(self) -> dict:
+        """
+        Get current user account info.
+
+        Returns:
+            User account info dictionary
+        """
+        return await self._api_request('/nuser/account/get')
+
+    async def is_logged_in(self) -> bool:
+        """
+        Check if user is logged in.
+
+        Returns:
+            True if logged in, False otherwise
+        """
+        result = await self.get_user_account()
+        return result.get('code') == 200 and result.get('account') is not None
+
+    async def refresh_ip_session(self) -> bool:
+        """
+        Refresh the IP session to maintain overseas access.
+
+        Returns:
+            True if refresh successful, False otherwise
+        """
+        logger.info('Refreshing IP session...')
+
+        try:
+            async with self.session.get(
+                f'{self.BASE_URL}/discover',
+                headers={'X-Real-IP': self.CHINA_IP}
+            ) as response:
+                await response.read()
+                if response.status == 200:
+                    logger.info('IP session refreshed successfully')
+                    self._save_cookies()
+                    return True
+                else:
+                    logger.warning(f'IP refresh returned status: {response.status}')
+                    return False
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f'Failed to refresh IP session: {e}')
+            return False
+
+    async def daily_sign_in(self, sign_type: int = 0) -> dict:
+        """
+        Perform daily sign-in task.
+
+        Args:
+            sign_type: 0 for PC, 1 for mobile
+
+        Returns:
+            Sign-in result dictionary
+        """
+        result = await self._request('/point/dailyTask', {'type': sign_type})
+
+        if result.get('code') == 200:
+            logger.info(f'Daily sign-in successful (type={sign_type})')
+        elif result.get('code') == -2:
+            logger.info('Already signed in today')
+        else:
+            logger.warning(f'Daily sign-in failed: {result}')
+
+        return result
+
+    def logout(self):
+        """Clear session and cookies."""
+        self.cookie_jar.clear()
+        self.cookie_store.delete(self.cookie_file)
+        logger.info('Logged out successfully')
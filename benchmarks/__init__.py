@@ -0,0 +1,5 @@
+"""
+NetEase Music World - Benchmarks
+
+Run from the repository root, e.g. ``python -m benchmarks.bench_crypto``.
+"""
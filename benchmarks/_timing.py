@@ -0,0 +1,71 @@
+"""
+Timing helpers shared by the benchmark scripts.
+"""
+
+import time
+from typing import Callable, Dict, List
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile of sorted samples.
+
+    Args:
+        samples: Sorted samples
+        fraction: Percentile as a fraction, e.g. 0.99
+
+    Returns:
+        Sample at the requested rank
+    """
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, int(round(fraction * len(samples))) - 1))
+    return samples[index]
+
+
+def measure(func: Callable[[], object], iterations: int, warmup: int = 10) -> Dict[str, float]:
+    """
+    Time repeated calls of a function.
+
+    Args:
+        func: Function to call
+        iterations: Number of timed calls
+        warmup: Number of untimed calls made first
+
+    Returns:
+        Dictionary with ops_per_sec and p50/p90/p99 latencies in microseconds
+    """
+    for _ in range(warmup):
+        func()
+
+    samples = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+
+    samples.sort()
+    return {
+        'ops_per_sec': iterations / elapsed if elapsed else 0.0,
+        'p50_us': percentile(samples, 0.50) * 1e6,
+        'p90_us': percentile(samples, 0.90) * 1e6,
+        'p99_us': percentile(samples, 0.99) * 1e6,
+    }
+
+
+def report(name: str, stats: Dict[str, float]):
+    """
+    Print one benchmark result line.
+
+    Args:
+        name: Benchmark name
+        stats: Result of measure()
+    """
+    print(
+        f'{name:<40} {stats["ops_per_sec"]:>12,.0f} ops/s  '
+        f'p50 {stats["p50_us"]:>10,.1f} us  '
+        f'p90 {stats["p90_us"]:>10,.1f} us  '
+        f'p99 {stats["p99_us"]:>10,.1f} us'
+    )
@@ -0,0 +1,113 @@
+"""
+Benchmark the NetEaseClient request path against the local stub server.
+
+Reports per-call throughput and latency for each request encoding, the
+account lookup and a full account refresh, plus memory used per client.
+
+Usage:
+    python -m benchmarks.bench_client [-n ITERATIONS] [--accounts N]
+"""
+
+import argparse
+import copy
+import gc
+import logging
+import os
+import tempfile
+import tracemalloc
+
+from benchmarks._timing import measure, report
+from benchmarks.stub_server import StubServer
+from fleet import AccountFleet
+from netease_client import NetEaseClient
+from session_pool import SessionPool
+from transport import Transport
+
+
+def unlimited_transport() -> Transport:
+    """
+    Build a transport without the production rate and concurrency limits.
+
+    The default policies cap /point/dailyTask and /discover at 5 requests
+    per second, which would otherwise be all this benchmark measures.
+    """
+    policies = {}
+    for endpoint, policy in Transport.DEFAULT_POLICIES.items():
+        policies[endpoint] = copy.copy(policy)
+        policies[endpoint].rate = None
+    return Transport(policies=policies, max_concurrency=0)
+
+
+def make_client(base_url: str, cookie_file: str, **kwargs) -> NetEaseClient:
+    kwargs.setdefault('transport', unlimited_transport())
+    client = NetEaseClient(cookie_file, **kwargs)
+    client.BASE_URL = base_url
+    return client
+
+
+def memory_per_account(directory: str, accounts: int) -> float:
+    """
+    Measure the memory held by a fleet of accounts.
+
+    Args:
+        directory: Directory for cookie files
+        accounts: Number of clients to create
+
+    Returns:
+        Bytes allocated per account
+    """
+    paths = [os.path.join(directory, f'mem-{i}.json') for i in range(accounts)]
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    fleet = AccountFleet(paths, max_workers=4)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    fleet.crypto.stop()
+    fleet.step_executor.shutdown()
+    return (after - before) / accounts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the client request path')
+    parser.add_argument('-n', '--iterations', type=int, default=500)
+    parser.add_argument('--accounts', type=int, default=200,
+                        help='Number of clients for the memory measurement')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Artificial stub response delay in seconds')
+    args = parser.parse_args()
+
+    # Keep per-request log lines out of the measurements
+    logging.disable(logging.CRITICAL)
+
+    with StubServer(latency=args.latency) as stub, tempfile.TemporaryDirectory() as tmp:
+        client = make_client(stub.base_url, os.path.join(tmp, 'cookies.json'))
+        n = args.iterations
+
+        for encoding in NetEaseClient.ENCODINGS:
+            client.encodings['/point/dailyTask'] = encoding
+            report(f'{encoding} /point/dailyTask', measure(
+                lambda: client._request('/point/dailyTask', {'type': 0}), n))
+        report('get_user_account (uncached)', measure(
+            lambda: client.get_user_account(use_cache=False), n))
+        report('refresh_ip_session', measure(client.refresh_ip_session, n))
+
+        name = os.path.join(tmp, 'fleet.json')
+        fleet = AccountFleet([name], max_workers=1)
+        fleet.client_class = type('StubClient', (NetEaseClient,), {'BASE_URL': stub.base_url})
+        fleet.session_pool.close()
+        fleet.transport = unlimited_transport()
+        fleet.session_pool = SessionPool(fleet.transport, NetEaseClient.DEFAULT_HEADERS)
+        report('AccountFleet.refresh_account', measure(
+            lambda: fleet.refresh_account(name), max(1, n // 4)))
+        fleet.crypto.stop()
+        fleet.step_executor.shutdown()
+
+        per_account = memory_per_account(tmp, args.accounts)
+        print(f'{"memory per account":<40} {per_account:>12,.0f} bytes '
+              f'({args.accounts} accounts)')
+
+
+if __name__ == '__main__':
+    main()
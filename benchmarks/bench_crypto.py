@@ -0,0 +1,64 @@
+"""
+Benchmark the weapi and eapi encryption primitives in crypto_utils.
+
+Usage:
+    python -m benchmarks.bench_crypto [-n ITERATIONS]
+"""
+
+import argparse
+import itertools
+import json
+import time
+import uuid
+from urllib.parse import urlencode
+
+from benchmarks._timing import measure, report
+from crypto_utils import CryptoEngine, NetEaseCrypto
+
+# Distinct payloads, so no timing can come from a cached result
+PAYLOADS = [json.dumps({'key': str(uuid.uuid4()), 'type': i % 2}) for i in range(1024)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark crypto_utils')
+    parser.add_argument('-n', '--iterations', type=int, default=2000)
+    args = parser.parse_args()
+    n = args.iterations
+
+    payloads = itertools.cycle(PAYLOADS)
+    secret_key = NetEaseCrypto.create_secret_key()
+
+    report('aes_encrypt', measure(
+        lambda: NetEaseCrypto.aes_encrypt(
+            next(payloads).encode('utf-8'), NetEaseCrypto.PRESET_KEY), n))
+    report('rsa_encrypt', measure(
+        lambda: NetEaseCrypto.rsa_encrypt(
+            secret_key, NetEaseCrypto.PUBLIC_KEY, NetEaseCrypto.MODULUS), n))
+    report('encrypt_request', measure(
+        lambda: NetEaseCrypto.encrypt_request(next(payloads)), n))
+
+    # Pool sized for the whole run, filled before timing starts
+    engine = CryptoEngine(pool_size=n + 20)
+    while engine.stats()['pooled'] < n + 20:
+        time.sleep(0.01)
+    report('CryptoEngine.encrypt_request (pooled)', measure(
+        lambda: engine.encrypt_request(next(payloads)), n))
+    engine.stop()
+
+    engine = CryptoEngine(reuse_lifetime=3600, start=False)
+    report('CryptoEngine.encrypt_request (reuse)', measure(
+        lambda: engine.encrypt_request(next(payloads)), n))
+
+    # Same key pair for both, so only the body construction differs
+    pair = NetEaseCrypto.create_key_pair()
+    report('encrypt_with_key + urlencode', measure(
+        lambda: urlencode(NetEaseCrypto.encrypt_with_key(next(payloads), *pair)), n))
+    report('encrypt_request_body', measure(
+        lambda: NetEaseCrypto.encrypt_request_body(next(payloads), pair), n))
+
+    report('eapi_encrypt', measure(
+        lambda: NetEaseCrypto.eapi_encrypt('/api/point/dailyTask', next(payloads)), n))
+
+
+if __name__ == '__main__':
+    main()
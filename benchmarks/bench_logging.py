@@ -0,0 +1,83 @@
+"""
+Benchmark the cost of per-request logging from many worker threads.
+
+Compares the synchronous FileHandler the CLI uses with the daemon's
+queued LogPipeline, with and without sampling of per-request records.
+
+Usage:
+    python -m benchmarks.bench_logging [-n RECORDS] [--threads N]
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from log_pipeline import LOG_FORMAT, LogPipeline
+
+
+def emit(records: int, threads: int) -> float:
+    """
+    Log per-request records from several threads.
+
+    Args:
+        records: Records per thread
+        threads: Number of threads
+
+    Returns:
+        Microseconds per record, as seen by the logging threads
+    """
+    client_logger = logging.getLogger('NetEaseClient')
+
+    def worker():
+        for i in range(records):
+            client_logger.info(f'Daily sign-in successful (type={i & 1})')
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return (time.perf_counter() - start) / (records * threads) * 1e6
+
+
+def reset_root():
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark per-request logging')
+    parser.add_argument('-n', '--records', type=int, default=20000,
+                        help='Records logged per thread')
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        reset_root()
+        handler = logging.FileHandler(os.path.join(tmp, 'sync.log'), encoding='utf-8')
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        logging.getLogger().addHandler(handler)
+        logging.getLogger().setLevel(logging.INFO)
+        cost = emit(args.records, args.threads)
+        print(f'{"FileHandler":<40} {cost:>8.2f} us/record')
+
+        for label, per_second in (('LogPipeline (no sampling)', 0), ('LogPipeline (20/s sampling)', 20)):
+            reset_root()
+            pipeline = LogPipeline(os.path.join(tmp, f'queued-{per_second}.log'),
+                                   sample_per_second=per_second, console=False).start()
+            cost = emit(args.records, args.threads)
+            stats = pipeline.stats()
+            pipeline.stop()
+            print(f'{label:<40} {cost:>8.2f} us/record '
+                  f'(suppressed {stats["suppressed"]:,}, dropped {stats["dropped"]:,})')
+        reset_root()
+
+
+if __name__ == '__main__':
+    main()
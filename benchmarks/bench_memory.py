@@ -0,0 +1,127 @@
+"""
+Benchmark the memory a fleet holds per account.
+
+Compares one NetEaseClient with its own requests.Session per account
+against the fleet's compact AccountRecords sharing one SessionPool.
+Every account carries a realistic logged-in cookie jar served from an
+in-memory cookie store, so no files are written.
+
+Usage:
+    python -m benchmarks.bench_memory [--accounts N ...] [--clients N]
+"""
+
+import argparse
+import gc
+import logging
+import time
+import tracemalloc
+from typing import Callable, Optional
+
+from cookie_store import CookieStore, CookieData
+from fleet import AccountFleet
+from netease_client import NetEaseClient
+from session_pool import AccountRecord
+
+
+def make_jar(index: int) -> list:
+    """Build a logged-in cookie jar whose values differ per account."""
+    expires = int(time.time()) + 30 * 86400
+    seed = f'{index:08x}'
+
+    def cookie(name, value):
+        return {'name': name, 'value': value, 'domain': '.music.163.com',
+                'path': '/', 'expires': expires, 'secure': False}
+
+    return [
+        cookie('MUSIC_U', (seed * 45)[:360]),
+        cookie('__csrf', (seed * 4)[:32]),
+        cookie('NMTID', f'00O{seed}' * 5),
+        cookie('__remember_me', 'true'),
+    ]
+
+
+class SyntheticCookieStore(CookieStore):
+    """Read-only store generating every account's jar on demand."""
+
+    def accounts(self):
+        return []
+
+    def _read(self, account: str) -> Optional[CookieData]:
+        return make_jar(int(account.rsplit('-', 1)[-1]))
+
+    def _write(self, account: str, cookies: CookieData):
+        pass
+
+    def _remove(self, account: str):
+        pass
+
+
+def measure_bytes(build: Callable[[], object], accounts: int) -> float:
+    """
+    Measure the memory retained by an object graph.
+
+    Args:
+        build: Callable building the graph
+        accounts: Number of accounts in the graph
+
+    Returns:
+        Bytes retained per account
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    graph = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del graph
+    return (after - before) / accounts
+
+
+def build_records(accounts: int) -> dict:
+    records = {}
+    store = SyntheticCookieStore()
+    for i in range(accounts):
+        record = records[f'acct-{i}'] = AccountRecord(f'acct-{i}')
+        for attrs in store._read(f'acct-{i}'):
+            record.set(**attrs)
+    return records
+
+
+def build_clients(accounts: int) -> list:
+    store = SyntheticCookieStore()
+    return [NetEaseClient(f'acct-{i}', cookie_store=store) for i in range(accounts)]
+
+
+def build_fleet(accounts: int) -> AccountFleet:
+    fleet = AccountFleet([f'acct-{i}' for i in range(accounts)], max_workers=8,
+                         cookie_store=SyntheticCookieStore())
+    fleet.crypto.stop()
+    fleet.step_executor.shutdown()
+    return fleet
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark memory per account')
+    parser.add_argument('--accounts', type=int, nargs='+', default=[10000, 100000],
+                        help='Fleet sizes to measure')
+    parser.add_argument('--clients', type=int, default=10000,
+                        help='Accounts for the per-account session measurement')
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    per_client = measure_bytes(lambda: build_clients(args.clients), args.clients)
+    print(f'{"NetEaseClient + own session":<40} {per_client:>10,.0f} bytes/account '
+          f'({args.clients:,} accounts)')
+    for accounts in args.accounts:
+        per_record = measure_bytes(lambda: build_records(accounts), accounts)
+        per_fleet = measure_bytes(lambda: build_fleet(accounts), accounts)
+        print(f'{"AccountRecord":<40} {per_record:>10,.0f} bytes/account '
+              f'({accounts:,} accounts)')
+        print(f'{"AccountFleet (records + store + index)":<40} {per_fleet:>10,.0f} bytes/account '
+              f'({accounts:,} accounts)')
+
+
+if __name__ == '__main__':
+    main()
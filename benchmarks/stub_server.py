@@ -0,0 +1,148 @@
+"""
+Local stub of the NetEase endpoints used by NetEaseClient.
+
+The stub answers the weapi/api calls the client makes with canned
+responses, so the request path can be benchmarked without touching
+music.163.com. Run it standalone with ``python -m benchmarks.stub_server``.
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from crypto_utils import NetEaseCrypto
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Request handler emulating the NetEase endpoints."""
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; avoid Nagle stalls
+    disable_nagle_algorithm = True
+
+    ACCOUNT = {
+        'code': 200,
+        'account': {'id': 10001, 'userName': 'stub'},
+        'profile': {'userId': 10001, 'nickname': 'stub', 'vipType': 0},
+    }
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str = 'application/json',
+              cookie: str = None):
+        latency = self.server.latency
+        if latency:
+            time.sleep(latency)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if cookie:
+            self.send_header('Set-Cookie', cookie)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, data: dict):
+        self._send(200, json.dumps(data).encode('utf-8'))
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/api/nuser/account/get':
+            self._send_json(self.ACCOUNT)
+        elif path == '/discover':
+            self._send(200, b'<html></html>', 'text/html',
+                       cookie=f'__csrf=stub{int(time.time())}; Path=/')
+        else:
+            self._send(404, b'{}')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qs(self.rfile.read(length).decode('utf-8'))
+        path = self.path.split('?', 1)[0]
+
+        if path.startswith('/weapi/') and not ('params' in form and 'encSecKey' in form):
+            self._send_json({'code': 400, 'message': 'missing weapi fields'})
+            return
+        if path.startswith('/eapi/'):
+            try:
+                api_path, _ = NetEaseCrypto.eapi_decrypt(form['params'][0])
+            except (KeyError, ValueError):
+                self._send_json({'code': 400, 'message': 'invalid eapi params'})
+                return
+            if api_path != '/api' + path[len('/eapi'):]:
+                self._send_json({'code': 400, 'message': 'eapi path mismatch'})
+                return
+        # The same handlers answer every encoding of an endpoint
+        endpoint = '/' + path.split('/', 2)[-1]
+
+        if endpoint == '/login/qrcode/unikey':
+            self._send_json({'code': 200, 'unikey': 'stub-unikey'})
+        elif endpoint == '/login/qrcode/client/login':
+            self._send_json({'code': 801, 'message': 'waiting for scan'})
+        elif endpoint == '/point/dailyTask':
+            self._send_json({'code': 200, 'point': 3})
+        elif endpoint == '/nuser/account/get':
+            self._send_json(self.ACCOUNT)
+        else:
+            self._send(404, b'{}')
+
+
+class StubServer:
+    """Threaded stub server running in the background."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0):
+        """
+        Initialize the stub server.
+
+        Args:
+            host: Address to bind
+            port: Port to bind (0 picks a free port)
+            latency: Artificial delay in seconds added to every response
+        """
+        self.httpd = ThreadingHTTPServer((host, port), StubHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.latency = latency
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        """Base URL to assign to NetEaseClient.BASE_URL."""
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'StubServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='NetEase API stub server')
+    parser.add_argument('--port', type=int, default=8163)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Artificial response delay in seconds')
+    args = parser.parse_args()
+
+    server = StubServer(port=args.port, latency=args.latency)
+    print(f'Stub server listening on {server.base_url}')
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+NetEase Music World - Daemon Checkpoint
+
+This module persists when every account was last refreshed and signed
+in and when it is next due, so a restarted daemon resumes the schedule
+instead of refreshing every account at once and counting intervals from
+process start.
+
+The checkpoint is a JsonJournal: every update appends one line, so
+writes cost the same for ten accounts or a hundred thousand, and the
+journal is compacted into one line per account once it grows.
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from journal import JsonJournal
+
+logger = logging.getLogger('NetEaseCheckpoint')
+
+DEFAULT_CHECKPOINT = 'daemon_checkpoint.jsonl'
+
+# Fields recorded per account, as Unix timestamps
+CHECKPOINT_FIELDS = ('last_refresh', 'last_sign_in', 'next_due')
+
+
+class DaemonCheckpoint:
+    """Append-only record of per-account refresh times."""
+
+    def __init__(self, path: str = DEFAULT_CHECKPOINT):
+        """
+        Initialize the checkpoint, loading any existing journal.
+
+        Args:
+            path: Journal file path
+        """
+        self.path = path
+        self._entries: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._journal = JsonJournal(path, lambda update: update['account'], name='checkpoint')
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _load(self):
+        """Replay the journal; later lines override earlier ones."""
+        self._journal.replay(self._apply)
+        if self._entries:
+            logger.info(f'Loaded checkpoint of {len(self._entries)} accounts')
+
+    def _apply(self, update: dict):
+        """Apply one journal line to the entries."""
+        entry = self._entries.setdefault(update['account'], {})
+        entry.update({field: update[field] for field in CHECKPOINT_FIELDS if field in update})
+
+    def get(self, account: str, field: str) -> Optional[float]:
+        """
+        Get a recorded timestamp.
+
+        Args:
+            account: Account key
+            field: One of CHECKPOINT_FIELDS
+
+        Returns:
+            Unix timestamp, or None if never recorded
+        """
+        with self._lock:
+            return self._entries.get(account, {}).get(field)
+
+    def next_due(self, account: str) -> Optional[float]:
+        """
+        Get when an account's next run is due.
+
+        Args:
+            account: Account key
+
+        Returns:
+            Unix timestamp, or None if the account has no checkpoint
+        """
+        return self.get(account, 'next_due')
+
+    def resume_delay(self, account: str, now: Optional[float] = None) -> Optional[float]:
+        """
+        Get the seconds until an account's recorded next run.
+
+        Args:
+            account: Account key
+            now: Unix timestamp to compare against (current time if omitted)
+
+        Returns:
+            Seconds until due (0 if overdue), or None without a checkpoint
+        """
+        due = self.next_due(account)
+        if due is None:
+            return None
+        return max(0.0, due - (time.time() if now is None else now))
+
+    def record(self, account: str, **fields: Optional[float]):
+        """
+        Record timestamps for an account and append them to the journal.
+
+        Args:
+            account: Account key
+            **fields: Timestamps keyed by CHECKPOINT_FIELDS; None values
+                are ignored
+        """
+        update = {field: value for field, value in fields.items() if value is not None}
+        unknown = set(update) - set(CHECKPOINT_FIELDS)
+        if unknown:
+            raise ValueError(f'Unknown checkpoint fields: {sorted(unknown)}')
+        if not update:
+            return
+        with self._lock:
+            self._entries.setdefault(account, {}).update(update)
+            accounts = len(self._entries)
+        try:
+            self._journal.append({'account': account, **update}, accounts)
+        except IOError as e:
+            logger.error(f'Failed to save daemon checkpoint: {e}')
+
+    def merge(self, other: 'DaemonCheckpoint'):
+        """
+        Record every timestamp of another checkpoint that is newer than ours.
+
+        Args:
+            other: Checkpoint to merge, e.g. one written by a single shard
+        """
+        with other._lock:
+            entries = {account: dict(entry) for account, entry in other._entries.items()}
+        for account, entry in entries.items():
+            with self._lock:
+                current = dict(self._entries.get(account, {}))
+            newer = {
+                field: value for field, value in entry.items()
+                if field not in current or value > current[field]
+            }
+            if newer:
+                self.record(account, **newer)
+
+    def close(self):
+        """Close the journal file."""
+        self._journal.close()
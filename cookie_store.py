@@ -0,0 +1,270 @@
+"""
+NetEase Music World - Cookie Stores
+
+This module provides pluggable persistence for account cookie jars:
+one JSON file per account, or a single SQLite database holding many
+accounts. Both only write jars that changed and write atomically.
+"""
+
+import copy
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Union
+
+logger = logging.getLogger('NetEaseCookieStore')
+
+SQLITE_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
+
+# A jar is either a list of cookie attribute dicts or a legacy name -> value dict
+CookieData = Union[list, dict]
+
+
+class CookieStore:
+    """
+    Base class for cookie stores.
+
+    Subclasses implement _read, _write and _remove. The base class keeps
+    the last loaded or saved jar of every account, so save() can skip
+    jars that did not change, and load_all() can bulk-load accounts that
+    later load() calls are served from.
+    """
+
+    def __init__(self):
+        self._snapshots: Dict[str, CookieData] = {}
+        self._lock = threading.Lock()
+
+    def load(self, account: str) -> Optional[CookieData]:
+        """
+        Load an account's cookies.
+
+        Args:
+            account: Account key
+
+        Returns:
+            Cookie data, or None if the account has no stored jar
+        """
+        with self._lock:
+            if account in self._snapshots:
+                return copy.deepcopy(self._snapshots[account])
+        cookies = self._read(account)
+        if cookies is not None:
+            with self._lock:
+                self._snapshots[account] = copy.deepcopy(cookies)
+        return cookies
+
+    def load_all(self, accounts: Optional[Iterable[str]] = None) -> Dict[str, CookieData]:
+        """
+        Bulk-load cookies for many accounts.
+
+        Args:
+            accounts: Account keys to load (all stored accounts if omitted)
+
+        Returns:
+            Mapping of account key to cookie data
+        """
+        if accounts is None:
+            accounts = self.accounts()
+        loaded = {}
+        for account in accounts:
+            cookies = self.load(account)
+            if cookies is not None:
+                loaded[account] = cookies
+        return loaded
+
+    def save(self, account: str, cookies: CookieData) -> bool:
+        """
+        Save an account's cookies if they changed since the last load/save.
+
+        Args:
+            account: Account key
+            cookies: Cookie data
+
+        Returns:
+            True if the jar was written, False if it was unchanged
+        """
+        with self._lock:
+            if self._snapshots.get(account) == cookies:
+                return False
+        self._write(account, cookies)
+        with self._lock:
+            self._snapshots[account] = copy.deepcopy(cookies)
+        return True
+
+    def delete(self, account: str):
+        """
+        Delete an account's stored cookies.
+
+        Args:
+            account: Account key
+        """
+        with self._lock:
+            self._snapshots.pop(account, None)
+        self._remove(account)
+
+    def version(self, account: str) -> Optional[object]:
+        """
+        Get a cheap token that changes whenever an account's stored jar changes.
+
+        Lets a long-lived process notice jars written by another process.
+
+        Args:
+            account: Account key
+
+        Returns:
+            Comparable token, or None if the account has no stored jar
+        """
+        raise NotImplementedError
+
+    def accounts(self) -> List[str]:
+        """
+        List stored account keys.
+
+        Returns:
+            Sorted list of account keys
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release any resources held by the store."""
+
+    def _read(self, account: str) -> Optional[CookieData]:
+        raise NotImplementedError
+
+    def _write(self, account: str, cookies: CookieData):
+        raise NotImplementedError
+
+    def _remove(self, account: str):
+        raise NotImplementedError
+
+
+class JsonFileCookieStore(CookieStore):
+    """Cookie store keeping one JSON file per account; the key is its path."""
+
+    def accounts(self) -> List[str]:
+        with self._lock:
+            return sorted(self._snapshots)
+
+    def version(self, account: str) -> Optional[object]:
+        try:
+            stat = os.stat(account)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def _read(self, account: str) -> Optional[CookieData]:
+        if not os.path.exists(account):
+            return None
+        with open(account, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write(self, account: str, cookies: CookieData):
+        # Write to a temporary file next to the target, then rename over it
+        directory = os.path.dirname(os.path.abspath(account))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.cookies-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(cookies, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, account)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _remove(self, account: str):
+        if os.path.exists(account):
+            os.remove(account)
+
+
+class SQLiteCookieStore(CookieStore):
+    """Cookie store keeping every account's jar in one SQLite database."""
+
+    def __init__(self, path: str):
+        """
+        Initialize the store.
+
+        Args:
+            path: SQLite database file path
+        """
+        super().__init__()
+        self.path = path
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS cookies ('
+            'account TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)'
+        )
+        self._conn.commit()
+
+    def load_all(self, accounts: Optional[Iterable[str]] = None) -> Dict[str, CookieData]:
+        """Bulk-load accounts with a single query."""
+        with self._db_lock:
+            rows = self._conn.execute('SELECT account, data FROM cookies').fetchall()
+        loaded = {}
+        for account, data in rows:
+            try:
+                loaded[account] = json.loads(data)
+            except json.JSONDecodeError as e:
+                logger.warning(f'Skipping corrupt cookies for {account}: {e}')
+        if accounts is not None:
+            wanted = set(accounts)
+            loaded = {name: cookies for name, cookies in loaded.items() if name in wanted}
+        with self._lock:
+            for account, cookies in loaded.items():
+                self._snapshots[account] = copy.deepcopy(cookies)
+        return loaded
+
+    def accounts(self) -> List[str]:
+        with self._db_lock:
+            rows = self._conn.execute('SELECT account FROM cookies ORDER BY account').fetchall()
+        return [row[0] for row in rows]
+
+    def version(self, account: str) -> Optional[object]:
+        with self._db_lock:
+            row = self._conn.execute(
+                'SELECT updated_at FROM cookies WHERE account = ?', (account,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        with self._db_lock:
+            self._conn.close()
+
+    def _read(self, account: str) -> Optional[CookieData]:
+        with self._db_lock:
+            row = self._conn.execute(
+                'SELECT data FROM cookies WHERE account = ?', (account,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _write(self, account: str, cookies: CookieData):
+        data = json.dumps(cookies, ensure_ascii=False, separators=(',', ':'))
+        with self._db_lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO cookies (account, data, updated_at) VALUES (?, ?, ?)',
+                (account, data, time.time())
+            )
+
+    def _remove(self, account: str):
+        with self._db_lock, self._conn:
+            self._conn.execute('DELETE FROM cookies WHERE account = ?', (account,))
+
+
+def open_cookie_store(path: Optional[str] = None) -> CookieStore:
+    """
+    Open the cookie store for a path.
+
+    Args:
+        path: SQLite database path, or None for per-account JSON files
+
+    Returns:
+        Cookie store instance
+    """
+    if path:
+        return SQLiteCookieStore(path)
+    return JsonFileCookieStore()
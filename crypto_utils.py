@@ -9,7 +9,23 @@ import base64
 import binascii
 import hashlib
 import os
-from Crypto.Cipher import AES
+import threading
+import time
+from collections import deque
+from typing import Tuple
+
+# Crypto.Cipher.AES is imported on first use; commands that never encrypt
+# (e.g. the account status lookup) skip loading pycryptodome
+_AES = None
+
+
+def _aes():
+    """Return the pycryptodome AES module, importing it on first use."""
+    global _AES
+    if _AES is None:
+        from Crypto.Cipher import AES
+        _AES = AES
+    return _AES
 
 
 class NetEaseCrypto:
@@ -19,6 +35,9 @@ class NetEaseCrypto:
     IV = b'0102030405060708'
     PRESET_KEY = b'0CoJUm6Qyw8W8jud'
     PUBLIC_KEY = '010001'
+    # eapi: AES-128-ECB with a fixed key over the path, payload and digest
+    EAPI_KEY = b'e82ckenh8dichen8'
+    EAPI_SEPARATOR = '-36cd479b6b5-'
     # Correct RSA modulus for NetEase Cloud Music weapi encryption
     MODULUS = (
         '00e0b509f6259df8642dbc35662901477df22677ec152b5ff68ace615bb7'
@@ -38,10 +57,25 @@ class NetEaseCrypto:
         """AES encrypt text with the given key."""
         pad = 16 - len(text) % 16
         text = text + bytes([pad] * pad)
+        AES = _AES or _aes()
         cipher = AES.new(key, AES.MODE_CBC, NetEaseCrypto.IV)
         encrypted = cipher.encrypt(text)
         return base64.b64encode(encrypted)
 
+    @staticmethod
+    def aes_ecb_encrypt(text: bytes, key: bytes) -> bytes:
+        """AES-ECB encrypt text with PKCS#7 padding, returning raw bytes."""
+        pad = 16 - len(text) % 16
+        AES = _AES or _aes()
+        return AES.new(key, AES.MODE_ECB).encrypt(text + bytes([pad] * pad))
+
+    @staticmethod
+    def aes_ecb_decrypt(data: bytes, key: bytes) -> bytes:
+        """AES-ECB decrypt data and strip the PKCS#7 padding."""
+        AES = _AES or _aes()
+        text = AES.new(key, AES.MODE_ECB).decrypt(data)
+        return text[:-text[-1]]
+
     @staticmethod
     def rsa_encrypt(text: bytes, pub_key: str, modulus: str) -> str:
         """RSA encrypt text with the given public key and modulus."""
@@ -60,26 +94,270 @@ class NetEaseCrypto:
         Returns:
             Dictionary containing 'params' and 'encSecKey'
         """
-        secret_key = NetEaseCrypto.create_secret_key()
+        secret_key, enc_sec_key = NetEaseCrypto.create_key_pair()
+        return NetEaseCrypto.encrypt_with_key(data, secret_key, enc_sec_key)
+
+    @staticmethod
+    def encrypt_request_body(data: str, key_pair: Tuple[bytes, str] = None) -> bytes:
+        """
+        Encrypt request data straight into a form-urlencoded weapi body.
         
-        # First AES encryption with preset key
-        params = NetEaseCrypto.aes_encrypt(data.encode('utf-8'), NetEaseCrypto.PRESET_KEY)
-        # Second AES encryption with random key
-        params = NetEaseCrypto.aes_encrypt(params, secret_key)
+        Produces the same bytes requests would send for the dictionary
+        encrypt_request returns, without building the dictionary, decoding
+        the ciphertext to str or urlencoding it again. The ciphertext is
+        written into a preallocated buffer and only the three base64
+        characters that need it are percent-encoded.
         
-        # RSA encrypt the secret key
+        Args:
+            data: JSON string to encrypt
+            key_pair: Optional (secret_key, encSecKey) to use
+            
+        Returns:
+            Body bytes of the form ``params=...&encSecKey=...``
+        """
+        secret_key, enc_sec_key = key_pair or NetEaseCrypto.create_key_pair()
+        first = NetEaseCrypto.aes_encrypt(data.encode('utf-8'), NetEaseCrypto.PRESET_KEY)
+        size = len(first)
+        pad = 16 - size % 16
+        buffer = bytearray(size + pad)
+        buffer[:size] = first
+        buffer[size:] = bytes((pad,)) * pad
+        AES = _AES or _aes()
+        AES.new(secret_key, AES.MODE_CBC, NetEaseCrypto.IV).encrypt(buffer, output=buffer)
+        params = binascii.b2a_base64(buffer, newline=False)
+        return b''.join((
+            b'params=',
+            params.replace(b'+', b'%2B').replace(b'/', b'%2F').replace(b'=', b'%3D'),
+            b'&encSecKey=',
+            enc_sec_key.encode('ascii'),
+        ))
+
+    @staticmethod
+    def create_key_pair() -> Tuple[bytes, str]:
+        """
+        Generate a random secret key together with its RSA-encrypted form.
+        
+        Returns:
+            Tuple of (secret_key, encSecKey)
+        """
+        secret_key = NetEaseCrypto.create_secret_key()
         enc_sec_key = NetEaseCrypto.rsa_encrypt(
             secret_key,
             NetEaseCrypto.PUBLIC_KEY,
             NetEaseCrypto.MODULUS
         )
+        return secret_key, enc_sec_key
+
+    @staticmethod
+    def encrypt_with_key(data: str, secret_key: bytes, enc_sec_key: str) -> dict:
+        """
+        Encrypt request data with an existing key pair.
+        
+        Args:
+            data: JSON string to encrypt
+            secret_key: Random secret key used for the second AES pass
+            enc_sec_key: RSA-encrypted form of secret_key
+            
+        Returns:
+            Dictionary containing 'params' and 'encSecKey'
+        """
+        # First AES encryption with preset key
+        params = NetEaseCrypto.aes_encrypt(data.encode('utf-8'), NetEaseCrypto.PRESET_KEY)
+        # Second AES encryption with random key
+        params = NetEaseCrypto.aes_encrypt(params, secret_key)
         
         return {
             'params': params.decode('utf-8'),
             'encSecKey': enc_sec_key
         }
 
+    @staticmethod
+    def eapi_encrypt(path: str, data: str) -> dict:
+        """
+        Encrypt request data for the eapi endpoints.
+        
+        Unlike weapi there is no random key and no RSA step: a single
+        AES-ECB pass with the fixed eapi key over the request path, the
+        payload and their MD5 digest.
+        
+        Args:
+            path: Request path the server checks the digest against,
+                e.g. '/api/point/dailyTask'
+            data: JSON string to encrypt
+            
+        Returns:
+            Dictionary containing 'params'
+        """
+        digest = NetEaseCrypto.md5(f'nobody{path}use{data}md5forencrypt')
+        separator = NetEaseCrypto.EAPI_SEPARATOR
+        message = f'{path}{separator}{data}{separator}{digest}'
+        encrypted = NetEaseCrypto.aes_ecb_encrypt(message.encode('utf-8'), NetEaseCrypto.EAPI_KEY)
+        return {'params': encrypted.hex().upper()}
+
+    @staticmethod
+    def eapi_decrypt(params: str) -> Tuple[str, str]:
+        """
+        Decrypt eapi request params.
+        
+        Args:
+            params: Hex 'params' value as produced by eapi_encrypt
+            
+        Returns:
+            Tuple of (path, JSON string)
+            
+        Raises:
+            ValueError: If the params are malformed or the digest does not match
+        """
+        message = NetEaseCrypto.aes_ecb_decrypt(
+            bytes.fromhex(params), NetEaseCrypto.EAPI_KEY
+        ).decode('utf-8')
+        parts = message.split(NetEaseCrypto.EAPI_SEPARATOR)
+        if len(parts) != 3:
+            raise ValueError('Malformed eapi params')
+        path, data, digest = parts
+        if NetEaseCrypto.md5(f'nobody{path}use{data}md5forencrypt') != digest:
+            raise ValueError('eapi digest mismatch')
+        return path, data
+
     @staticmethod
     def md5(text: str) -> str:
         """Calculate MD5 hash of text."""
         return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+
+class CryptoEngine:
+    """
+    weapi encryption engine backed by a pool of precomputed key pairs.
+
+    The RSA exponentiation in NetEaseCrypto.rsa_encrypt dominates the cost
+    of encrypt_request. This engine keeps a bounded pool of
+    (secret_key, encSecKey) pairs that a background thread refills, so the
+    request path only pays for the two AES passes. When reuse_lifetime is
+    set, a pair is reused for every request until it is that many seconds
+    old instead of being consumed once.
+    """
+
+    def __init__(self, pool_size: int = 32, reuse_lifetime: float = 0.0,
+                 start: bool = True):
+        """
+        Initialize the engine.
+
+        Args:
+            pool_size: Maximum number of precomputed key pairs kept ready
+            reuse_lifetime: Seconds a key pair may be reused (0 disables reuse)
+            start: Start the background refill thread immediately
+        """
+        self.pool_size = max(1, pool_size)
+        self.reuse_lifetime = reuse_lifetime
+        self.hits = 0
+        self.misses = 0
+        self.reuses = 0
+        self._pool = deque()
+        self._current = None
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+        if start:
+            self.start()
+
+    def start(self):
+        """Start the background refill thread."""
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped = False
+            self._thread = threading.Thread(
+                target=self._refill_loop, name='CryptoEngineRefill', daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        """Stop the background refill thread."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _refill_loop(self):
+        """Keep the pool topped up until stopped."""
+        while True:
+            with self._cond:
+                while not self._stopped and len(self._pool) >= self.pool_size:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+            # Generate outside the lock so callers are never blocked on RSA
+            pair = NetEaseCrypto.create_key_pair()
+            with self._cond:
+                self._pool.append((pair, time.monotonic()))
+
+    def acquire_key(self) -> Tuple[bytes, str]:
+        """
+        Take a key pair from the pool, generating one inline on a miss.
+
+        Returns:
+            Tuple of (secret_key, encSecKey)
+        """
+        now = time.monotonic()
+        with self._cond:
+            if self._current is not None and now - self._current[1] < self.reuse_lifetime:
+                self.reuses += 1
+                return self._current[0]
+            if self._pool:
+                entry = self._pool.popleft()
+                self.hits += 1
+                self._cond.notify()
+            else:
+                entry = None
+                self.misses += 1
+
+        if entry is None:
+            entry = (NetEaseCrypto.create_key_pair(), time.monotonic())
+
+        if self.reuse_lifetime > 0:
+            # Start the reuse window when the pair is first handed out
+            with self._cond:
+                self._current = (entry[0], time.monotonic())
+        return entry[0]
+
+    def encrypt_request(self, data: str) -> dict:
+        """
+        Encrypt request data for NetEase API using a pooled key pair.
+
+        Args:
+            data: JSON string to encrypt
+
+        Returns:
+            Dictionary containing 'params' and 'encSecKey'
+        """
+        secret_key, enc_sec_key = self.acquire_key()
+        return NetEaseCrypto.encrypt_with_key(data, secret_key, enc_sec_key)
+
+    def encrypt_request_body(self, data: str) -> bytes:
+        """
+        Encrypt request data into a weapi form body using a pooled key pair.
+
+        Args:
+            data: JSON string to encrypt
+
+        Returns:
+            Body bytes of the form ``params=...&encSecKey=...``
+        """
+        return NetEaseCrypto.encrypt_request_body(data, key_pair=self.acquire_key())
+
+    def stats(self) -> dict:
+        """
+        Get pool counters.
+
+        Returns:
+            Dictionary with hits, misses, reuses and current pool size
+        """
+        with self._cond:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'reuses': self.reuses,
+                'pooled': len(self._pool),
+            }
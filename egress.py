@@ -0,0 +1,275 @@
+"""
+NetEase Music World - Egress Pool
+
+This module spreads accounts over several China IPs presented in the
+X-Real-IP header, each optionally reached through its own upstream
+proxy. Every entry has its own transport (connection pool, circuit
+breaker and rate limits), so one bad address or proxy cannot stall the
+others, and keeps running success and latency scores fed back from the
+requests sent through it.
+Accounts stick to their entry and are moved only when it falls well
+behind the best one, so traffic drifts toward fast, healthy entries
+without accounts hopping between addresses.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import threading
+import time
+from typing import Dict, List, Optional
+
+import requests
+
+import metrics
+from session_pool import SessionPool
+from transport import Transport
+
+logger = logging.getLogger('NetEaseEgress')
+
+
+class EgressEntry:
+    """One X-Real-IP address, optionally behind an upstream proxy."""
+
+    # Weight of the newest sample in the running scores
+    ALPHA = 0.2
+    # Latency assumed until any entry has answered a request
+    DEFAULT_LATENCY = 0.5
+    # Running success rate below which an entry counts as unhealthy
+    HEALTHY_SUCCESS_RATE = 0.5
+    # Seconds for an idle entry's failures to count half as much, so an
+    # entry that lost its traffic is eventually tried again
+    RECOVERY_HALF_LIFE = 600.0
+
+    def __init__(self, ip: str, proxy: Optional[str] = None,
+                 transport: Optional[Transport] = None):
+        """
+        Initialize an entry.
+
+        Args:
+            ip: Address sent in the X-Real-IP header
+            proxy: Optional upstream proxy URL, e.g. 'http://host:3128'
+            transport: Transport of the entry's requests (a new one with a
+                single host pool is created if omitted)
+        """
+        self.ip = ip
+        self.proxy = proxy
+        self.transport = transport or Transport(pool_connections=1)
+        self.sessions: Optional[SessionPool] = None
+        self.requests = 0
+        self.failures = 0
+        self._success_rate = 1.0
+        self._last_sample = time.monotonic()
+        self.latency: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def label(self) -> str:
+        """Name of the entry in logs and metrics."""
+        return f'{self.ip} via {self.proxy}' if self.proxy else self.ip
+
+    def mount(self, session: requests.Session):
+        """
+        Route a session through this entry's connection pool and proxy.
+
+        Args:
+            session: Session to configure
+        """
+        self.transport.mount(session)
+        if self.proxy:
+            session.proxies.update({'http': self.proxy, 'https': self.proxy})
+
+    def record(self, ok: bool, latency: float):
+        """
+        Feed back the outcome of a request sent through this entry.
+
+        Args:
+            ok: Whether the request succeeded
+            latency: Request duration in seconds
+        """
+        with self._lock:
+            self.requests += 1
+            if not ok:
+                self.failures += 1
+            current = self.success_rate
+            self._success_rate = current + self.ALPHA * ((1.0 if ok else 0.0) - current)
+            self._last_sample = time.monotonic()
+            if ok:
+                self.latency = latency if self.latency is None else (
+                    self.latency + self.ALPHA * (latency - self.latency)
+                )
+        metrics.EGRESS_REQUEST_TOTAL.inc(self.ip, 'success' if ok else 'failure')
+
+    @property
+    def success_rate(self) -> float:
+        """Running success rate, recovering toward 1.0 while idle."""
+        idle = time.monotonic() - self._last_sample
+        return 1.0 - (1.0 - self._success_rate) * 0.5 ** (idle / self.RECOVERY_HALF_LIFE)
+
+    @property
+    def healthy(self) -> bool:
+        """True while the running success rate is acceptable."""
+        return self.success_rate >= self.HEALTHY_SUCCESS_RATE
+
+    def weight(self, prior_latency: Optional[float] = None) -> float:
+        """
+        Score the entry for traffic share: success rate squared over latency.
+
+        Args:
+            prior_latency: Latency assumed while the entry has none
+                measured (DEFAULT_LATENCY if omitted)
+
+        Returns:
+            Positive weight, higher is better
+        """
+        latency = self.latency
+        if latency is None:
+            latency = self.DEFAULT_LATENCY if prior_latency is None else prior_latency
+        return max(self.success_rate, 0.01) ** 2 / max(latency, 0.001)
+
+    def stats(self) -> dict:
+        """Summarize the entry's scores for logging."""
+        return {
+            'requests': self.requests,
+            'failures': self.failures,
+            'success_rate': round(self.success_rate, 3),
+            'latency_ms': None if self.latency is None else round(self.latency * 1000, 1),
+        }
+
+
+class EgressPool:
+    """
+    Sticky assignment of accounts to egress entries.
+
+    A new account gets an entry by weighted rendezvous hashing over the
+    healthy entries: each entry scores the account by a stable hash of
+    both, scaled by the entry's weight, and the best score wins. Entries
+    win in proportion to their weights, and the choice is deterministic,
+    so a restarted process places every account where it was before
+    without persisting the assignments. An account keeps its entry until
+    the entry's weight drops below REBALANCE_RATIO of the best entry's,
+    at which point its next request is reassigned the same way.
+    """
+
+    REBALANCE_RATIO = 0.5
+
+    def __init__(self, entries: List[EgressEntry], headers: Optional[Dict[str, str]] = None):
+        """
+        Initialize the pool.
+
+        Args:
+            entries: Egress entries, at least one
+            headers: Default headers of every entry's shared sessions; the
+                X-Real-IP header is set per entry
+        """
+        if not entries:
+            raise ValueError('An egress pool needs at least one entry')
+        self.entries = entries
+        for entry in entries:
+            entry.sessions = SessionPool(entry, {**(headers or {}), 'X-Real-IP': entry.ip})
+        self._assigned: Dict[str, EgressEntry] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _prior_latency(self) -> Optional[float]:
+        """Mean measured latency, assumed for entries not measured yet."""
+        measured = [entry.latency for entry in self.entries if entry.latency is not None]
+        return sum(measured) / len(measured) if measured else None
+
+    @staticmethod
+    def _hash(account: str, entry: EgressEntry) -> float:
+        """Stable hash of an account and an entry, uniform in (0, 1)."""
+        digest = hashlib.blake2b(f'{account}\0{entry.label}'.encode('utf-8'), digest_size=8)
+        return (int.from_bytes(digest.digest(), 'big') + 1) / (2 ** 64 + 2)
+
+    def _choose(self, account: str, prior: Optional[float]) -> EgressEntry:
+        """Pick the entry with the best weighted rendezvous score for an account."""
+        candidates = [entry for entry in self.entries if entry.healthy] or self.entries
+        return max(
+            candidates,
+            key=lambda entry: -entry.weight(prior) / math.log(self._hash(account, entry))
+        )
+
+    def assign(self, account: str) -> EgressEntry:
+        """
+        Get an account's entry, assigning or moving it if needed.
+
+        Args:
+            account: Account key
+
+        Returns:
+            Entry the account's requests go through
+        """
+        with self._lock:
+            entry = self._assigned.get(account)
+            prior = self._prior_latency()
+            if entry is not None:
+                best = max(candidate.weight(prior) for candidate in self.entries)
+                if entry.healthy and entry.weight(prior) >= best * self.REBALANCE_RATIO:
+                    return entry
+            chosen = self._choose(account, prior)
+            self._assigned[account] = chosen
+        if entry is not None and chosen is not entry:
+            logger.info(f'[{account}] Moved from egress {entry.label} to {chosen.label}')
+        return chosen
+
+    def stats(self) -> Dict[str, dict]:
+        """
+        Summarize every entry's scores and assigned accounts.
+
+        Returns:
+            Mapping of entry label to its stats
+        """
+        with self._lock:
+            assigned = list(self._assigned.values())
+        return {
+            entry.label: {**entry.stats(), 'accounts': sum(1 for e in assigned if e is entry)}
+            for entry in self.entries
+        }
+
+    def close(self):
+        """Close every entry's sessions and connection pool."""
+        for entry in self.entries:
+            entry.sessions.close()
+            entry.transport.adapter.close()
+
+
+def load_egress_entries(config_file: str = 'config.json',
+                        pool_maxsize: int = 10) -> List[EgressEntry]:
+    """
+    Read the egress entries configured in config.json.
+
+    ``china_ips`` lists the entries, each an address string or an object
+    with ``ip`` and optional ``proxy``; the single ``china_ip`` is used
+    when the list is absent.
+
+    Args:
+        config_file: Configuration file path
+        pool_maxsize: Maximum connections kept by each entry's transport
+
+    Returns:
+        Configured entries, empty if the file is missing or sets none
+    """
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        return []
+    except (json.JSONDecodeError, IOError) as e:
+        logger.warning(f'Failed to load {config_file}: {e}')
+        return []
+
+    specs = config.get('china_ips') or ([config['china_ip']] if config.get('china_ip') else [])
+    entries = []
+    for spec in specs:
+        if isinstance(spec, str):
+            spec = {'ip': spec}
+        if not isinstance(spec, dict) or not spec.get('ip'):
+            logger.warning(f'Ignoring invalid china_ips entry: {spec!r}')
+            continue
+        transport = Transport(pool_connections=1, pool_maxsize=pool_maxsize)
+        entries.append(EgressEntry(spec['ip'], spec.get('proxy'), transport))
+    return entries
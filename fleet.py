@@ -0,0 +1,542 @@
+"""
+NetEase Music World - Multi-Account Fleet
+
+This module manages many NetEase accounts inside a single process,
+refreshing their sessions with bounded concurrency.
+"""
+
+import json
+import logging
+import os
+import random
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import metrics
+from agent import account_key
+from checkpoint import DaemonCheckpoint
+from cookie_store import SQLITE_SUFFIXES, CookieStore, JsonFileCookieStore, SQLiteCookieStore
+from crypto_utils import CryptoEngine
+from egress import EgressEntry, EgressPool
+from ledger import SignInLedger
+from netease_client import NetEaseClient
+from pipeline import RefreshPipeline
+from scheduler import DeadlineScheduler, ExpiryIndex
+from session_pool import AccountRecord, SessionPool
+from transport import Transport
+
+logger = logging.getLogger('NetEaseFleet')
+
+
+def load_account_files(source: str) -> List[str]:
+    """
+    Resolve an accounts source into a list of cookie file paths.
+
+    The source may be a directory (every ``*.json`` file inside it is
+    treated as a cookie file) or a manifest file. A manifest is either a
+    JSON list of paths, a JSON object with an ``accounts`` list, or a
+    plain text file with one path per line (``#`` starts a comment).
+    Relative paths in a manifest are resolved against its directory.
+    Every path is normalised with account_key, so fleet ledger and
+    checkpoint entries match those of single-account runs.
+
+    Args:
+        source: Directory or manifest path
+
+    Returns:
+        Sorted list of unique account keys (absolute cookie file paths)
+    """
+    if os.path.isdir(source):
+        return sorted(
+            account_key(os.path.join(source, name))
+            for name in os.listdir(source)
+            if name.endswith('.json')
+        )
+
+    with open(source, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    try:
+        manifest = json.loads(content)
+    except json.JSONDecodeError:
+        manifest = [
+            line.strip() for line in content.splitlines()
+            if line.strip() and not line.strip().startswith('#')
+        ]
+
+    if isinstance(manifest, dict):
+        manifest = manifest.get('accounts', [])
+    if not isinstance(manifest, list):
+        raise ValueError(f'Invalid accounts manifest: {source}')
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    paths = []
+    for entry in manifest:
+        path = account_key(os.path.join(base_dir, entry))
+        if path not in paths:
+            paths.append(path)
+    return sorted(paths)
+
+
+def open_account_source(source: str) -> Tuple[CookieStore, List[str]]:
+    """
+    Open an accounts source together with the cookie store backing it.
+
+    A SQLite database (``.db``, ``.sqlite`` or ``.sqlite3``) yields every
+    account stored in it; anything else is resolved with
+    load_account_files and backed by per-account JSON files.
+
+    Args:
+        source: SQLite database, directory or manifest path
+
+    Returns:
+        Tuple of (cookie store, account keys)
+    """
+    if source.endswith(SQLITE_SUFFIXES):
+        store = SQLiteCookieStore(source)
+        return store, store.accounts()
+    return JsonFileCookieStore(), load_account_files(source)
+
+
+class AccountFleet:
+    """
+    A set of NetEase accounts refreshed together in one process.
+
+    Each account is held as a compact AccountRecord (cookies and login
+    state). Clients are built from the record for the duration of a
+    refresh and send their requests through one shared SessionPool, so
+    an idle account costs only its record.
+    """
+
+    # Client type built for each refresh
+    client_class = NetEaseClient
+    # Floor between expiry-driven refreshes of an account whose session
+    # did not get extended, so it is not retried in a tight loop
+    MIN_REFRESH_DELAY = 15 * 60
+
+    def __init__(self, cookie_files: List[str], max_workers: int = 8,
+                 key_reuse_seconds: float = 0.0,
+                 cookie_store: Optional[CookieStore] = None,
+                 ledger: Optional[SignInLedger] = None,
+                 force_sign_in: bool = False,
+                 expiry_window_hours: Optional[float] = None,
+                 checkpoint: Optional[DaemonCheckpoint] = None,
+                 egress_entries: Optional[List[EgressEntry]] = None):
+        """
+        Initialize the fleet.
+
+        Args:
+            cookie_files: Cookie file paths (or store keys), one per account
+            max_workers: Maximum number of accounts refreshed concurrently
+            key_reuse_seconds: Lifetime for reusing weapi key pairs
+                (0 uses every pair once)
+            cookie_store: Store holding every account's cookies
+                (defaults to one JSON file per account)
+            ledger: Sign-in ledger shared by every account
+            force_sign_in: Send sign-ins even if the ledger records them
+            expiry_window_hours: Only refresh an account's IP session once
+                its session cookies expire within this many hours (None
+                refreshes on every cycle)
+            checkpoint: Daemon checkpoint recording refresh times and next
+                deadlines, so a restart resumes the schedule
+            egress_entries: X-Real-IP addresses (and proxies) to spread the
+                accounts over, each with its own transport; only when
+                there are none does the fleet create its own transport,
+                with every account using NetEaseClient.CHINA_IP
+        """
+        self.max_workers = max(1, max_workers)
+        self.expiry_window = expiry_window_hours * 3600 if expiry_window_hours else None
+        self.ledger = ledger
+        self.force_sign_in = force_sign_in
+        self.checkpoint = checkpoint
+        self.running = True
+        self.scheduler: Optional[DeadlineScheduler] = None
+        # Outcome of each account's latest refresh
+        self.last_results: Dict[str, bool] = {}
+        # Shared weapi key pool keeps RSA work off the refresh path
+        self.crypto = CryptoEngine(
+            pool_size=self.max_workers * 4, reuse_lifetime=key_reuse_seconds
+        )
+        # Concurrent refresh steps run on their own pool; sharing the
+        # account workers' pool could deadlock when every worker waits
+        self.step_executor = ThreadPoolExecutor(
+            max_workers=self.pool_size(self.max_workers), thread_name_prefix='NetEaseRefreshStep'
+        )
+        self.transport: Optional[Transport] = None
+        self.session_pool: Optional[SessionPool] = None
+        self.egress: Optional[EgressPool] = None
+        if egress_entries:
+            # Every entry brings its own transport and sessions
+            self.egress = EgressPool(egress_entries, NetEaseClient.DEFAULT_HEADERS)
+        else:
+            # One transport shared by every account's session: a single
+            # circuit breaker, and a connection pool sized for the requests
+            # in flight rather than the account count
+            self.transport = Transport(
+                pool_connections=1, pool_maxsize=self.pool_size(self.max_workers)
+            )
+            self.session_pool = SessionPool(self.transport, NetEaseClient.DEFAULT_HEADERS)
+        # Bulk-load every jar up front so records are built from memory
+        self.cookie_store = cookie_store or JsonFileCookieStore()
+        self.cookie_store.load_all(cookie_files)
+        self.records: Dict[str, AccountRecord] = {
+            path: AccountRecord(path) for path in cookie_files
+        }
+        self.expiry_index = ExpiryIndex()
+        for name in self.records:
+            self.expiry_index.update(name, self.client(name).session_expiry())
+
+    @staticmethod
+    def pool_size(max_workers: int) -> int:
+        """
+        Compute the connections needed by a fleet's concurrent refreshes.
+
+        Every worker runs up to RefreshPipeline.CONCURRENT_STEPS requests at
+        once, so smaller pools would discard connections ("Connection pool
+        is full") under load.
+
+        Args:
+            max_workers: Maximum number of accounts refreshed concurrently
+
+        Returns:
+            Connection pool size for a transport serving the fleet
+        """
+        return max(1, max_workers) * RefreshPipeline.CONCURRENT_STEPS
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def client(self, name: str) -> NetEaseClient:
+        """
+        Build a client for an account, loading its record on first use.
+
+        Args:
+            name: Account name
+
+        Returns:
+            Client sharing the fleet's crypto, and the transport and
+            session pool of the account's egress entry (the fleet's own
+            without egress entries)
+        """
+        if self.egress is None:
+            entry, transport, session_pool = None, self.transport, self.session_pool
+        else:
+            entry = self.egress.assign(name)
+            transport, session_pool = entry.transport, entry.sessions
+        return self.client_class(
+            name, crypto=self.crypto, transport=transport,
+            cookie_store=self.cookie_store, ledger=self.ledger,
+            session_pool=session_pool, record=self.records[name], egress=entry
+        )
+
+    def refresh_account(self, name: str, refresh_ip: bool = True) -> bool:
+        """
+        Refresh a single account's IP session and perform daily sign-in.
+
+        Args:
+            name: Cookie file path identifying the account
+            refresh_ip: Include the IP session refresh
+
+        Returns:
+            True if refresh successful, False otherwise
+        """
+        client = self.client(name)
+        report = RefreshPipeline(
+            client, self.step_executor,
+            force_sign_in=self.force_sign_in, refresh_ip=refresh_ip
+        ).run()
+
+        if report.skipped:
+            logger.debug(f'[{name}] Nothing due, skipped')
+            metrics.ACCOUNT_REFRESH_TOTAL.inc('skipped')
+            return True
+
+        self.records[name].logged_in = report.logged_in
+        if not report.logged_in:
+            logger.warning(f'[{name}] Not logged in, skipping')
+            metrics.ACCOUNT_REFRESH_TOTAL.inc('not_logged_in')
+            return False
+
+        self.expiry_index.update(name, client.session_expiry())
+        self._record_checkpoint(name, report)
+
+        if not report.success:
+            logger.warning(f'[{name}] IP session refresh failed')
+            metrics.ACCOUNT_REFRESH_TOTAL.inc('refresh_failed')
+            return False
+
+        logger.info(f'[{name}] Refreshed successfully ({report.timings()})')
+        metrics.ACCOUNT_REFRESH_TOTAL.inc('success')
+        return True
+
+    def _record_checkpoint(self, name: str, report):
+        """Record the refresh and sign-in times of a pipeline run."""
+        if self.checkpoint is None:
+            return
+        now = time.time()
+        refreshed = 'ip_refresh' in report.steps and report.success
+        signed_in = any(report.sign_in_code(sign_type) in (200, -2) for sign_type in (0, 1))
+        self.checkpoint.record(
+            name,
+            last_refresh=now if refreshed else None,
+            last_sign_in=now if signed_in else None,
+        )
+
+    def needs_ip_refresh(self, name: str) -> bool:
+        """
+        Check whether an account's IP session is due for a refresh.
+
+        Args:
+            name: Account name
+
+        Returns:
+            True if expiry tracking is off, the expiry is unknown, or the
+            session expires within the expiry window
+        """
+        if self.expiry_window is None:
+            return True
+        expiry = self.expiry_index.expiry_of(name)
+        return expiry is None or expiry - time.time() <= self.expiry_window
+
+    def next_refresh_delay(self, name: str, interval: float) -> float:
+        """
+        Compute the delay until an account's next scheduled run.
+
+        Args:
+            name: Account name
+            interval: Regular interval in seconds
+
+        Returns:
+            Seconds until the next run: the regular interval, or sooner
+            if the session enters its expiry window before then
+        """
+        expiry = self.expiry_index.expiry_of(name)
+        if self.expiry_window is None or expiry is None:
+            return interval
+        until_due = expiry - self.expiry_window - time.time()
+        return min(interval, max(self.MIN_REFRESH_DELAY, until_due))
+
+    def scheduled_refresh(self, name: str, interval: float) -> float:
+        """
+        Perform an account's scheduled task.
+
+        Args:
+            name: Account name
+            interval: Regular interval in seconds
+
+        Returns:
+            Seconds until the account's next run
+        """
+        self.last_results[name] = self.refresh_account(
+            name, refresh_ip=self.needs_ip_refresh(name)
+        )
+        delay = self.next_refresh_delay(name, interval)
+        if self.checkpoint is not None:
+            self.checkpoint.record(name, next_due=time.time() + delay)
+        return delay
+
+    def status(self) -> dict:
+        """
+        Summarize the latest refresh outcomes.
+
+        Returns:
+            Dictionary with account, refreshed, succeeded and failed counts
+        """
+        results = dict(self.last_results)
+        succeeded = sum(1 for ok in results.values() if ok)
+        return {
+            'accounts': len(self),
+            'refreshed': len(results),
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+        }
+
+    def check_account(self, name: str) -> dict:
+        """
+        Look up an account's login state on the server, bypassing any cache.
+
+        Args:
+            name: Account name
+
+        Returns:
+            Dictionary with account, logged_in, code, userId, vipType,
+            nickname and latency_ms, plus message if the lookup failed
+        """
+        client = self.client(name)
+        start = time.perf_counter()
+        result = client.get_user_account(use_cache=False)
+        latency = time.perf_counter() - start
+        self.records[name].logged_in = client.logged_in
+
+        account = result.get('account') or {}
+        profile = result.get('profile') or {}
+        status = {
+            'account': name,
+            'logged_in': client.logged_in,
+            'code': result.get('code'),
+            'userId': profile.get('userId', account.get('id')),
+            'vipType': profile.get('vipType', account.get('vipType')),
+            'nickname': profile.get('nickname'),
+            'latency_ms': round(latency * 1000, 1),
+        }
+        if result.get('code') != 200:
+            status['message'] = result.get('message') or result.get('msg')
+        return status
+
+    def check_all(self) -> Iterator[dict]:
+        """
+        Check every account's login state with bounded concurrency.
+
+        Results are yielded as the lookups complete, not in account order.
+
+        Yields:
+            One check_account() dictionary per account
+        """
+        workers = min(self.max_workers, len(self)) or 1
+        logged_in = 0
+
+        with ThreadPoolExecutor(max_workers=workers,
+                                thread_name_prefix='NetEaseStatus') as executor:
+            futures = {
+                executor.submit(self.check_account, name): name
+                for name in self.records
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    status = future.result()
+                except Exception as e:
+                    logger.error(f'[{name}] Status check raised: {e}')
+                    status = {'account': name, 'logged_in': False, 'code': -1, 'message': str(e)}
+                logged_in += status['logged_in']
+                yield status
+
+        logger.info(f'Fleet status check finished: {logged_in}/{len(futures)} logged in')
+
+    def run_daemon(self, interval_hours: int = 24, jitter_minutes: float = 5):
+        """
+        Run as daemon with scheduled refresh of every account.
+
+        Each account gets its own deadline. First refreshes are spread
+        uniformly over the jitter window and later ones are shifted by up
+        to +/- the jitter, so accounts never all fire at once.
+
+        Args:
+            interval_hours: Hours between refreshes of an account
+            jitter_minutes: Spread of first refreshes and per-cycle jitter
+        """
+        print('=' * 50)
+        print('NetEase Music World - Multi-Account Daemon Mode')
+        print('网易云音乐海外版 - 多账号守护进程模式')
+        print('=' * 50)
+
+        if not self.records:
+            print('\n未找到任何账号')
+            print('No accounts found')
+            return
+
+        print(f'\n已加载 {len(self)} 个账号，每 {interval_hours} 小时刷新一次')
+        print(f'Loaded {len(self)} accounts, refreshing every {interval_hours} hours')
+        print('按 Ctrl+C 停止 / Press Ctrl+C to stop\n')
+
+        self.schedule_accounts(interval_hours, jitter_minutes)
+
+        # Handle graceful shutdown
+        def signal_handler(signum, frame):
+            print('\n\n正在停止守护进程...')
+            print('Stopping daemon...')
+            self.stop()
+
+        signal.signal(signal.SIGINT, signal_handler)
+        signal.signal(signal.SIGTERM, signal_handler)
+
+        self.serve()
+        print('守护进程已停止')
+        print('Daemon stopped')
+
+    def schedule_accounts(self, interval_hours: float = 24, jitter_minutes: float = 5):
+        """
+        Create the scheduler with one recurring job per account.
+
+        Accounts with a checkpointed deadline in the future resume at that
+        deadline. Overdue accounts and accounts without a checkpoint are
+        spread uniformly over the jitter window.
+
+        Args:
+            interval_hours: Hours between refreshes of an account
+            jitter_minutes: Spread of first refreshes and per-cycle jitter
+        """
+        if self.expiry_window is not None:
+            due = len(self.expiry_index.due(self.expiry_window))
+            unknown = len(self) - len(self.expiry_index)
+            logger.info(
+                f'{due} sessions expire within the window, {unknown} have no known expiry'
+            )
+
+        interval = interval_hours * 3600
+        jitter = jitter_minutes * 60
+        self.scheduler = DeadlineScheduler(max_workers=self.max_workers, jitter=jitter)
+        resumed = overdue = 0
+        now = time.time()
+        for name in self.records:
+            delay = self.checkpoint.resume_delay(name, now) if self.checkpoint else None
+            if delay is not None and delay > 0:
+                resumed += 1
+            else:
+                if delay is not None:
+                    overdue += 1
+                delay = random.uniform(0, jitter)
+            self.scheduler.schedule(
+                name,
+                lambda name=name: self.scheduled_refresh(name, interval),
+                interval,
+                delay=delay
+            )
+        if self.checkpoint is not None:
+            logger.info(
+                f'Checkpoint: {resumed} accounts resume their schedule, {overdue} are overdue, '
+                f'{len(self) - resumed - overdue} are new'
+            )
+
+    def serve(self):
+        """Run the scheduler until stop() is called, then release resources."""
+        self.scheduler.run()
+
+        logger.info(f'Key pool stats: {self.crypto.stats()}')
+        logger.info(f'Concurrency limits: {self.transport_stats()}')
+        self.close()
+
+    def transport_stats(self) -> Dict[str, dict]:
+        """
+        Get the adaptive concurrency limits of every transport in use.
+
+        Returns:
+            Mapping of egress entry label (or 'default' without egress
+            entries) to that transport's per-endpoint limits
+        """
+        if self.egress is None:
+            return {'default': self.transport.stats()}
+        return {entry.label: entry.transport.stats() for entry in self.egress.entries}
+
+    def close(self):
+        """Release the fleet's threads, connections and files."""
+        self.crypto.stop()
+        self.step_executor.shutdown()
+        if self.session_pool is not None:
+            self.session_pool.close()
+        if self.egress is not None:
+            logger.info(f'Egress stats: {self.egress.stats()}')
+            self.egress.close()
+        self.cookie_store.close()
+        if self.checkpoint is not None:
+            self.checkpoint.close()
+        if self.ledger is not None:
+            self.ledger.close()
+
+    def stop(self):
+        """Stop the scheduler; safe to call from a signal handler."""
+        self.running = False
+        if self.scheduler is not None:
+            self.scheduler.stop()
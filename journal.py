@@ -0,0 +1,215 @@
+"""
+NetEase Music World - JSON-lines Journal
+
+This module implements the append-only journal behind the sign-in
+ledger and the daemon checkpoint. Every update appends and syncs one
+line, and the journal is compacted into one line per key once it grows,
+by writing a new file and atomically replacing the old one.
+
+Several processes may share a journal (the CLI and the daemon both
+record sign-ins, and shard workers share one file). Appends hold a
+shared lock on a ``.lock`` file next to the journal and compaction holds
+it exclusively, so no line is lost while the file is replaced; a writer
+whose file was replaced by another process reopens it before appending.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Hashable, Iterable
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks on Windows; a journal is then owned by one process
+    fcntl = None
+
+logger = logging.getLogger('NetEaseJournal')
+
+
+class JsonJournal:
+    """
+    Append-only JSON-lines file of updates merged by key.
+
+    Later lines override the fields of earlier lines with the same key.
+    A line torn by a crash is skipped on replay and terminated before
+    the next append, so it stays a single bad line.
+    """
+
+    # Compact once the journal holds this many times more lines than keys
+    COMPACT_RATIO = 4
+    COMPACT_MIN_LINES = 1000
+
+    def __init__(self, path: str, key: Callable[[dict], Hashable], name: str = 'journal'):
+        """
+        Initialize the journal.
+
+        Args:
+            path: Journal file path
+            key: Function returning the key an update line is merged by
+            name: Name used in log messages
+        """
+        self.path = path
+        self.key = key
+        self.name = name
+        self._lines = 0
+        self._lock = threading.Lock()
+        self._file = None
+        self._lock_file = None
+
+    def replay(self, apply: Callable[[dict], None]):
+        """
+        Feed every readable line of the journal to a callback, in order.
+
+        Lines that are not JSON objects, have no key, or make the
+        callback raise ValueError, KeyError or TypeError are skipped.
+
+        Args:
+            apply: Callback receiving each update
+        """
+        if not os.path.exists(self.path):
+            return
+        skipped = 0
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        update = json.loads(line)
+                        self.key(update)
+                        apply(update)
+                    except (ValueError, KeyError, TypeError, AttributeError):
+                        skipped += 1
+                        continue
+                    self._lines += 1
+        except IOError as e:
+            logger.warning(f'Failed to load {self.name}: {e}')
+            return
+        if skipped:
+            logger.warning(f'Skipped {skipped} unreadable {self.name} lines')
+
+    def append(self, update: dict, keys: int):
+        """
+        Append and sync one update, compacting the journal once it grows.
+
+        Args:
+            update: JSON-serializable update with a key
+            keys: Number of distinct keys the caller holds, used to decide
+                when to compact
+
+        Raises:
+            IOError: If the journal cannot be written
+        """
+        with self._lock:
+            with self._locked(exclusive=False):
+                if self._file is not None and self._replaced():
+                    self._file.close()
+                    self._file = None
+                if self._file is None:
+                    self._file = self._open()
+                self._file.write(json.dumps(update, separators=(',', ':')) + '\n')
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._lines += 1
+            if self._lines >= max(self.COMPACT_MIN_LINES, keys * self.COMPACT_RATIO):
+                self._compact()
+
+    def compact(self):
+        """
+        Atomically rewrite the journal with one line per key.
+
+        The lines are merged from the file itself, so updates appended by
+        other processes are kept.
+
+        Raises:
+            IOError: If the journal cannot be rewritten
+        """
+        with self._lock:
+            self._compact()
+
+    def rewrite(self, updates: Iterable[dict]):
+        """
+        Atomically replace the journal's content with the given updates.
+
+        Args:
+            updates: Complete set of updates, one line each
+
+        Raises:
+            IOError: If the journal cannot be rewritten
+        """
+        with self._lock:
+            with self._locked(exclusive=True):
+                self._replace(list(updates))
+
+    def _compact(self):
+        """Merge the journal by key and replace it. Caller must hold the lock."""
+        with self._locked(exclusive=True):
+            merged: Dict[Hashable, dict] = {}
+            self._lines = 0
+            self.replay(lambda update: merged.setdefault(self.key(update), {}).update(update))
+            self._replace(list(merged.values()))
+        logger.debug(f'Compacted {self.name} to {self._lines} lines')
+
+    def _replace(self, updates: list):
+        """Write updates to a new file and move it over the journal. Caller must hold both locks."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        prefix = f'.{os.path.basename(self.path)}-'
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=prefix, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                for update in updates:
+                    f.write(json.dumps(update, separators=(',', ':')) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._lines = len(updates)
+
+    def _open(self):
+        """Open the journal for appending, terminating a torn last line."""
+        f = open(self.path, 'a', encoding='utf-8')
+        if f.tell() > 0:
+            with open(self.path, 'rb') as tail:
+                tail.seek(-1, os.SEEK_END)
+                if tail.read(1) != b'\n':
+                    f.write('\n')
+        return f
+
+    def _replaced(self) -> bool:
+        """Check whether the open journal file was replaced or removed."""
+        try:
+            current = os.stat(self.path)
+        except FileNotFoundError:
+            return True
+        opened = os.fstat(self._file.fileno())
+        return (current.st_dev, current.st_ino) != (opened.st_dev, opened.st_ino)
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        """Hold the journal's inter-process lock. Caller must hold the thread lock."""
+        if fcntl is None:
+            yield
+            return
+        if self._lock_file is None:
+            self._lock_file = open(self.path + '.lock', 'a')
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def close(self):
+        """Close the journal and lock files."""
+        with self._lock:
+            for f in (self._file, self._lock_file):
+                if f is not None:
+                    f.close()
+            self._file = self._lock_file = None
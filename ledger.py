@@ -0,0 +1,162 @@
+"""
+NetEase Music World - Sign-in Ledger
+
+This module records which accounts already completed their daily
+sign-ins, keyed by the China-local date the server uses for its daily
+reset, so repeated refreshes skip calls that would only return -2.
+"""
+
+import json
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from journal import JsonJournal
+
+logger = logging.getLogger('NetEaseSignInLedger')
+
+# Daily tasks reset at midnight Beijing time (UTC+8, no DST)
+CHINA_TZ = timezone(timedelta(hours=8), 'Asia/Shanghai')
+
+
+def china_date(now: Optional[datetime] = None) -> str:
+    """
+    Get the current China-local date.
+
+    Args:
+        now: Optional aware datetime to convert instead of the current time
+
+    Returns:
+        Date in ISO format, e.g. '2024-01-31'
+    """
+    return (now or datetime.now(timezone.utc)).astimezone(CHINA_TZ).date().isoformat()
+
+
+class SignInLedger:
+    """
+    Persistent record of the last sign-in date per account and sign type.
+
+    The ledger is a JsonJournal: every sign-in appends one line instead of
+    rewriting the file, and lookups never wait on disk I/O. Ledgers
+    written as a single JSON object by earlier versions are still read
+    and converted on the first write.
+    """
+
+    def __init__(self, path: str = 'signin_ledger.json'):
+        """
+        Initialize the ledger.
+
+        Args:
+            path: Journal file the ledger is persisted to
+        """
+        self.path = path
+        # Guards the in-memory entries; held only briefly
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._journal = JsonJournal(
+            path, lambda update: (update['account'], str(update['type'])), name='sign-in ledger'
+        )
+        # Whether the file is a legacy ledger that must be rewritten as a journal
+        self._rewrite = False
+        self._load()
+
+    def _load(self):
+        """Load the ledger file if it exists; later lines override earlier ones."""
+        legacy = self._load_legacy()
+        if legacy is not None:
+            self._entries = legacy
+            self._rewrite = True
+            return
+        self._journal.replay(self._apply)
+
+    def _load_legacy(self) -> Optional[dict]:
+        """Read a ledger written as a single JSON object of account -> {sign type: date}."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+        except (IOError, ValueError):
+            return None
+        if not isinstance(legacy, dict) or 'account' in legacy:
+            return None
+        return {
+            account: dict(entry) for account, entry in legacy.items()
+            if isinstance(entry, dict)
+        }
+
+    def _apply(self, update: dict):
+        """Apply one journal line to the entries."""
+        self._entries.setdefault(update['account'], {})[str(update['type'])] = update['date']
+
+    def is_signed_in(self, account: str, sign_type: int, date: Optional[str] = None) -> bool:
+        """
+        Check whether a sign-in is already recorded for a date.
+
+        Args:
+            account: Account key
+            sign_type: 0 for PC, 1 for mobile
+            date: China-local date (today if omitted)
+
+        Returns:
+            True if the sign-in is recorded
+        """
+        with self._lock:
+            recorded = self._entries.get(account, {}).get(str(sign_type))
+        return recorded == (date or china_date())
+
+    def record(self, account: str, sign_type: int, date: Optional[str] = None):
+        """
+        Record a completed sign-in.
+
+        Args:
+            account: Account key
+            sign_type: 0 for PC, 1 for mobile
+            date: China-local date (today if omitted)
+        """
+        date = date or china_date()
+        with self._lock:
+            entry = self._entries.setdefault(account, {})
+            if entry.get(str(sign_type)) == date:
+                return
+            entry[str(sign_type)] = date
+            rewrite, self._rewrite = self._rewrite, False
+            lines = [
+                {'account': name, 'type': int(key), 'date': value}
+                for name, recorded in self._entries.items()
+                for key, value in recorded.items()
+            ] if rewrite else None
+            entries = sum(len(recorded) for recorded in self._entries.values())
+        try:
+            if rewrite:
+                # The rewrite already includes this sign-in
+                self._journal.rewrite(lines)
+            else:
+                self._journal.append({'account': account, 'type': sign_type, 'date': date}, entries)
+        except IOError as e:
+            logger.error(f'Failed to save sign-in ledger: {e}')
+            if rewrite:
+                with self._lock:
+                    self._rewrite = True
+
+    def merge(self, other: 'SignInLedger'):
+        """
+        Record every sign-in of another ledger that is newer than ours.
+
+        Args:
+            other: Ledger to merge, e.g. one written by a single shard
+        """
+        with other._lock:
+            sign_ins = [
+                (account, int(sign_type), date)
+                for account, entry in other._entries.items()
+                for sign_type, date in entry.items()
+            ]
+        for account, sign_type, date in sign_ins:
+            with self._lock:
+                recorded = self._entries.get(account, {}).get(str(sign_type))
+            if recorded is None or date > recorded:
+                self.record(account, sign_type, date)
+
+    def close(self):
+        """Close the journal file."""
+        self._journal.close()
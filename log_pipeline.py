@@ -0,0 +1,340 @@
+"""
+NetEase Music World - Log Pipeline
+
+This module keeps logging off the daemon's hot path. Records are put on
+an in-memory queue and written by a background thread to the console
+and to a log file rotated by size and age, as text or JSON lines. The
+per-request messages of the client are rate-limited per logger, so the
+cost of logging stays flat as the request rate grows.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import math
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Sequence
+
+logger = logging.getLogger('NetEaseLogPipeline')
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Loggers that emit a record per request rather than per account or event
+DEFAULT_SAMPLED_LOGGERS = ('NetEaseClient', 'NetEaseSessionPool')
+
+
+class RateSamplingFilter(logging.Filter):
+    """
+    Cap the records a logger may emit per second.
+
+    Only records below WARNING from the configured loggers are sampled.
+    The first record let through after a suppression carries the number
+    of records dropped in between as ``record.suppressed``.
+    """
+
+    def __init__(self, per_second: float, loggers: Sequence[str] = DEFAULT_SAMPLED_LOGGERS):
+        """
+        Initialize the filter.
+
+        Args:
+            per_second: Records allowed per logger and second
+            loggers: Names of the loggers to sample
+        """
+        super().__init__()
+        self.per_second = per_second
+        self.loggers = frozenset(loggers)
+        self.suppressed_total = 0
+        # Logger name -> [window start, records in window, suppressed since last pass]
+        self._windows: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or record.name not in self.loggers:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(record.name)
+            if window is None or now - window[0] >= 1.0:
+                suppressed = window[2] if window is not None else 0
+                window = self._windows[record.name] = [now, 0, suppressed]
+            if window[1] >= self.per_second:
+                window[2] += 1
+                self.suppressed_total += 1
+                return False
+            window[1] += 1
+            if window[2]:
+                record.suppressed = window[2]
+                window[2] = 0
+        return True
+
+
+def _traceback(formatter: logging.Formatter, record: logging.LogRecord) -> Optional[str]:
+    """Get a record's formatted exception, including one kept by the queue handler."""
+    if record.exc_info:
+        return formatter.formatException(record.exc_info)
+    return record.exc_text or getattr(record, 'exc_formatted', None)
+
+
+class TextFormatter(logging.Formatter):
+    """Plain-text formatter noting how many records sampling dropped."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not record.exc_info and not record.exc_text:
+            # Traceback kept aside by the queue handler
+            record.exc_text = getattr(record, 'exc_formatted', None)
+        text = super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        return f'{text} [{suppressed} similar suppressed]' if suppressed else text
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Formatter writing every record as one JSON object."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.processName,
+            'thread': record.threadName,
+        }
+        if getattr(record, 'suppressed', 0):
+            entry['suppressed'] = record.suppressed
+        exception = _traceback(self, record)
+        if exception:
+            entry['exception'] = exception
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class SizeAndTimeRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Rotating file handler that also rotates at fixed time boundaries.
+
+    Time rotation happens at multiples of the interval since the epoch
+    (UTC midnight for a 24 hour interval), not an interval after process
+    start, so restarts do not postpone it. A file last written before the
+    current boundary, e.g. by an earlier run, is rotated on the first
+    record.
+    """
+
+    def __init__(self, filename: str, max_bytes: int = 0, backup_count: int = 5,
+                 interval: float = 0.0, encoding: str = 'utf-8'):
+        """
+        Initialize the handler.
+
+        Args:
+            filename: Log file path
+            max_bytes: Rotate before the file grows past this size (0 disables)
+            backup_count: Rotated files kept as ``file.1`` .. ``file.N``
+            interval: Rotate after this many seconds (0 disables)
+            encoding: File encoding
+        """
+        super().__init__(filename, maxBytes=max_bytes, backupCount=max(1, backup_count),
+                         encoding=encoding, delay=True)
+        self.interval = interval
+        self.rollover_at = None
+        if interval:
+            try:
+                last_write = os.stat(self.baseFilename).st_mtime
+            except OSError:
+                last_write = time.time()
+            self.rollover_at = self._next_boundary(last_write)
+
+    def _next_boundary(self, after: float) -> float:
+        """Get the first rotation boundary later than a timestamp."""
+        return (math.floor(after / self.interval) + 1) * self.interval
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self):
+        super().doRollover()
+        if self.interval:
+            self.rollover_at = self._next_boundary(time.time())
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Make a picklable copy of a record for the queue.
+
+        The base implementation folds the traceback into the message and
+        clears exc_info and exc_text, which leaves the JSON formatter no
+        exception to report. The traceback is kept in ``exc_formatted``
+        instead, and the stack trace (already a string) stays in place.
+        """
+        exc_formatted = _traceback(self.formatter or logging.Formatter(), record)
+        record = copy.copy(record)
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        record.exc_formatted = exc_formatted
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _DrainingQueueListener(logging.handlers.QueueListener):
+    """Queue listener whose stop() waits for room instead of failing on a full queue."""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class LogPipeline:
+    """
+    Queued logging for the daemon.
+
+    start() replaces the root logger's handlers with a queue handler; a
+    listener thread owns the console and file handlers. stop() drains
+    the queue and is registered to run at exit.
+    """
+
+    def __init__(self, log_file: str = 'netease_music.log', json_lines: bool = False,
+                 max_bytes: int = 50 * 1024 * 1024, backup_count: int = 5,
+                 rotate_hours: float = 24.0, sample_per_second: float = 20.0,
+                 sampled_loggers: Sequence[str] = DEFAULT_SAMPLED_LOGGERS,
+                 console: bool = True, queue_size: int = 10000,
+                 level: int = logging.INFO):
+        """
+        Initialize the pipeline.
+
+        Args:
+            log_file: Log file path
+            json_lines: Write the log file as JSON lines instead of text
+            max_bytes: Rotate the file before it grows past this size (0 disables)
+            backup_count: Rotated files to keep
+            rotate_hours: Rotate the file after this many hours (0 disables)
+            sample_per_second: Records per second allowed from each sampled
+                logger (0 disables sampling)
+            sampled_loggers: Loggers emitting per-request records
+            console: Also write records to stderr
+            queue_size: Records buffered before new ones are dropped
+            level: Root logger level
+        """
+        self.log_file = log_file
+        self.json_lines = json_lines
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.rotate_hours = rotate_hours
+        self.sample_per_second = sample_per_second
+        self.sampled_loggers = tuple(sampled_loggers)
+        self.console = console
+        self.queue_size = queue_size
+        self.level = level
+
+        self.sampler: Optional[RateSamplingFilter] = None
+        self._queue_handler: Optional[_DroppingQueueHandler] = None
+        self._listener: Optional[_DrainingQueueListener] = None
+        self._handlers = []
+
+    def options(self, **overrides) -> dict:
+        """
+        Get the pipeline's settings, e.g. to configure a worker process.
+
+        Args:
+            **overrides: Settings to replace
+
+        Returns:
+            Keyword arguments for LogPipeline
+        """
+        options = {
+            'log_file': self.log_file,
+            'json_lines': self.json_lines,
+            'max_bytes': self.max_bytes,
+            'backup_count': self.backup_count,
+            'rotate_hours': self.rotate_hours,
+            'sample_per_second': self.sample_per_second,
+            'sampled_loggers': self.sampled_loggers,
+            'console': self.console,
+            'queue_size': self.queue_size,
+            'level': self.level,
+        }
+        options.update(overrides)
+        return options
+
+    def start(self) -> 'LogPipeline':
+        """
+        Route every record of the process through the pipeline.
+
+        Returns:
+            The pipeline itself
+        """
+        directory = os.path.dirname(os.path.abspath(self.log_file))
+        os.makedirs(directory, exist_ok=True)
+        file_handler = SizeAndTimeRotatingFileHandler(
+            self.log_file, max_bytes=self.max_bytes, backup_count=self.backup_count,
+            interval=self.rotate_hours * 3600
+        )
+        file_handler.setFormatter(
+            JsonLinesFormatter() if self.json_lines else TextFormatter(LOG_FORMAT)
+        )
+        self._handlers = [file_handler]
+        if self.console:
+            console = logging.StreamHandler()
+            console.setFormatter(TextFormatter(LOG_FORMAT))
+            self._handlers.append(console)
+
+        self._queue_handler = _DroppingQueueHandler(queue.Queue(self.queue_size))
+        if self.sample_per_second:
+            self.sampler = RateSamplingFilter(self.sample_per_second, self.sampled_loggers)
+            self._queue_handler.addFilter(self.sampler)
+
+        root = logging.getLogger()
+        # Handlers inherited from the parent (e.g. a forked shard worker)
+        # would write to files or queues this process does not own
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(self._queue_handler)
+        root.setLevel(self.level)
+
+        self._listener = _DrainingQueueListener(
+            self._queue_handler.queue, *self._handlers, respect_handler_level=True
+        )
+        self._listener.start()
+        atexit.register(self.stop)
+        return self
+
+    def stats(self) -> dict:
+        """
+        Count records that never reached the log.
+
+        Returns:
+            Dictionary with 'suppressed' (sampling) and 'dropped' (full queue)
+        """
+        return {
+            'suppressed': self.sampler.suppressed_total if self.sampler else 0,
+            'dropped': self._queue_handler.dropped if self._queue_handler else 0,
+        }
+
+    def stop(self):
+        """Write out every queued record and close the handlers."""
+        if self._listener is None:
+            return
+        logger.info(f'Log pipeline stopping: {self.stats()}')
+        self._listener.stop()
+        self._listener = None
+        for handler in self._handlers:
+            handler.close()
@@ -0,0 +1,522 @@
+"""
+NetEase Music World - QR Login Server
+
+This module onboards many accounts at once: it keeps several QR login
+sessions open, serves their codes on a local web page and polls every
+outstanding key from one loop, saving each confirmed login to its own
+cookie slot.
+"""
+
+import html
+import json
+import logging
+import os
+import re
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from cookie_store import SQLITE_SUFFIXES, CookieStore, JsonFileCookieStore, SQLiteCookieStore
+from crypto_utils import CryptoEngine
+from netease_client import NetEaseClient
+from transport import Transport
+
+logger = logging.getLogger('NetEaseLoginServer')
+
+STATE_LABELS = {
+    'pending': '获取二维码中 / Fetching QR code',
+    'waiting': '等待扫码 / Waiting for scan',
+    'scanned': '已扫码，请在手机上确认 / Scanned, confirm on your phone',
+    'done': '登录成功 / Logged in',
+    'expired': '二维码已过期 / QR code expired',
+    'error': '出错 / Error',
+}
+
+
+class SessionLimitError(ValueError):
+    """Raised when opening a session would exceed LoginServer.MAX_SESSIONS."""
+
+
+def render_qr_svg(qr_key: str, scale: int = 8) -> bytes:
+    """
+    Render the login QR code of a key as an SVG image.
+
+    Args:
+        qr_key: QR code unique key
+        scale: Pixels per module
+
+    Returns:
+        SVG document bytes
+    """
+    matrix = NetEaseClient.build_qr(qr_key).get_matrix()
+    size = len(matrix)
+    path = ''.join(
+        f'M{x},{y}h1v1h-1z'
+        for y, row in enumerate(matrix)
+        for x, dark in enumerate(row)
+        if dark
+    )
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" '
+        f'width="{size * scale}" height="{size * scale}" shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/>'
+        f'<path d="{path}" fill="#000"/></svg>'
+    ).encode('utf-8')
+
+
+class LoginSession:
+    """One QR login in progress, bound to the cookie slot it fills."""
+
+    def __init__(self, session_id: int, slot: str, client: NetEaseClient, interval: float):
+        self.id = session_id
+        self.slot = slot
+        self.client = client
+        self.qr_key: Optional[str] = None
+        self.svg = b''
+        self.state = 'pending'
+        self.nickname = ''
+        self.renewals = 0
+        self.interval = interval
+        self.next_poll = 0.0
+        # Consecutive failed QR key fetches
+        self.failures = 0
+        self.created_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+        # Whether a poll of this session is running on the executor
+        self.polling = False
+
+    @property
+    def active(self) -> bool:
+        """True while the session still needs polling."""
+        return self.state in ('pending', 'waiting', 'scanned')
+
+    def to_dict(self) -> dict:
+        """Summarize the session for the JSON endpoint."""
+        return {
+            'id': self.id,
+            'slot': self.slot,
+            'state': self.state,
+            'nickname': self.nickname,
+            'poll_interval': self.interval,
+        }
+
+
+class LoginServer:
+    """
+    Local web server running many QR logins concurrently.
+
+    Every session renders its QR code once into an in-memory SVG. One
+    poller thread hands every session that is due to a thread pool,
+    without waiting for the others, so a slow check never delays the
+    rest. Each session adapts its own polling interval: it backs off
+    while a code sits unscanned, and tightens once the code was scanned
+    and confirmation is imminent. Expired codes are replaced with fresh
+    ones for the same slot, and failed QR key fetches are retried with
+    backoff. At most MAX_SESSIONS logins are in progress at once, and a
+    login not finished within SESSION_TTL expires.
+    """
+
+    POLL_START = 2.0
+    POLL_MIN = 1.0
+    POLL_MAX = 5.0
+    MAX_RENEWALS = 3
+    # Failed QR key fetches retried before a session gives up
+    MAX_QR_RETRIES = 5
+    QR_RETRY_MAX = 30.0
+    MAX_SESSIONS = 32
+    # Long enough for a code and its MAX_RENEWALS replacements
+    SESSION_TTL = 30 * 60
+    # Seconds an expired or failed session stays listed before it is
+    # dropped and its slot released
+    FINISHED_KEEP = 60.0
+
+    def __init__(self, destination: str, host: str = '127.0.0.1', port: int = 8765,
+                 max_workers: int = 8):
+        """
+        Initialize the login server.
+
+        Args:
+            destination: Directory receiving one cookie file per account,
+                or a SQLite cookie database
+            host: Address to bind the web page to
+            port: Port to bind the web page to
+            max_workers: Maximum number of concurrent status checks
+        """
+        self.destination = destination
+        self.host = host
+        self.port = port
+        self.max_workers = max(1, max_workers)
+        self.running = True
+
+        if destination.endswith(SQLITE_SUFFIXES):
+            self.cookie_store: CookieStore = SQLiteCookieStore(destination)
+        else:
+            os.makedirs(destination, exist_ok=True)
+            self.cookie_store = JsonFileCookieStore()
+
+        self.transport = Transport(pool_connections=1, pool_maxsize=self.max_workers)
+        self.crypto = CryptoEngine(pool_size=self.max_workers)
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix='NetEaseLoginPoll'
+        )
+        self.sessions: Dict[int, LoginSession] = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self.httpd = None
+
+    def _slot_path(self, name: str) -> str:
+        """Map a slot name to the cookie store key."""
+        if isinstance(self.cookie_store, SQLiteCookieStore):
+            return name
+        return os.path.join(self.destination, f'{name}.json')
+
+    def _allocate_slot(self, name: Optional[str] = None) -> str:
+        """
+        Reserve a cookie slot no other account or session uses.
+
+        Args:
+            name: Requested slot name (numbered automatically if omitted)
+
+        Returns:
+            Cookie store key of the slot
+
+        Raises:
+            ValueError: If the requested name is invalid or already taken
+        """
+        taken = set(self.cookie_store.accounts())
+        taken.update(session.slot for session in self.sessions.values())
+        if isinstance(self.cookie_store, JsonFileCookieStore):
+            taken.update(
+                os.path.join(self.destination, entry) for entry in os.listdir(self.destination)
+            )
+
+        if name:
+            if not re.fullmatch(r'[\w.-]{1,64}', name):
+                raise ValueError(f'Invalid slot name: {name}')
+            slot = self._slot_path(name)
+            if slot in taken:
+                raise ValueError(f'Slot already in use: {name}')
+            return slot
+
+        number = 1
+        while self._slot_path(f'account-{number}') in taken:
+            number += 1
+        return self._slot_path(f'account-{number}')
+
+    def create_session(self, slot_name: Optional[str] = None) -> LoginSession:
+        """
+        Open a new QR login session.
+
+        Args:
+            slot_name: Optional cookie slot name for the account
+
+        Returns:
+            The new session; its QR code is fetched by the poller
+
+        Raises:
+            SessionLimitError: If MAX_SESSIONS logins are already in progress
+            ValueError: If the requested slot name is invalid or taken
+        """
+        with self._lock:
+            if sum(1 for session in self.sessions.values() if session.active) >= self.MAX_SESSIONS:
+                raise SessionLimitError(
+                    f'Too many login sessions in progress (max {self.MAX_SESSIONS})'
+                )
+            slot = self._allocate_slot(slot_name)
+            client = NetEaseClient(
+                slot, crypto=self.crypto, transport=self.transport,
+                cookie_store=self.cookie_store
+            )
+            session = LoginSession(self._next_id, slot, client, self.POLL_START)
+            self._next_id += 1
+            self.sessions[session.id] = session
+        logger.info(f'Created login session {session.id} for {slot}')
+        self._wake.set()
+        return session
+
+    def _renew(self, session: LoginSession):
+        """Fetch a QR key for a session and render its code, backing off on failure."""
+        qr_key = session.client.get_qr_key()
+        if not qr_key:
+            session.failures += 1
+            if session.failures > self.MAX_QR_RETRIES:
+                logger.error(f'Session {session.id} could not get a QR code, giving up')
+                session.state = 'error'
+                return
+            # Retry on the next poll; the old code is unusable meanwhile
+            session.qr_key = None
+            session.svg = b''
+            session.state = 'pending'
+            session.interval = min(self.QR_RETRY_MAX, self.POLL_START * 2 ** session.failures)
+            logger.warning(f'Session {session.id} failed to get a QR code, '
+                           f'retrying in {session.interval:.0f}s')
+            return
+        session.failures = 0
+        session.qr_key = qr_key
+        session.svg = render_qr_svg(qr_key)
+        session.state = 'waiting'
+        session.interval = self.POLL_START
+
+    def _poll(self, session: LoginSession):
+        """Check one session's QR status and adapt its polling interval."""
+        if session.qr_key is None:
+            self._renew(session)
+            return
+
+        code = session.client.check_qr_status(session.qr_key).get('code')
+        if code == 801:
+            # Nobody has scanned yet; back off
+            session.interval = min(self.POLL_MAX, session.interval * 1.5)
+        elif code == 802:
+            # Confirmation usually follows within seconds
+            session.state = 'scanned'
+            session.interval = self.POLL_MIN
+        elif code == 803:
+            client = session.client
+            client.invalidate_account_cache()
+            client._save_cookies()
+            profile = client.get_user_account(use_cache=False).get('profile') or {}
+            session.nickname = profile.get('nickname', '')
+            session.state = 'done'
+            logger.info(f'Session {session.id} logged in as {session.nickname or session.slot}')
+        elif code == 800:
+            if session.renewals >= self.MAX_RENEWALS:
+                session.state = 'expired'
+                return
+            session.renewals += 1
+            logger.info(f'Session {session.id} QR code expired, renewing')
+            self._renew(session)
+        else:
+            session.interval = min(self.POLL_MAX, session.interval * 2)
+
+    def _poll_safely(self, session: LoginSession):
+        """Run one poll, turning exceptions into an error backoff, and wake the poller."""
+        try:
+            self._poll(session)
+        except Exception as e:
+            logger.error(f'Polling session {session.id} failed: {e}')
+            session.interval = min(self.POLL_MAX, session.interval * 2)
+        session.next_poll = time.monotonic() + session.interval
+        session.polling = False
+        self._wake.set()
+
+    def _expire(self, now: float):
+        """Expire sessions past SESSION_TTL and drop old failed ones. Caller must hold the lock."""
+        for session in list(self.sessions.values()):
+            expired = now - session.created_at >= self.SESSION_TTL
+            if session.active and not session.polling and expired:
+                logger.info(f'Session {session.id} not completed in time, expiring')
+                session.state = 'expired'
+            if session.active:
+                continue
+            if session.finished_at is None:
+                session.finished_at = now
+            elif session.state != 'done' and now - session.finished_at >= self.FINISHED_KEEP:
+                del self.sessions[session.id]
+
+    def poll_due(self) -> float:
+        """
+        Start a poll of every session that is due, without waiting for it.
+
+        Returns:
+            Seconds until the next idle session is due (POLL_MAX if none is)
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            active = [session for session in self.sessions.values() if session.active]
+            due = [
+                session for session in active
+                if not session.polling and session.next_poll <= now
+            ]
+            for session in due:
+                session.polling = True
+        for session in due:
+            self.executor.submit(self._poll_safely, session)
+
+        upcoming = [session.next_poll for session in active if not session.polling]
+        if not upcoming:
+            return self.POLL_MAX
+        return max(0.0, min(upcoming) - time.monotonic())
+
+    def origin_allowed(self, origin: Optional[str], host: Optional[str]) -> bool:
+        """
+        Check that a state-changing request comes from the login page itself.
+
+        Browsers send Origin with cross-site form posts, so a page on
+        another site cannot open sessions; clients without one (curl,
+        scripts) are allowed.
+
+        Args:
+            origin: Origin request header
+            host: Host request header
+
+        Returns:
+            True if the origin is absent or matches the host served
+        """
+        if origin is None:
+            return True
+        parts = urlsplit(origin)
+        return parts.scheme == 'http' and bool(host) and parts.netloc == host
+
+    def _handler(self):
+        """Build the HTTP request handler class bound to this server."""
+        server = self
+
+        class LoginHandler(BaseHTTPRequestHandler):
+            """Serve the login page, QR images and session status."""
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+            def _send(self, status: int, body: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', 'no-store')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_json(self, data, status: int = 200):
+                self._send(status, json.dumps(data).encode('utf-8'), 'application/json')
+
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                match = re.fullmatch(r'/qr/(\d+)\.svg', path)
+                if path == '/':
+                    self._send(200, server.render_page(), 'text/html; charset=utf-8')
+                elif path == '/sessions':
+                    self._send_json([session.to_dict() for session in server.list_sessions()])
+                elif match:
+                    session = server.sessions.get(int(match.group(1)))
+                    if session is None or not session.svg:
+                        self.send_error(404)
+                        return
+                    self._send(200, session.svg, 'image/svg+xml')
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                if self.path.split('?', 1)[0] != '/sessions':
+                    self.send_error(404)
+                    return
+                if not server.origin_allowed(self.headers.get('Origin'), self.headers.get('Host')):
+                    self._send_json({'code': -1, 'message': 'Cross-origin request refused'},
+                                    status=403)
+                    return
+                length = int(self.headers.get('Content-Length', 0))
+                form = parse_qs(self.rfile.read(length).decode('utf-8'))
+                try:
+                    session = server.create_session(form.get('slot', [''])[0].strip() or None)
+                except SessionLimitError as e:
+                    self._send_json({'code': -1, 'message': str(e)}, status=429)
+                    return
+                except ValueError as e:
+                    self._send_json({'code': -1, 'message': str(e)}, status=400)
+                    return
+                if 'text/html' in self.headers.get('Accept', ''):
+                    self.send_response(303)
+                    self.send_header('Location', '/')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self._send_json(session.to_dict(), status=201)
+
+        return LoginHandler
+
+    def list_sessions(self) -> List[LoginSession]:
+        """Get every session in creation order."""
+        with self._lock:
+            return list(self.sessions.values())
+
+    def render_page(self) -> bytes:
+        """Render the HTML page listing every session."""
+        cards = []
+        for session in self.list_sessions():
+            image = f'<img src="/qr/{session.id}.svg" alt="QR">' if (
+                session.svg and session.state in ('waiting', 'scanned')) else ''
+            name = f' - {html.escape(session.nickname)}' if session.nickname else ''
+            cards.append(
+                f'<div class="card"><h3>#{session.id} {html.escape(os.path.basename(session.slot))}'
+                f'</h3>{image}<p>{STATE_LABELS[session.state]}{name}</p></div>'
+            )
+        page = (
+            '<!DOCTYPE html><html><head><meta charset="utf-8">'
+            '<meta http-equiv="refresh" content="3">'
+            '<title>NetEase Music World - QR Login</title>'
+            '<style>body{font-family:sans-serif}.card{display:inline-block;margin:8px;'
+            'padding:8px;border:1px solid #ccc;text-align:center;vertical-align:top}</style>'
+            '</head><body><h2>网易云音乐海外版 - 批量扫码登录 / Batch QR Login</h2>'
+            '<form method="post" action="/sessions"><input name="slot" '
+            'placeholder="slot name (optional)"> <button>新二维码 / New QR code</button></form>'
+            f'{"".join(cards)}</body></html>'
+        )
+        return page.encode('utf-8')
+
+    def run(self, count: int = 1):
+        """
+        Serve the login page and poll sessions until stop() is called.
+
+        Args:
+            count: Number of sessions to open at startup
+        """
+        self.httpd = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self.httpd.daemon_threads = True
+        threading.Thread(
+            target=self.httpd.serve_forever, name='NetEaseLoginHTTP', daemon=True
+        ).start()
+
+        for _ in range(count):
+            self.create_session()
+
+        try:
+            while self.running:
+                delay = self.poll_due()
+                self._wake.wait(delay)
+                self._wake.clear()
+        finally:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.executor.shutdown()
+            self.crypto.stop()
+            self.cookie_store.close()
+
+    def stop(self):
+        """Stop serving; safe to call from a signal handler."""
+        self.running = False
+        self._wake.set()
+
+    def run_interactive(self, count: int = 1):
+        """
+        Run the login server from the command line until Ctrl+C.
+
+        Args:
+            count: Number of sessions to open at startup
+        """
+        print('=' * 50)
+        print('NetEase Music World - Batch QR Login')
+        print('网易云音乐海外版 - 批量扫码登录')
+        print('=' * 50)
+        print(f'\n请在浏览器中打开 http://{self.host}:{self.port}/ 扫码登录')
+        print(f'Open http://{self.host}:{self.port}/ in a browser to scan the QR codes')
+        print(f'账号将保存到 / Accounts are saved to: {self.destination}')
+        print('按 Ctrl+C 停止 / Press Ctrl+C to stop\n')
+
+        def signal_handler(signum, frame):
+            self.stop()
+
+        signal.signal(signal.SIGINT, signal_handler)
+        signal.signal(signal.SIGTERM, signal_handler)
+
+        self.run(count)
+
+        done = [session for session in self.sessions.values() if session.state == 'done']
+        print(f'\n已登录 {len(done)} 个账号')
+        print(f'Logged in {len(done)} accounts')
+        for session in done:
+            print(f'  {session.slot}: {session.nickname}')
@@ -11,45 +11,132 @@ Usage:
     python main.py login     - Login with QR code
     python main.py refresh   - Manually refresh IP session
     python main.py status    - Check login status
+    python main.py status --all <dir|manifest>
+                             - Check every account, one JSON line each
     python main.py daemon    - Run as daemon with scheduled refresh
+    python main.py agent     - Keep warm sessions for status/refresh
+    python main.py login --accounts <dir|db>
+                             - Log in many accounts from a local web page
+    python main.py daemon --accounts <dir|manifest>
+                             - Run one daemon for many accounts
+    python main.py daemon --accounts <dir|manifest> --shards N
+                             - Spread the accounts over N processes
 """
 
+import time
+
+_STARTED = time.perf_counter()
+
 import argparse
+import atexit
+import json
 import logging
 import os
 import signal
 import sys
-import time
 from datetime import datetime
 
-import schedule
+import metrics
+from agent import AGENT_COMMANDS, DEFAULT_SOCKET, account_key, call_agent
+
+# The client stack (requests, crypto, cookie stores) and daemon-only
+# modules (fleet, scheduler) are imported by the code paths that use
+# them, so commands answered by a running agent skip loading them
 
-from netease_client import NetEaseClient
+_IMPORTED = time.perf_counter()
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('netease_music.log', encoding='utf-8')
-    ]
-)
 logger = logging.getLogger('NetEaseMusicWorld')
 
 
+def setup_logging(log_file: str = 'netease_music.log'):
+    """
+    Configure logging to the console and a log file.
+    
+    The log file is only opened when the first record is written.
+    Resident processes use the queued LogPipeline instead.
+    
+    Args:
+        log_file: Path of the log file
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(),
+            logging.FileHandler(log_file, encoding='utf-8', delay=True)
+        ]
+    )
+
+
+def report_startup_timing(marks: dict):
+    """
+    Print how long each startup phase took to stderr.
+    
+    Args:
+        marks: Mapping of phase name to its perf_counter end time
+    """
+    now = time.perf_counter()
+    previous = _STARTED
+    parts = []
+    for phase, mark in marks.items():
+        parts.append(f'{phase} {(mark - previous) * 1000:.1f}ms')
+        previous = mark
+    parts.append(f'command {(now - previous) * 1000:.1f}ms')
+    parts.append(f'total {(now - _STARTED) * 1000:.1f}ms')
+    print('[timing] ' + ', '.join(parts), file=sys.stderr)
+
+
 class NetEaseMusicWorld:
     """Main application class for NetEase Music World."""
     
-    def __init__(self, cookie_file: str = 'cookies.json'):
+    def __init__(self, cookie_file: str = 'cookies.json', store: str = None,
+                 ledger_file: str = 'signin_ledger.json', force_sign_in: bool = False,
+                 config_file: str = 'config.json'):
         """
         Initialize the application.
         
         Args:
-            cookie_file: Path to cookie storage file
+            cookie_file: Path to cookie storage file, or the account name
+                inside the store when one is given
+            store: Optional SQLite cookie database path
+            ledger_file: Path to the sign-in ledger file
+            force_sign_in: Send sign-ins even if the ledger records them
+            config_file: Configuration file listing the China IPs
         """
-        self.client = NetEaseClient(cookie_file)
+        from cookie_store import open_cookie_store
+        from egress import EgressPool, load_egress_entries
+        from ledger import SignInLedger
+        from netease_client import NetEaseClient
+        
+        cookie_file = account_key(cookie_file, store)
+        entries = load_egress_entries(config_file)
+        self.egress = EgressPool(entries, NetEaseClient.DEFAULT_HEADERS) if entries else None
+        self.client = NetEaseClient(
+            cookie_file,
+            cookie_store=open_cookie_store(store),
+            ledger=SignInLedger(ledger_file),
+            egress=self.egress.assign(cookie_file) if self.egress else None
+        )
+        self.force_sign_in = force_sign_in
         self.running = True
+        self.last_report = None
+        self.checkpoint = None
+    
+    def cookies_version(self):
+        """
+        Get a token that changes whenever the account's stored cookies change.
+        
+        Returns:
+            Comparable token, or None if no cookies are stored
+        """
+        return self.client.cookie_store.version(self.client.cookie_file)
+    
+    def close(self):
+        """Release the client's connections and cookie store."""
+        self.client.session.close()
+        self.client.cookie_store.close()
+        if self.egress is not None:
+            self.egress.close()
     
     def login(self) -> bool:
         """
@@ -119,51 +206,82 @@ class NetEaseMusicWorld:
         print(f'Refreshing IP Session... ({datetime.now().strftime("%Y-%m-%d %H:%M:%S")})')
         print('=' * 50)
         
-        if not self.client.is_logged_in():
+        from pipeline import RefreshPipeline
+        
+        # IP refresh and both sign-ins run concurrently after the login check
+        report = self.last_report = RefreshPipeline(
+            self.client, force_sign_in=self.force_sign_in
+        ).run()
+        
+        if not report.logged_in:
             logger.warning('Not logged in, please login first')
+            metrics.ACCOUNT_REFRESH_TOTAL.inc('not_logged_in')
             return False
         
-        # Refresh IP session
-        success = self.client.refresh_ip_session()
+        success = report.success
+        metrics.ACCOUNT_REFRESH_TOTAL.inc('success' if success else 'refresh_failed')
         
         if success:
             print('✓ IP会话刷新成功')
             print('✓ IP session refreshed successfully')
-            
-            # Also perform daily sign-in
-            print('\n执行每日签到...')
-            print('Performing daily sign-in...')
-            
-            # PC sign-in
-            pc_result = self.client.daily_sign_in(sign_type=0)
-            if pc_result.get('code') == 200:
-                print('✓ PC端签到成功')
-            elif pc_result.get('code') == -2:
-                print('✓ PC端今日已签到')
-            
-            # Mobile sign-in
-            mobile_result = self.client.daily_sign_in(sign_type=1)
-            if mobile_result.get('code') == 200:
-                print('✓ 移动端签到成功')
-            elif mobile_result.get('code') == -2:
-                print('✓ 移动端今日已签到')
         else:
             print('✗ IP会话刷新失败')
             print('✗ IP session refresh failed')
         
+        print('\n执行每日签到...')
+        print('Performing daily sign-in...')
+        
+        # PC sign-in
+        pc_code = report.sign_in_code(0)
+        if pc_code == 200:
+            print('✓ PC端签到成功')
+        elif pc_code == -2:
+            print('✓ PC端今日已签到')
+        
+        # Mobile sign-in
+        mobile_code = report.sign_in_code(1)
+        if mobile_code == 200:
+            print('✓ 移动端签到成功')
+        elif mobile_code == -2:
+            print('✓ 移动端今日已签到')
+        
+        logger.info(f'Refresh timings: {report.timings()}')
+        
         return success
     
-    def scheduled_refresh(self):
-        """Perform scheduled refresh task."""
+    def scheduled_refresh(self, interval: float):
+        """
+        Perform scheduled refresh task.
+        
+        Args:
+            interval: Seconds until the next run
+        """
         logger.info('Running scheduled IP refresh...')
-        self.refresh_session()
+        success = self.refresh_session()
+        if self.checkpoint is not None:
+            now = time.time()
+            report = self.last_report
+            signed_in = report is not None and any(
+                report.sign_in_code(sign_type) in (200, -2) for sign_type in (0, 1)
+            )
+            self.checkpoint.record(
+                self.client.cookie_file,
+                last_refresh=now if success else None,
+                last_sign_in=now if signed_in else None,
+                next_due=now + interval
+            )
     
-    def run_daemon(self, interval_hours: int = 24):
+    def run_daemon(self, interval_hours: int = 24, checkpoint_file: str = None):
         """
         Run as daemon with scheduled refresh.
         
+        Without a checkpoint, or when the checkpointed deadline has
+        passed, the first refresh runs immediately.
+        
         Args:
             interval_hours: Hours between refresh tasks
+            checkpoint_file: Optional daemon checkpoint file recording the
+                next deadline, so a restart resumes the schedule
         """
         print('=' * 50)
         print('NetEase Music World - Daemon Mode')
@@ -181,25 +299,38 @@ class NetEaseMusicWorld:
         print(f'Daemon started, refreshing every {interval_hours} hours')
         print('按 Ctrl+C 停止 / Press Ctrl+C to stop\n')
         
-        # Perform initial refresh
-        self.refresh_session()
+        from scheduler import DeadlineScheduler
+        
+        delay = 0.0
+        if checkpoint_file:
+            from checkpoint import DaemonCheckpoint
+            self.checkpoint = DaemonCheckpoint(checkpoint_file)
+            delay = self.checkpoint.resume_delay(self.client.cookie_file) or 0.0
+            if delay:
+                print(f'从检查点恢复，{delay / 3600:.1f} 小时后刷新')
+                print(f'Resuming from checkpoint, next refresh in {delay / 3600:.1f} hours\n')
         
-        # Schedule periodic refresh
-        schedule.every(interval_hours).hours.do(self.scheduled_refresh)
+        # First refresh runs when due, then every interval_hours
+        interval = interval_hours * 3600
+        self.scheduler = DeadlineScheduler(max_workers=1)
+        self.scheduler.schedule(
+            'refresh', lambda: self.scheduled_refresh(interval), interval, delay=delay
+        )
         
         # Handle graceful shutdown
         def signal_handler(signum, frame):
             print('\n\n正在停止守护进程...')
             print('Stopping daemon...')
             self.running = False
+            self.scheduler.stop()
         
         signal.signal(signal.SIGINT, signal_handler)
         signal.signal(signal.SIGTERM, signal_handler)
         
-        # Run scheduler
-        while self.running:
-            schedule.run_pending()
-            time.sleep(60)  # Check every minute
+        # Run scheduler until stopped
+        self.scheduler.run()
+        if self.checkpoint is not None:
+            self.checkpoint.close()
         
         print('守护进程已停止')
         print('Daemon stopped')
@@ -217,12 +348,16 @@ Examples:
     python main.py status     Check login status
     python main.py daemon     Run as daemon with scheduled refresh
     python main.py daemon -i 12    Refresh every 12 hours
+    python main.py agent      Serve status/refresh from a resident process
+    python main.py login --accounts accounts/ --qr-count 5    Log in 5 accounts from a web page
+    python main.py daemon --accounts accounts/    Refresh every account in a directory
+    python main.py status --all accounts/ -w 64    Check every account as JSON lines
         '''
     )
     
     parser.add_argument(
         'command',
-        choices=['login', 'refresh', 'status', 'daemon'],
+        choices=['login', 'refresh', 'status', 'daemon', 'agent'],
         help='Command to execute'
     )
     
@@ -237,13 +372,313 @@ Examples:
         '-c', '--cookies',
         type=str,
         default='cookies.json',
-        help='Cookie file path (default: cookies.json)'
+        help='Cookie file path, or account name with --store (default: cookies.json)'
+    )
+    
+    parser.add_argument(
+        '--config',
+        type=str,
+        default='config.json',
+        help='Configuration file with china_ip / china_ips (default: config.json)'
+    )
+    
+    parser.add_argument(
+        '--store',
+        type=str,
+        default=None,
+        help='SQLite cookie database holding many accounts'
+    )
+    
+    parser.add_argument(
+        '--accounts',
+        type=str,
+        default=None,
+        help='Directory of cookie files, manifest listing them, or SQLite '
+             'cookie database (daemon mode)'
+    )
+    
+    parser.add_argument(
+        '--all',
+        dest='all_accounts',
+        type=str,
+        default=None,
+        metavar='SOURCE',
+        help='With status, check every account in a directory, manifest or '
+             'SQLite cookie database and print one JSON line per account'
+    )
+    
+    parser.add_argument(
+        '--qr-count',
+        type=int,
+        default=1,
+        help='QR codes to open at once with login --accounts (default: 1)'
+    )
+    
+    parser.add_argument(
+        '--login-port',
+        type=int,
+        default=8765,
+        help='Local port of the batch login page with login --accounts (default: 8765)'
+    )
+    
+    parser.add_argument(
+        '-w', '--workers',
+        type=int,
+        default=8,
+        help='Maximum concurrent account refreshes with --accounts, or '
+             'checks with status --all (default: 8)'
+    )
+    
+    parser.add_argument(
+        '--shards',
+        type=int,
+        default=1,
+        help='Worker processes to spread --accounts over (default: 1, in-process)'
+    )
+    
+    parser.add_argument(
+        '--jitter',
+        type=float,
+        default=5,
+        help='Minutes to spread and jitter account refreshes with --accounts (default: 5)'
+    )
+    
+    parser.add_argument(
+        '--expiry-window',
+        type=float,
+        default=None,
+        help='With --accounts, only refresh IP sessions expiring within this many hours'
+    )
+    
+    parser.add_argument(
+        '--key-reuse',
+        type=float,
+        default=0.0,
+        help='Seconds to reuse a weapi key pair with --accounts (default: 0, never)'
+    )
+    
+    parser.add_argument(
+        '--metrics-port',
+        type=int,
+        default=None,
+        help='Serve Prometheus metrics on this local port (daemon mode)'
+    )
+    
+    parser.add_argument(
+        '--ledger',
+        type=str,
+        default='signin_ledger.json',
+        help='Sign-in ledger file (default: signin_ledger.json)'
+    )
+    
+    parser.add_argument(
+        '--checkpoint',
+        type=str,
+        default='daemon_checkpoint.jsonl',
+        help='Daemon checkpoint file recording when each account is next due; '
+             'an empty value disables it (default: daemon_checkpoint.jsonl)'
+    )
+    
+    parser.add_argument(
+        '--force-sign-in',
+        action='store_true',
+        help='Send daily sign-ins even if the ledger shows them done today'
+    )
+    
+    parser.add_argument(
+        '--agent-socket',
+        type=str,
+        default=DEFAULT_SOCKET,
+        help=f'Unix socket of the local agent (default: {DEFAULT_SOCKET})'
+    )
+    
+    parser.add_argument(
+        '--no-agent',
+        action='store_true',
+        help='Run status/refresh in this process even if an agent is running'
+    )
+    
+    parser.add_argument(
+        '--log-file',
+        type=str,
+        default='netease_music.log',
+        help='Log file path (default: netease_music.log)'
+    )
+    
+    parser.add_argument(
+        '--log-json',
+        action='store_true',
+        help='Write the daemon and agent log file as JSON lines'
+    )
+    
+    parser.add_argument(
+        '--log-max-mb',
+        type=float,
+        default=50,
+        help='Rotate the daemon and agent log file at this size in MB (default: 50, 0 disables)'
+    )
+    
+    parser.add_argument(
+        '--log-rotate-hours',
+        type=float,
+        default=24,
+        help='Rotate the daemon and agent log file after this many hours (default: 24, 0 disables)'
+    )
+    
+    parser.add_argument(
+        '--log-backups',
+        type=int,
+        default=5,
+        help='Rotated log files to keep (default: 5)'
+    )
+    
+    parser.add_argument(
+        '--log-sample',
+        type=float,
+        default=20,
+        help='Per-request log records per second kept in daemon and agent '
+             'mode (default: 20, 0 keeps all)'
+    )
+    
+    parser.add_argument(
+        '--timing',
+        action='store_true',
+        help='Print startup and command timings to stderr'
     )
     
     args = parser.parse_args()
+    log_pipeline = None
+    if args.command in ('daemon', 'agent'):
+        # Resident processes log through a queue so workers never wait on I/O
+        from log_pipeline import LogPipeline
+        log_pipeline = LogPipeline(
+            args.log_file,
+            json_lines=args.log_json,
+            max_bytes=int(args.log_max_mb * 1024 * 1024),
+            backup_count=args.log_backups,
+            rotate_hours=args.log_rotate_hours,
+            sample_per_second=args.log_sample
+        ).start()
+    else:
+        setup_logging(args.log_file)
+    
+    if args.timing:
+        marks = {'imports': _IMPORTED, 'setup': time.perf_counter()}
+        atexit.register(report_startup_timing, marks)
+    
+    if args.all_accounts and args.command != 'status':
+        parser.error('--all is only supported with the status command')
+    
+    if args.command in AGENT_COMMANDS and not args.no_agent and not args.all_accounts:
+        response = call_agent({
+            'command': args.command,
+            'cookies': account_key(args.cookies, args.store),
+            'store': os.path.abspath(args.store) if args.store else None,
+            'ledger': os.path.abspath(args.ledger),
+            'force_sign_in': args.force_sign_in,
+        }, args.agent_socket)
+        if response is not None and response.get('code') == 200:
+            print(response['output'], end='')
+            sys.exit(0 if response['result'] else 1)
+        if response is not None:
+            logger.warning(f'Agent request failed, running locally: {response.get("message")}')
+    
+    if args.command == 'agent':
+        from agent import AgentServer
+        server = AgentServer(
+            lambda cookies, store, ledger: NetEaseMusicWorld(
+                cookies, store, ledger, config_file=args.config
+            ),
+            socket_path=args.agent_socket
+        )
+        server.run_interactive()
+        sys.exit(0)
+    
+    if args.all_accounts:
+        from egress import load_egress_entries
+        from fleet import AccountFleet, open_account_source
+        cookie_store, accounts = open_account_source(args.all_accounts)
+        fleet = AccountFleet(
+            accounts,
+            max_workers=args.workers,
+            cookie_store=cookie_store,
+            egress_entries=load_egress_entries(
+                args.config, pool_maxsize=AccountFleet.pool_size(args.workers)
+            )
+        )
+        # Stream results as they complete; logs go to stderr and the log
+        # file, so stdout stays pure JSON lines
+        all_logged_in = True
+        for status in fleet.check_all():
+            print(json.dumps(status, ensure_ascii=False), flush=True)
+            all_logged_in = all_logged_in and status['logged_in']
+        fleet.close()
+        sys.exit(0 if all_logged_in else 1)
+    
+    if args.metrics_port and args.command == 'daemon':
+        metrics.start_http_server(args.metrics_port)
+    
+    if args.accounts and args.command == 'login':
+        from login_server import LoginServer
+        server = LoginServer(args.accounts, port=args.login_port, max_workers=args.workers)
+        server.run_interactive(count=args.qr_count)
+        sys.exit(0)
+    
+    if args.accounts:
+        if args.command != 'daemon':
+            parser.error('--accounts is only supported with the login and daemon commands')
+        from checkpoint import DaemonCheckpoint
+        from egress import load_egress_entries
+        from fleet import AccountFleet, open_account_source
+        from ledger import SignInLedger
+        cookie_store, accounts = open_account_source(args.accounts)
+        if args.shards > 1:
+            from shards import ShardCoordinator
+            # Every worker opens its own store; don't share the connection
+            cookie_store.close()
+            coordinator = ShardCoordinator(
+                args.accounts,
+                accounts,
+                args.shards,
+                fleet_options={
+                    'max_workers': args.workers,
+                    'key_reuse_seconds': args.key_reuse,
+                    'ledger': args.ledger,
+                    'force_sign_in': args.force_sign_in,
+                    'expiry_window_hours': args.expiry_window,
+                    'checkpoint': args.checkpoint or None,
+                    'config': args.config,
+                    'logging': log_pipeline.options(),
+                }
+            )
+            coordinator.run_daemon(interval_hours=args.interval, jitter_minutes=args.jitter)
+            sys.exit(0)
+        fleet = AccountFleet(
+            accounts,
+            max_workers=args.workers,
+            key_reuse_seconds=args.key_reuse,
+            cookie_store=cookie_store,
+            ledger=SignInLedger(args.ledger),
+            force_sign_in=args.force_sign_in,
+            expiry_window_hours=args.expiry_window,
+            checkpoint=DaemonCheckpoint(args.checkpoint) if args.checkpoint else None,
+            egress_entries=load_egress_entries(
+                args.config, pool_maxsize=AccountFleet.pool_size(args.workers)
+            )
+        )
+        fleet.run_daemon(interval_hours=args.interval, jitter_minutes=args.jitter)
+        sys.exit(0)
     
     # Initialize application
-    app = NetEaseMusicWorld(cookie_file=args.cookies)
+    app = NetEaseMusicWorld(
+        cookie_file=args.cookies,
+        store=args.store,
+        ledger_file=args.ledger,
+        force_sign_in=args.force_sign_in,
+        config_file=args.config
+    )
+    if args.timing:
+        marks['client'] = time.perf_counter()
     
     # Execute command
     if args.command == 'login':
@@ -259,7 +694,7 @@ Examples:
         sys.exit(0 if logged_in else 1)
     
     elif args.command == 'daemon':
-        app.run_daemon(interval_hours=args.interval)
+        app.run_daemon(interval_hours=args.interval, checkpoint_file=args.checkpoint or None)
         sys.exit(0)
 
 
@@ -0,0 +1,295 @@
+"""
+NetEase Music World - Metrics
+
+This module provides counters and histograms for request latency,
+response codes, crypto time and account refresh outcomes, plus an
+optional HTTP endpoint exposing them in the Prometheus text format.
+
+Metrics are disabled by default; until enable() is called every
+observation returns after a single attribute check.
+"""
+
+import logging
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+logger = logging.getLogger('NetEaseMetrics')
+
+# Latency buckets in seconds, from fast local work to slow upstream calls
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    """Render a Prometheus label set."""
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, documentation: str,
+                 labelnames: Sequence[str] = ()):
+        self._registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1.0):
+        """
+        Increase the counter.
+
+        Args:
+            *labels: Label values, in labelnames order
+            amount: Amount to add
+        """
+        if not self._registry.enabled:
+            return
+        key = tuple(str(label) for label in labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def snapshot(self) -> Dict[Tuple[str, ...], float]:
+        """Copy the current value of every label set."""
+        with self._lock:
+            return dict(self._values)
+
+    def restore(self, values: Dict[Tuple[str, ...], float]):
+        """Replace every label set's value with the given ones."""
+        with self._lock:
+            self._values = dict(values)
+
+    def collect(self) -> List[str]:
+        """Render the counter in Prometheus text format."""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {value}')
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, documentation: str,
+                 labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self._registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        """
+        Record an observation.
+
+        Args:
+            value: Observed value (seconds for latencies)
+            *labels: Label values, in labelnames order
+        """
+        if not self._registry.enabled:
+            return
+        key = tuple(str(label) for label in labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def snapshot(self) -> Dict[Tuple[str, ...], list]:
+        """Copy the bucket counts and sum of every label set."""
+        with self._lock:
+            return {key: [list(counts), total] for key, (counts, total) in self._series.items()}
+
+    def restore(self, series: Dict[Tuple[str, ...], list]):
+        """Replace every label set's buckets and sum with the given ones."""
+        with self._lock:
+            self._series = {key: [list(counts), total] for key, (counts, total) in series.items()}
+
+    def collect(self) -> List[str]:
+        """Render the histogram in Prometheus text format."""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    labels = _format_labels(self.labelnames, key, f'le="{le}"')
+                    lines.append(f'{self.name}_bucket{labels} {cumulative}')
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f'{self.name}_sum{labels} {total}')
+                lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self, enabled: bool = False):
+        """
+        Initialize the registry.
+
+        Args:
+            enabled: Whether observations are recorded
+        """
+        self.enabled = enabled
+        self._metrics = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Create and register a counter."""
+        metric = Counter(self, name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Create and register a histogram."""
+        metric = Histogram(self, name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        Render every metric in Prometheus text format.
+
+        Returns:
+            Exposition text
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> Dict[str, dict]:
+        """
+        Copy every metric's values, e.g. to ship them to another process.
+
+        Returns:
+            Mapping of metric name to its label sets and values
+        """
+        return {metric.name: metric.snapshot() for metric in self._metrics}
+
+    def restore(self, snapshot: Dict[str, dict]):
+        """
+        Replace every metric's values with those of a snapshot.
+
+        Args:
+            snapshot: Snapshot as returned by snapshot() or merge_snapshots()
+        """
+        for metric in self._metrics:
+            metric.restore(snapshot.get(metric.name, {}))
+
+
+def merge_snapshots(snapshots: Iterable[Dict[str, dict]]) -> Dict[str, dict]:
+    """
+    Sum registry snapshots taken in several processes.
+
+    Args:
+        snapshots: Snapshots as returned by MetricsRegistry.snapshot()
+
+    Returns:
+        Snapshot with counters and histogram buckets added up per label set
+    """
+    merged: Dict[str, dict] = {}
+    for snapshot in snapshots:
+        for name, values in snapshot.items():
+            target = merged.setdefault(name, {})
+            for key, value in values.items():
+                current = target.get(key)
+                if isinstance(value, list):
+                    counts, total = value
+                    if current is None:
+                        target[key] = [list(counts), total]
+                    else:
+                        current[0] = [a + b for a, b in zip(current[0], counts)]
+                        current[1] += total
+                else:
+                    target[key] = (current or 0.0) + value
+    return merged
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_LATENCY = REGISTRY.histogram(
+    'netease_request_duration_seconds',
+    'Latency of NetEase API requests',
+    ('endpoint',)
+)
+REQUEST_TOTAL = REGISTRY.counter(
+    'netease_requests_total',
+    'NetEase API requests by endpoint and response code',
+    ('endpoint', 'code')
+)
+CRYPTO_LATENCY = REGISTRY.histogram(
+    'netease_crypto_duration_seconds',
+    'Time spent encrypting request payloads',
+    ('operation',)
+)
+EGRESS_REQUEST_TOTAL = REGISTRY.counter(
+    'netease_egress_requests_total',
+    'Requests per egress X-Real-IP address by outcome',
+    ('egress', 'outcome')
+)
+ACCOUNT_REFRESH_TOTAL = REGISTRY.counter(
+    'netease_account_refresh_total',
+    'Account refresh attempts by outcome',
+    ('outcome',)
+)
+
+
+def enable():
+    """Start recording observations in the default registry."""
+    REGISTRY.enabled = True
+
+
+def start_http_server(port: int, addr: str = '127.0.0.1'):
+    """
+    Enable metrics and serve them over HTTP from a background thread.
+
+    Args:
+        port: Port to listen on
+        addr: Address to bind
+
+    Returns:
+        The running HTTP server
+    """
+    # Only the daemon serves metrics, keep http.server off the import path
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        """Serve the default registry on /metrics."""
+
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    enable()
+    server = ThreadingHTTPServer((addr, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name='MetricsServer', daemon=True)
+    thread.start()
+    logger.info(f'Metrics available at http://{addr}:{port}/metrics')
+    return server
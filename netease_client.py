@@ -7,21 +7,20 @@ NetEase Cloud Music services.
 
 import json
 import logging
-import os
+import sqlite3
 import time
-from typing import Optional
+from typing import Dict, Optional, Union
 from http.cookies import SimpleCookie
 
-import qrcode
 import requests
 
+import metrics
+from cookie_store import CookieStore, JsonFileCookieStore
 from crypto_utils import NetEaseCrypto
+from ledger import SignInLedger
+from session_pool import AccountRecord, SessionPool
+from transport import RateLimitedError, Transport
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger('NetEaseClient')
 
 
@@ -29,54 +28,185 @@ class NetEaseClient:
     """NetEase Cloud Music API Client."""
     
     BASE_URL = 'https://music.163.com'
+    # Domain the server sets its cookies for; given to legacy cookies
+    # saved without one
+    COOKIE_DOMAIN = '.music.163.com'
     CHINA_IP = '211.161.244.70'
+    # Cookies whose expiry bounds the lifetime of the login session
+    SESSION_COOKIES = ('MUSIC_U', '__csrf')
+    DEFAULT_HEADERS = {
+        'User-Agent': (
+            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+            '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+        ),
+        'Referer': 'https://music.163.com/',
+        'Content-Type': 'application/x-www-form-urlencoded',
+        'X-Real-IP': CHINA_IP,
+    }
+    # Request encoding per endpoint: 'weapi' (two AES-CBC passes plus
+    # RSA), 'eapi' (one AES-ECB pass, no RSA) or 'api' (plain form data).
+    # Endpoints not listed use DEFAULT_ENCODING.
+    DEFAULT_ENCODING = 'weapi'
+    ENDPOINT_ENCODINGS = {
+        '/login/qrcode/unikey': 'weapi',
+        '/login/qrcode/client/login': 'weapi',
+        '/point/dailyTask': 'weapi',
+    }
+    ENCODINGS = ('weapi', 'eapi', 'api')
+    # Response codes NetEase uses for "too frequent" and risk-control blocks
+    THROTTLE_CODES = frozenset({405, -460})
     
-    def __init__(self, cookie_file: str = 'cookies.json'):
+    def __init__(self, cookie_file: str = 'cookies.json', crypto=None,
+                 transport: Optional[Transport] = None,
+                 account_cache_ttl: float = 60.0,
+                 cookie_store: Optional[CookieStore] = None,
+                 ledger: Optional[SignInLedger] = None,
+                 encodings: Optional[Dict[str, str]] = None,
+                 session_pool: Optional[SessionPool] = None,
+                 record: Optional[AccountRecord] = None,
+                 egress=None):
         """
         Initialize the NetEase client.
         
         Args:
-            cookie_file: Path to the cookie storage file
+            cookie_file: Path to the cookie storage file, or the account
+                key when a cookie_store is given
+            crypto: Optional encryption engine providing encrypt_request,
+                e.g. a shared CryptoEngine (defaults to NetEaseCrypto)
+            transport: Optional transport to share timeouts, retries, the
+                circuit breaker and the connection pool between clients
+            account_cache_ttl: Seconds a successful account lookup is reused
+            cookie_store: Optional store persisting the cookie jar
+                (defaults to one JSON file per account)
+            ledger: Optional sign-in ledger used to skip sign-ins that
+                already completed today
+            encodings: Optional endpoint-to-encoding overrides of
+                ENDPOINT_ENCODINGS
+            session_pool: Optional pool of shared sessions to send
+                requests through instead of a session of this client's own
+            record: Account record holding the cookies when a
+                session_pool is given; a record already loaded is not
+                read from the cookie store again
+            egress: Optional EgressEntry supplying the X-Real-IP address,
+                proxy and default transport, and scoring this client's
+                requests; a given session_pool should be the entry's own
         """
+        for endpoint, encoding in (encodings or {}).items():
+            if encoding not in self.ENCODINGS:
+                raise ValueError(f'Unknown encoding {encoding!r} for {endpoint}')
+        self.encodings = {**self.ENDPOINT_ENCODINGS, **(encodings or {})}
         self.cookie_file = cookie_file
-        self.session = requests.Session()
-        self._setup_headers()
-        self._load_cookies()
+        self.egress = egress
+        self.china_ip = egress.ip if egress is not None else self.CHINA_IP
+        self.ledger = ledger
+        self.cookie_store = cookie_store or JsonFileCookieStore()
+        self.crypto = crypto or NetEaseCrypto
+        if transport is None:
+            transport = egress.transport if egress is not None else Transport()
+        self.transport = transport
+        self.account_cache_ttl = account_cache_ttl
+        self.logged_in = False
+        self._account_cache = None
+        self._account_cache_time = 0.0
+        if session_pool is None:
+            self.record = None
+            self.session = requests.Session()
+            self.transport.mount(self.session)
+            if egress is not None:
+                egress.mount(self.session)
+            self._setup_headers()
+            self._load_cookies()
+        else:
+            # Cookies live in the record; the pool's sessions carry the headers
+            self.record = record if record is not None else AccountRecord(cookie_file)
+            self.session = session_pool.bind(self.record)
+            self.logged_in = self.record.logged_in
+            if not self.record.loaded:
+                self._load_cookies()
+                self.record.loaded = True
     
     def _setup_headers(self):
         """Setup default headers for requests."""
-        self.session.headers.update({
-            'User-Agent': (
-                'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
-                '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-            ),
-            'Referer': 'https://music.163.com/',
-            'Content-Type': 'application/x-www-form-urlencoded',
-            'X-Real-IP': self.CHINA_IP,
-        })
+        self.session.headers.update(self.DEFAULT_HEADERS)
+        self.session.headers['X-Real-IP'] = self.china_ip
     
     def _load_cookies(self):
-        """Load cookies from file if exists."""
-        if os.path.exists(self.cookie_file):
-            try:
-                with open(self.cookie_file, 'r', encoding='utf-8') as f:
-                    cookies = json.load(f)
-                    for name, value in cookies.items():
-                        self.session.cookies.set(name, value)
-                logger.info('Cookies loaded successfully')
-            except (json.JSONDecodeError, IOError) as e:
-                logger.warning(f'Failed to load cookies: {e}')
+        """Load cookies from the cookie store if present."""
+        try:
+            cookies = self.cookie_store.load(self.cookie_file)
+        except (json.JSONDecodeError, IOError, sqlite3.Error) as e:
+            logger.warning(f'Failed to load cookies: {e}')
+            return
+        
+        if cookies is not None:
+            if isinstance(cookies, dict):
+                # Legacy layout: name -> value only
+                cookies = [{'name': name, 'value': value} for name, value in cookies.items()]
+            # Earlier migrations saved legacy cookies without a domain, next
+            # to the copy the server set later; that copy is the current one
+            scoped = {attrs['name'] for attrs in cookies if attrs.get('domain')}
+            for attrs in cookies:
+                if not attrs.get('domain'):
+                    if attrs['name'] in scoped:
+                        continue
+                    attrs = {**attrs, 'domain': self.COOKIE_DOMAIN, 'path': attrs.get('path') or '/'}
+                self.session.cookies.set(**attrs)
+            self.invalidate_account_cache()
+            logger.info('Cookies loaded successfully')
     
     def _save_cookies(self):
-        """Save cookies to file."""
+        """Save cookies, including domain, path and expiry, if they changed."""
         try:
-            cookies = {name: value for name, value in self.session.cookies.items()}
-            with open(self.cookie_file, 'w', encoding='utf-8') as f:
-                json.dump(cookies, f, ensure_ascii=False, indent=2)
-            logger.info('Cookies saved successfully')
-        except IOError as e:
+            cookies = [
+                {
+                    'name': cookie.name,
+                    'value': cookie.value,
+                    'domain': cookie.domain,
+                    'path': cookie.path,
+                    'expires': cookie.expires,
+                    'secure': cookie.secure,
+                }
+                for cookie in self.session.cookies
+            ]
+            if self.cookie_store.save(self.cookie_file, cookies):
+                self.invalidate_account_cache()
+                logger.info('Cookies saved successfully')
+            else:
+                logger.debug('Cookies unchanged, skipping save')
+        except (IOError, sqlite3.Error) as e:
             logger.error(f'Failed to save cookies: {e}')
     
+    def session_expiry(self) -> Optional[float]:
+        """
+        Get the earliest expiry of the login session cookies.
+        
+        Returns:
+            Unix timestamp, or None if no session cookie has an expiry
+        """
+        expiries = [
+            cookie.expires for cookie in self.session.cookies
+            if cookie.name in self.SESSION_COOKIES and cookie.expires
+        ]
+        return min(expiries) if expiries else None
+    
+    def _request(self, endpoint: str, data: dict) -> dict:
+        """
+        Make a request using the encoding selected for the endpoint.
+        
+        Args:
+            endpoint: API endpoint path
+            data: Request data dictionary
+            
+        Returns:
+            JSON response as dictionary
+        """
+        encoding = self.encodings.get(endpoint, self.DEFAULT_ENCODING)
+        if encoding == 'eapi':
+            return self._eapi_request(endpoint, data)
+        if encoding == 'api':
+            return self._api_request(endpoint, data)
+        return self._weapi_request(endpoint, data)
+    
     def _weapi_request(self, endpoint: str, data: dict) -> dict:
         """
         Make a request to the weapi endpoint.
@@ -85,22 +215,47 @@ class NetEaseClient:
             endpoint: API endpoint path
             data: Request data dictionary
             
+        Returns:
+            JSON response as dictionary
+        """
+        # Engines without the body fast path get their dict form-encoded by requests
+        encrypt = getattr(self.crypto, 'encrypt_request_body', self.crypto.encrypt_request)
+        start = time.perf_counter()
+        encrypted = encrypt(json.dumps(data))
+        metrics.CRYPTO_LATENCY.observe(time.perf_counter() - start, 'encrypt_request')
+        return self._post_weapi(endpoint, encrypted)
+    
+    def _post_weapi(self, endpoint: str, encrypted: Union[bytes, dict]) -> dict:
+        """
+        Post an already encrypted form body to the weapi endpoint.
+        
+        Args:
+            endpoint: API endpoint path
+            encrypted: Form-urlencoded body bytes, sent as-is, or a
+                dictionary containing 'params' and 'encSecKey'
+            
         Returns:
             JSON response as dictionary
         """
         url = f'{self.BASE_URL}/weapi{endpoint}'
-        encrypted = NetEaseCrypto.encrypt_request(json.dumps(data))
+        return self._send_json('POST', url, endpoint, data=encrypted)
+    
+    def _eapi_request(self, endpoint: str, data: dict) -> dict:
+        """
+        Make a request to the eapi endpoint.
         
-        try:
-            response = self.session.post(url, data=encrypted)
-            response.raise_for_status()
-            return response.json()
-        except json.JSONDecodeError as e:
-            logger.error(f'Failed to decode JSON response: {e}')
-            return {'code': -1, 'message': f'Invalid JSON response: {e}'}
-        except requests.RequestException as e:
-            logger.error(f'Request failed: {e}')
-            return {'code': -1, 'message': str(e)}
+        Args:
+            endpoint: API endpoint path
+            data: Request data dictionary
+            
+        Returns:
+            JSON response as dictionary
+        """
+        start = time.perf_counter()
+        encrypted = NetEaseCrypto.eapi_encrypt(f'/api{endpoint}', json.dumps(data))
+        metrics.CRYPTO_LATENCY.observe(time.perf_counter() - start, 'eapi_encrypt')
+        url = f'{self.BASE_URL}/eapi{endpoint}'
+        return self._send_json('POST', url, endpoint, data=encrypted)
     
     def _api_request(self, endpoint: str, data: Optional[dict] = None) -> dict:
         """
@@ -114,20 +269,50 @@ class NetEaseClient:
             JSON response as dictionary
         """
         url = f'{self.BASE_URL}/api{endpoint}'
+        if data:
+            return self._send_json('POST', url, endpoint, data=data)
+        return self._send_json('GET', url, endpoint)
+    
+    def _send_json(self, method: str, url: str, endpoint: str, **kwargs) -> dict:
+        """
+        Send a request through the transport and decode the JSON response.
         
+        Args:
+            method: HTTP method
+            url: Full request URL
+            endpoint: API endpoint path, used for policies and metrics
+            **kwargs: Extra arguments for the request
+            
+        Returns:
+            JSON response as dictionary, or {'code': -1} on failure
+        """
+        start = time.perf_counter()
+        sent = True
         try:
-            if data:
-                response = self.session.post(url, data=data)
-            else:
-                response = self.session.get(url)
+            response = self.transport.request(self.session, method, url, endpoint, **kwargs)
             response.raise_for_status()
-            return response.json()
+            result = response.json()
         except json.JSONDecodeError as e:
             logger.error(f'Failed to decode JSON response: {e}')
-            return {'code': -1, 'message': f'Invalid JSON response: {e}'}
+            result = {'code': -1, 'message': f'Invalid JSON response: {e}'}
         except requests.RequestException as e:
             logger.error(f'Request failed: {e}')
-            return {'code': -1, 'message': str(e)}
+            result = {'code': -1, 'message': str(e)}
+            # Held back by the rate limit, so it says nothing about the
+            # egress address (whose own circuit breaker does count)
+            sent = not isinstance(e, RateLimitedError)
+        
+        code = result.get('code')
+        if code in self.THROTTLE_CODES:
+            logger.warning(f'Throttled by server on {endpoint}: {result.get("message")}')
+            self.transport.record_throttled(endpoint)
+        
+        elapsed = time.perf_counter() - start
+        if self.egress is not None and sent:
+            self.egress.record(code != -1 and code not in self.THROTTLE_CODES, elapsed)
+        metrics.REQUEST_LATENCY.observe(elapsed, endpoint)
+        metrics.REQUEST_TOTAL.inc(endpoint, result.get('code'))
+        return result
     
     def get_qr_key(self) -> Optional[str]:
         """
@@ -137,7 +322,7 @@ class NetEaseClient:
             QR code unique key or None if failed
         """
         data = {'type': 1}
-        result = self._weapi_request('/login/qrcode/unikey', data)
+        result = self._request('/login/qrcode/unikey', data)
         
         if result.get('code') == 200:
             unikey = result.get('unikey')
@@ -147,18 +332,19 @@ class NetEaseClient:
             logger.error(f'Failed to get QR key: {result}')
             return None
     
-    def generate_qr_code(self, qr_key: str, save_path: str = 'qrcode.png') -> str:
+    @staticmethod
+    def build_qr(qr_key: str):
         """
-        Generate QR code image for login.
+        Build the QR code matrix for a login key.
         
         Args:
             qr_key: QR code unique key
-            save_path: Path to save QR code image
             
         Returns:
-            Path to saved QR code image
+            qrcode.QRCode with its matrix already computed
         """
-        qr_url = f'https://music.163.com/login?codekey={qr_key}'
+        # Imported here so commands that never log in skip qrcode
+        import qrcode
         
         qr = qrcode.QRCode(
             version=1,
@@ -166,15 +352,44 @@ class NetEaseClient:
             box_size=10,
             border=4,
         )
-        qr.add_data(qr_url)
+        qr.add_data(f'https://music.163.com/login?codekey={qr_key}')
         qr.make(fit=True)
+        return qr
+    
+    def generate_qr_code(self, qr_key: str, save_path: str = 'qrcode.png', qr=None) -> str:
+        """
+        Generate QR code image for login.
         
+        Args:
+            qr_key: QR code unique key
+            save_path: Path to save QR code image
+            qr: Optional QR code already built by build_qr
+            
+        Returns:
+            Path to saved QR code image
+        """
+        qr = qr or NetEaseClient.build_qr(qr_key)
         img = qr.make_image(fill_color='black', back_color='white')
         img.save(save_path)
         
         logger.info(f'QR code saved to {save_path}')
         return save_path
     
+    def print_qr_code(self, qr_key: str, qr=None):
+        """
+        Print QR code for login to the terminal.
+        
+        Args:
+            qr_key: QR code unique key
+            qr: Optional QR code already built by build_qr
+        """
+        try:
+            qr = qr or NetEaseClient.build_qr(qr_key)
+            qr.print_ascii(invert=True)
+        except Exception as e:
+            logger.warning(f'Could not print QR code to terminal: {e}')
+            print('(Terminal QR code not available, please use the saved image)')
+    
     def check_qr_status(self, qr_key: str) -> dict:
         """
         Check QR code scan status.
@@ -190,7 +405,7 @@ class NetEaseClient:
             - 803: Login successful
         """
         data = {'key': qr_key, 'type': 1}
-        return self._weapi_request('/login/qrcode/client/login', data)
+        return self._request('/login/qrcode/client/login', data)
     
     def qr_login(self, timeout: int = 120) -> bool:
         """
@@ -207,22 +422,15 @@ class NetEaseClient:
         if not qr_key:
             return False
         
-        # Generate and display QR code
-        qr_path = self.generate_qr_code(qr_key)
+        # Generate and display QR code, computing the matrix once for both
+        qr = self.build_qr(qr_key)
+        qr_path = self.generate_qr_code(qr_key, qr=qr)
         print(f'\n请使用网易云音乐APP扫描二维码登录')
         print(f'QR code saved to: {qr_path}')
         print('Please scan the QR code with NetEase Music app\n')
         
         # Also print QR code to terminal
-        try:
-            qr_url = f'https://music.163.com/login?codekey={qr_key}'
-            qr = qrcode.QRCode(box_size=1, border=1)
-            qr.add_data(qr_url)
-            qr.make(fit=True)
-            qr.print_ascii(invert=True)
-        except Exception as e:
-            logger.warning(f'Could not print QR code to terminal: {e}')
-            print('(Terminal QR code not available, please use the saved image)')
+        self.print_qr_code(qr_key, qr=qr)
         
         # Wait for scan
         start_time = time.time()
@@ -246,6 +454,7 @@ class NetEaseClient:
             elif code == 803:
                 print('\n登录成功！')
                 print('Login successful!')
+                self.invalidate_account_cache()
                 self._save_cookies()
                 return True
             
@@ -254,14 +463,36 @@ class NetEaseClient:
         logger.warning('Login timeout')
         return False
     
-    def get_user_account(self) -> dict:
+    def get_user_account(self, use_cache: bool = True) -> dict:
         """
         Get current user account info.
         
+        Successful lookups are cached for account_cache_ttl seconds and
+        mark the session as logged in; failures are never cached.
+        
+        Args:
+            use_cache: Return a cached result if one is still fresh
+            
         Returns:
             User account info dictionary
         """
-        return self._api_request('/nuser/account/get')
+        if (use_cache and self._account_cache is not None
+                and time.monotonic() - self._account_cache_time < self.account_cache_ttl):
+            return self._account_cache
+        
+        result = self._api_request('/nuser/account/get')
+        self.logged_in = result.get('code') == 200 and result.get('account') is not None
+        if self.logged_in:
+            self._account_cache = result
+            self._account_cache_time = time.monotonic()
+        else:
+            self.invalidate_account_cache()
+        return result
+    
+    def invalidate_account_cache(self):
+        """Forget the cached account info so the next lookup hits the server."""
+        self._account_cache = None
+        self._account_cache_time = 0.0
     
     def is_logged_in(self) -> bool:
         """
@@ -270,8 +501,8 @@ class NetEaseClient:
         Returns:
             True if logged in, False otherwise
         """
-        result = self.get_user_account()
-        return result.get('code') == 200 and result.get('account') is not None
+        self.get_user_account()
+        return self.logged_in
     
     def refresh_ip_session(self) -> bool:
         """
@@ -286,36 +517,64 @@ class NetEaseClient:
         logger.info('Refreshing IP session...')
         
         # Make a request with the China IP header to refresh session
+        start = time.perf_counter()
+        sent = True
         try:
-            response = self.session.get(
-                f'{self.BASE_URL}/discover',
-                headers={'X-Real-IP': self.CHINA_IP}
+            response = self.transport.request(
+                self.session, 'GET', f'{self.BASE_URL}/discover', '/discover',
+                headers={'X-Real-IP': self.china_ip}
             )
-            
-            if response.status_code == 200:
-                logger.info('IP session refreshed successfully')
-                self._save_cookies()
-                return True
-            else:
-                logger.warning(f'IP refresh returned status: {response.status_code}')
-                return False
-                
+            code = response.status_code
         except requests.RequestException as e:
             logger.error(f'Failed to refresh IP session: {e}')
-            return False
+            code = -1
+            sent = not isinstance(e, RateLimitedError)
+        elapsed = time.perf_counter() - start
+        metrics.REQUEST_LATENCY.observe(elapsed, '/discover')
+        if self.egress is not None and sent:
+            self.egress.record(code == 200, elapsed)
+        metrics.REQUEST_TOTAL.inc('/discover', code)
+        
+        if code == 200:
+            logger.info('IP session refreshed successfully')
+            self._save_cookies()
+            return True
+        elif code != -1:
+            logger.warning(f'IP refresh returned status: {code}')
+        return False
     
-    def daily_sign_in(self, sign_type: int = 0) -> dict:
+    def sign_in_pending(self, sign_type: int) -> bool:
+        """
+        Check whether today's sign-in may still be needed.
+        
+        Args:
+            sign_type: 0 for PC, 1 for mobile
+            
+        Returns:
+            False only if the ledger records today's sign-in
+        """
+        return self.ledger is None or not self.ledger.is_signed_in(self.cookie_file, sign_type)
+    
+    def daily_sign_in(self, sign_type: int = 0, force: bool = False) -> dict:
         """
         Perform daily sign-in task.
         
+        When a ledger is configured and it already records today's
+        sign-in, no request is sent and a code -2 result is returned.
+        
         Args:
             sign_type: 0 for PC, 1 for mobile
+            force: Send the request even if the ledger says it is done
             
         Returns:
             Sign-in result dictionary
         """
+        if not force and not self.sign_in_pending(sign_type):
+            logger.debug(f'Sign-in already recorded for today (type={sign_type})')
+            return {'code': -2, 'message': 'Already signed in today (ledger)'}
+        
         data = {'type': sign_type}
-        result = self._weapi_request('/point/dailyTask', data)
+        result = self._request('/point/dailyTask', data)
         
         if result.get('code') == 200:
             logger.info(f'Daily sign-in successful (type={sign_type})')
@@ -324,17 +583,26 @@ class NetEaseClient:
         else:
             logger.warning(f'Daily sign-in failed: {result}')
         
+        if self.ledger is not None and result.get('code') in (200, -2):
+            self.ledger.record(self.cookie_file, sign_type)
+        
         return result
     
     def logout(self):
         """Clear session and cookies."""
         self.session.cookies.clear()
-        if os.path.exists(self.cookie_file):
-            os.remove(self.cookie_file)
+        self.logged_in = False
+        self.invalidate_account_cache()
+        self.cookie_store.delete(self.cookie_file)
         logger.info('Logged out successfully')
 
 
 if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    
     # Simple test
     client = NetEaseClient()
     
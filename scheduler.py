@@ -0,0 +1,207 @@
+"""
+NetEase Music World - Deadline Scheduler
+
+This module provides the daemon's job scheduler: a priority queue of
+per-job deadlines, a thread that sleeps exactly until the next one and
+a bounded worker pool that runs due jobs.
+"""
+
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger('NetEaseScheduler')
+
+
+class DeadlineScheduler:
+    """
+    Heap-based scheduler for recurring jobs.
+
+    Every job has a key (e.g. an account) and an interval. After a run
+    finishes, the job is rescheduled interval seconds later, shifted by a
+    random amount of up to +/- jitter seconds so jobs that started
+    together drift apart instead of firing in lockstep. A job that
+    returns a number overrides the interval with that many seconds for
+    its next deadline.
+    """
+
+    def __init__(self, max_workers: int = 4, jitter: float = 0.0):
+        """
+        Initialize the scheduler.
+
+        Args:
+            max_workers: Maximum number of jobs running at once
+            jitter: Default maximum random shift in seconds per deadline
+        """
+        self.max_workers = max(1, max_workers)
+        self.jitter = jitter
+        self._heap = []
+        self._jobs: Dict[Hashable, tuple] = {}
+        self._pending: Dict[Hashable, int] = {}
+        self._running = set()
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def schedule(self, key: Hashable, func: Callable[[], object], interval: float,
+                 delay: float = 0.0, jitter: Optional[float] = None):
+        """
+        Add or replace a recurring job.
+
+        Args:
+            key: Unique job key
+            func: Callable run on every deadline
+            interval: Seconds between the end of one run and the next deadline
+            delay: Seconds until the first deadline
+            jitter: Maximum random shift per deadline (scheduler default if None)
+        """
+        jitter = self.jitter if jitter is None else jitter
+        with self._cond:
+            self._jobs[key] = (func, interval, jitter)
+            self._push(key, time.monotonic() + delay)
+
+    def cancel(self, key: Hashable):
+        """
+        Remove a job. A run already in progress is not interrupted.
+
+        Args:
+            key: Job key
+        """
+        with self._cond:
+            self._jobs.pop(key, None)
+            self._pending.pop(key, None)
+            self._cond.notify_all()
+
+    def _push(self, key: Hashable, deadline: float):
+        """Queue a deadline for a job, superseding any earlier one. Caller must hold the lock."""
+        seq = next(self._seq)
+        self._pending[key] = seq
+        heapq.heappush(self._heap, (deadline, seq, key))
+        self._cond.notify_all()
+
+    def _next_deadline(self, key: Hashable, delay: Optional[float] = None) -> float:
+        """Compute the jittered deadline following a run."""
+        _, interval, jitter = self._jobs[key]
+        if delay is not None:
+            interval = delay
+        shift = random.uniform(-jitter, jitter) if jitter else 0.0
+        return time.monotonic() + max(0.0, interval + shift)
+
+    def _run_job(self, key: Hashable, func: Callable[[], object]):
+        """Run a job in a worker thread and queue its next deadline."""
+        delay = None
+        try:
+            result = func()
+            if isinstance(result, (int, float)) and not isinstance(result, bool):
+                delay = result
+        except Exception as e:
+            logger.error(f'Scheduled job {key} failed: {e}')
+        finally:
+            with self._cond:
+                self._running.discard(key)
+                if key in self._jobs and not self._stopped:
+                    self._push(key, self._next_deadline(key, delay))
+                self._cond.notify_all()
+
+    def run(self):
+        """Dispatch jobs until stop() is called. Blocks the calling thread."""
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix='NetEaseScheduler'
+        )
+        try:
+            with self._cond:
+                while not self._stopped:
+                    # Never queue more work than there are free workers
+                    if not self._heap or len(self._running) >= self.max_workers:
+                        self._cond.wait()
+                        continue
+
+                    deadline, seq, key = self._heap[0]
+                    delay = deadline - time.monotonic()
+                    if delay > 0:
+                        self._cond.wait(delay)
+                        continue
+
+                    heapq.heappop(self._heap)
+                    # Skip deadlines superseded by a reschedule or cancel
+                    if self._pending.get(key) != seq or key in self._running:
+                        continue
+                    del self._pending[key]
+                    self._running.add(key)
+                    self._executor.submit(self._run_job, key, self._jobs[key][0])
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def stop(self):
+        """Stop dispatching and wake the run loop immediately."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+
+class ExpiryIndex:
+    """
+    Session expiry per account.
+
+    Lookups and updates are constant time. Listing the accounts due
+    within a window scans every account, which only happens for the
+    occasional summary.
+    """
+
+    def __init__(self):
+        self._expiry: Dict[Hashable, float] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+    def update(self, account: Hashable, expiry: Optional[float]):
+        """
+        Set an account's session expiry.
+
+        Args:
+            account: Account key
+            expiry: Unix timestamp, or None if unknown
+        """
+        with self._lock:
+            if expiry is None:
+                self._expiry.pop(account, None)
+            else:
+                self._expiry[account] = expiry
+
+    def expiry_of(self, account: Hashable) -> Optional[float]:
+        """
+        Get an account's session expiry.
+
+        Args:
+            account: Account key
+
+        Returns:
+            Unix timestamp, or None if unknown
+        """
+        with self._lock:
+            return self._expiry.get(account)
+
+    def due(self, window: float, now: Optional[float] = None) -> list:
+        """
+        List accounts whose session expires within a window.
+
+        Args:
+            window: Seconds before expiry an account becomes due
+            now: Unix timestamp to compare against (current time if omitted)
+
+        Returns:
+            Due account keys, soonest expiry first
+        """
+        threshold = (time.time() if now is None else now) + window
+        with self._lock:
+            due = [(expiry, account) for account, expiry in self._expiry.items()
+                   if expiry <= threshold]
+        due.sort(key=lambda item: item[0])
+        return [account for _, account in due]
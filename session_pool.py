@@ -0,0 +1,235 @@
+"""
+NetEase Music World - Shared Session Pool
+
+This module lets a large fleet hold per-account state in compact records
+instead of one requests.Session per account. Requests go through a small
+pool of shared sessions that never keep cookies themselves: the account's
+cookies are injected into each request and the cookies a response sets
+are written back to the account's record.
+"""
+
+import http.cookiejar
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, NamedTuple, Optional
+
+import requests
+
+logger = logging.getLogger('NetEaseSessionPool')
+
+
+class StoredCookie(NamedTuple):
+    """One cookie with the attributes the cookie store persists."""
+
+    name: str
+    value: str
+    domain: str = ''
+    path: str = '/'
+    expires: Optional[int] = None
+    secure: bool = False
+
+
+class AccountRecord:
+    """
+    Cookies and login state of one account.
+
+    Provides the subset of the cookie jar interface NetEaseClient uses
+    (set, clear and iteration over cookies with name, value, domain,
+    path, expires and secure), so a client can run on top of a record.
+    """
+
+    __slots__ = ('name', 'cookies', 'logged_in', 'loaded')
+
+    def __init__(self, name: str):
+        """
+        Initialize an empty record.
+
+        Args:
+            name: Account key
+        """
+        self.name = name
+        self.cookies: Dict[str, StoredCookie] = {}
+        self.logged_in = False
+        # Whether the cookies were read from the cookie store yet
+        self.loaded = False
+
+    def __iter__(self) -> Iterator[StoredCookie]:
+        # Iterate over a copy: concurrent refresh steps may set cookies
+        return iter(list(self.cookies.values()))
+
+    def __len__(self) -> int:
+        return len(self.cookies)
+
+    def set(self, name: str, value: str, domain: str = '', path: str = '/',
+            expires: Optional[float] = None, secure: bool = False, **kwargs):
+        """
+        Set a cookie, replacing any cookie with the same name.
+
+        Args:
+            name: Cookie name
+            value: Cookie value
+            domain: Cookie domain
+            path: Cookie path
+            expires: Unix timestamp, or None for a session cookie
+            secure: Whether the cookie is HTTPS-only
+            **kwargs: Other jar attributes, ignored
+        """
+        if value is None:
+            self.cookies.pop(name, None)
+            return
+        self.cookies[name] = StoredCookie(name, value, domain, path, expires, bool(secure))
+
+    def clear(self):
+        """Remove every cookie."""
+        self.cookies = {}
+
+    def request_cookies(self, now: Optional[float] = None) -> Dict[str, str]:
+        """
+        Get the cookies to send with a request.
+
+        Args:
+            now: Unix timestamp expired cookies are checked against
+                (current time if omitted)
+
+        Returns:
+            Mapping of cookie name to value, without expired cookies
+        """
+        now = time.time() if now is None else now
+        return {
+            cookie.name: cookie.value for cookie in self
+            if not cookie.expires or cookie.expires > now
+        }
+
+    def absorb(self, response: requests.Response):
+        """
+        Store the cookies a response (and its redirects) set.
+
+        Args:
+            response: Response to take cookies from
+        """
+        for hop in (*response.history, response):
+            for cookie in hop.cookies:
+                self.set(cookie.name, cookie.value, cookie.domain, cookie.path,
+                         cookie.expires, cookie.secure)
+
+
+class _RejectAllCookies(http.cookiejar.DefaultCookiePolicy):
+    """Cookie policy keeping shared sessions free of any account's cookies."""
+
+    def set_ok(self, cookie, request) -> bool:
+        return False
+
+
+class SessionPool:
+    """
+    Pool of requests sessions shared by every account.
+
+    Sessions are created on demand and reused most-recently-released
+    first, so the pool grows to the peak number of concurrent requests
+    and no further. Each session carries the default headers and is
+    mounted on the shared transport; none of them keeps cookies.
+    """
+
+    def __init__(self, transport=None, headers: Optional[Dict[str, str]] = None):
+        """
+        Initialize the pool.
+
+        Args:
+            transport: Optional Transport (or egress entry) every session
+                is mounted on
+            headers: Default headers of every session
+        """
+        self.transport = transport
+        self.headers = dict(headers or {})
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._created
+
+    def _create(self) -> requests.Session:
+        """Create a cookie-less session with the pool's headers."""
+        session = requests.Session()
+        session.headers.update(self.headers)
+        session.cookies.set_policy(_RejectAllCookies())
+        if self.transport is not None:
+            self.transport.mount(session)
+        with self._lock:
+            self._created += 1
+            logger.debug(f'Session pool grew to {self._created} sessions')
+        return session
+
+    @contextmanager
+    def session(self) -> Iterator[requests.Session]:
+        """Borrow a session for one request."""
+        try:
+            session = self._idle.get_nowait()
+        except queue.Empty:
+            session = self._create()
+        try:
+            yield session
+        finally:
+            self._idle.put(session)
+
+    def bind(self, record: AccountRecord) -> 'PooledSession':
+        """
+        Get a session-like view of the pool for one account.
+
+        Args:
+            record: Account record supplying and receiving cookies
+
+        Returns:
+            Object usable in place of a requests.Session
+        """
+        return PooledSession(self, record)
+
+    def close(self):
+        """Close every idle session."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class PooledSession:
+    """
+    Stand-in for a per-account requests.Session.
+
+    Requests borrow a session from the pool, send the record's cookies
+    and store the cookies of the response back in the record.
+    """
+
+    __slots__ = ('pool', 'record')
+
+    def __init__(self, pool: SessionPool, record: AccountRecord):
+        self.pool = pool
+        self.record = record
+
+    @property
+    def cookies(self) -> AccountRecord:
+        """The account's cookies."""
+        return self.record
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Send a request with the account's cookies.
+
+        Args:
+            method: HTTP method
+            url: Request URL
+            **kwargs: Extra arguments for requests.Session.request
+
+        Returns:
+            Response
+        """
+        cookies = self.record.request_cookies()
+        cookies.update(kwargs.pop('cookies', None) or {})
+        with self.pool.session() as session:
+            response = session.request(method, url, cookies=cookies, **kwargs)
+        self.record.absorb(response)
+        return response
@@ -0,0 +1,436 @@
+"""
+NetEase Music World - Sharded Fleet
+
+This module spreads a fleet's accounts over several worker processes so
+the CPU-bound parts of a refresh (weapi RSA, JSON handling) run on every
+core instead of queueing behind one interpreter's GIL. A coordinator
+assigns the shards, restarts workers that die and merges the status and
+metrics they report.
+"""
+
+import glob
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import zlib
+from multiprocessing.connection import Connection, wait
+from typing import Dict, List, Optional
+
+import metrics
+from checkpoint import DaemonCheckpoint
+from egress import load_egress_entries
+from fleet import AccountFleet, open_account_source
+from ledger import SignInLedger
+from log_pipeline import LogPipeline
+
+logger = logging.getLogger('NetEaseShards')
+
+LOG_FORMAT = '%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def partition_accounts(accounts: List[str], shards: int) -> List[List[str]]:
+    """
+    Split accounts into shards by a stable hash of their key.
+
+    The same account always lands in the same shard for a given shard
+    count, so a restarted worker picks up exactly the accounts its
+    predecessor had. Shard numbers are fixed: empty
+    shards are kept, so adding accounts never renumbers the others.
+
+    Args:
+        accounts: Account keys
+        shards: Number of shards
+
+    Returns:
+        One sorted list of account keys per shard, possibly empty
+    """
+    buckets = [[] for _ in range(max(1, shards))]
+    for account in accounts:
+        buckets[zlib.crc32(account.encode('utf-8')) % len(buckets)].append(account)
+    return [sorted(bucket) for bucket in buckets]
+
+
+def shard_path(path: str, shard: int) -> str:
+    """
+    Derive a shard's own file from the path given on the command line.
+
+    Args:
+        path: Path given on the command line, e.g. the log file
+        shard: Shard number
+
+    Returns:
+        Path such as ``netease_music.shard0.log``
+    """
+    root, ext = os.path.splitext(path)
+    return f'{root}.shard{shard}{ext}'
+
+
+def merge_shard_files(path: str, journal_class) -> int:
+    """
+    Fold per-shard ledgers or checkpoints into the shared file.
+
+    Earlier versions kept one file per shard, which loses an account's
+    state whenever the shard count changes. Every shard file found is
+    merged, keeping the newer value of each field, and then removed.
+
+    Args:
+        path: Shared ledger or checkpoint path
+        journal_class: SignInLedger or DaemonCheckpoint
+
+    Returns:
+        Number of shard files merged
+    """
+    root, ext = os.path.splitext(path)
+    shard_files = sorted(glob.glob(f'{glob.escape(root)}.shard[0-9]*{glob.escape(ext)}'))
+    if not shard_files:
+        return 0
+    target = journal_class(path)
+    try:
+        for shard_file in shard_files:
+            source = journal_class(shard_file)
+            target.merge(source)
+            source.close()
+            for leftover in (shard_file, shard_file + '.lock'):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            logger.info(f'Merged {shard_file} into {path}')
+    finally:
+        target.close()
+    return len(shard_files)
+
+
+def _run_shard(shard: int, source: str, accounts: List[str], options: dict,
+               interval_hours: float, jitter_minutes: float,
+               conn: Connection, report_interval: float):
+    """
+    Worker process entry point: run a fleet over one shard of accounts.
+
+    Args:
+        shard: Shard number
+        source: Accounts source the cookie store is opened from
+        accounts: Account keys in this shard
+        options: AccountFleet keyword arguments plus ``ledger``,
+            ``checkpoint``, ``config``, ``logging`` (LogPipeline options)
+            and ``metrics``
+        interval_hours: Hours between refreshes of an account
+        jitter_minutes: Spread of first refreshes and per-cycle jitter
+        conn: Pipe end the worker reports status and metrics to
+        report_interval: Seconds between reports
+    """
+    # The coordinator owns Ctrl+C and stops workers with SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    options = dict(options)
+    log_options = options.pop('logging', None)
+    log_pipeline = None
+    if log_options:
+        # Every worker runs its own log writer and rotates its own file
+        log_pipeline = LogPipeline(**dict(
+            log_options, log_file=shard_path(log_options['log_file'], shard)
+        )).start()
+    elif not logging.getLogger().handlers:
+        logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+
+    if options.pop('metrics', False):
+        metrics.enable()
+    cookie_store, _ = open_account_source(source)
+    checkpoint = options.pop('checkpoint', None)
+    config = options.pop('config', None)
+    fleet = AccountFleet(
+        accounts,
+        cookie_store=cookie_store,
+        # Shards share the ledger and checkpoint, so an account's state
+        # follows it when the shard count changes
+        ledger=SignInLedger(options.pop('ledger')),
+        checkpoint=DaemonCheckpoint(checkpoint) if checkpoint else None,
+        egress_entries=load_egress_entries(
+            config, pool_maxsize=AccountFleet.pool_size(options.get('max_workers', 8))
+        ) if config else None,
+        **options
+    )
+    stopped = threading.Event()
+    send_lock = threading.Lock()
+
+    def handle_sigterm(signum, frame):
+        stopped.set()
+        fleet.stop()
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+    def report():
+        with send_lock:
+            conn.send({
+                'shard': shard,
+                'status': fleet.status(),
+                'metrics': metrics.REGISTRY.snapshot(),
+            })
+
+    def reporter():
+        while not stopped.wait(report_interval):
+            report()
+
+    threading.Thread(target=reporter, name='NetEaseShardReporter', daemon=True).start()
+    logger.info(f'Shard {shard} started with {len(accounts)} accounts')
+    fleet.schedule_accounts(interval_hours, jitter_minutes)
+    fleet.serve()
+    report()
+    if log_pipeline is not None:
+        # Worker processes exit without running atexit handlers
+        log_pipeline.stop()
+
+
+class ShardCoordinator:
+    """
+    Supervisor of the worker processes of a sharded fleet.
+
+    Workers report their fleet status and a metrics snapshot every few
+    seconds, each over its own pipe so a worker killed mid-write cannot
+    block the others, and are stopped with SIGTERM. The coordinator keeps
+    the latest report per shard and loads the sum into its own metrics
+    registry, so the metrics endpoint shows the whole fleet. A worker
+    that dies is restarted with exponential backoff; the counters it had
+    reported are kept so merged totals never go backwards.
+    """
+
+    RESTART_BACKOFF_MAX = 60.0
+    # A worker that ran this long before dying restarts without backoff
+    STABLE_AFTER = 300.0
+    STATUS_INTERVAL = 300.0
+    SHUTDOWN_TIMEOUT = 30.0
+
+    def __init__(self, source: str, accounts: List[str], shards: int,
+                 fleet_options: Optional[dict] = None, report_interval: float = 5.0):
+        """
+        Initialize the coordinator.
+
+        Args:
+            source: Accounts source every worker opens its cookie store from
+            accounts: Account keys to spread over the shards
+            shards: Number of worker processes
+            fleet_options: AccountFleet keyword arguments for every worker,
+                plus ``ledger`` (base ledger path), ``checkpoint`` (base
+                checkpoint path, or None), ``config`` (config.json
+                listing the egress addresses, or None) and ``logging``
+                (LogPipeline options, or None)
+            report_interval: Seconds between worker reports
+        """
+        self.source = source
+        self.assignments = partition_accounts(accounts, shards)
+        # Shards with accounts; empty ones get no worker process
+        self.active_shards = [shard for shard, assigned in enumerate(self.assignments) if assigned]
+        self.fleet_options = dict(fleet_options or {})
+        self.fleet_options.setdefault('ledger', 'signin_ledger.json')
+        self.report_interval = report_interval
+        self.running = True
+
+        self._context = multiprocessing.get_context()
+        self._connections: Dict[int, Connection] = {}
+        self._processes: Dict[int, multiprocessing.process.BaseProcess] = {}
+        self._started: Dict[int, float] = {}
+        self._restarts: Dict[int, int] = {}
+        self._restart_at: Dict[int, float] = {}
+        self._status: Dict[int, dict] = {}
+        self._metrics: Dict[int, dict] = {}
+        self._retired_metrics: dict = {}
+        self._schedule = (24, 5)
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self.assignments)
+
+    def _start(self, shard: int):
+        """Start (or restart) the worker process of a shard."""
+        options = dict(self.fleet_options, metrics=metrics.REGISTRY.enabled)
+        reader, writer = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=_run_shard,
+            name=f'NetEaseShard-{shard}',
+            args=(shard, self.source, self.assignments[shard], options,
+                  *self._schedule, writer, self.report_interval)
+        )
+        process.start()
+        previous = self._connections.pop(shard, None)
+        if previous is not None:
+            previous.close()
+        # Only the worker writes; closing our copy lets recv() see its exit
+        writer.close()
+        self._processes[shard] = process
+        self._connections[shard] = reader
+        self._started[shard] = time.monotonic()
+        self._restart_at.pop(shard, None)
+        logger.info(f'Started shard {shard} (pid {process.pid}, '
+                    f'{len(self.assignments[shard])} accounts)')
+
+    def _drain(self, timeout: float) -> bool:
+        """
+        Apply every pending worker report.
+
+        Args:
+            timeout: Seconds to wait for the first report
+
+        Returns:
+            True if any report was applied
+        """
+        applied = False
+        readers = {conn: shard for shard, conn in self._connections.items()}
+        while readers:
+            ready = wait(list(readers), timeout)
+            if not ready:
+                break
+            timeout = 0
+            for conn in ready:
+                shard = readers[conn]
+                try:
+                    report = conn.recv()
+                except (EOFError, OSError):
+                    # Worker exited; _supervise() handles the process
+                    conn.close()
+                    del self._connections[shard]
+                    del readers[conn]
+                    continue
+                self._status[shard] = report['status']
+                self._metrics[shard] = report['metrics']
+                applied = True
+        return applied
+
+    def _merge_metrics(self):
+        """Load the merged metrics of every shard into the local registry."""
+        metrics.REGISTRY.restore(
+            metrics.merge_snapshots([self._retired_metrics, *self._metrics.values()])
+        )
+
+    def _supervise(self) -> bool:
+        """
+        Schedule restarts of dead workers and start those that are due.
+
+        Returns:
+            True if a worker died since the last call
+        """
+        died = False
+        now = time.monotonic()
+        for shard, process in list(self._processes.items()):
+            if process.is_alive():
+                continue
+            if shard not in self._restart_at:
+                died = True
+                process.join()
+                logger.warning(f'Shard {shard} (pid {process.pid}) exited '
+                               f'with code {process.exitcode}')
+                # Keep the counters the dead worker reported
+                self._retired_metrics = metrics.merge_snapshots(
+                    [self._retired_metrics, self._metrics.pop(shard, {})]
+                )
+                if now - self._started[shard] >= self.STABLE_AFTER:
+                    self._restarts[shard] = 0
+                self._restarts[shard] = self._restarts.get(shard, 0) + 1
+                delay = min(self.RESTART_BACKOFF_MAX, 2.0 ** (self._restarts[shard] - 1))
+                self._restart_at[shard] = now + delay
+                logger.info(f'Restarting shard {shard} in {delay:.0f}s')
+            elif now >= self._restart_at[shard]:
+                self._start(shard)
+        return died
+
+    def status(self) -> dict:
+        """
+        Merge the latest status reported by every shard.
+
+        Returns:
+            Dictionary with fleet-wide counts plus shard, alive and restart counts
+        """
+        merged = {'accounts': len(self), 'refreshed': 0, 'succeeded': 0, 'failed': 0}
+        for status in self._status.values():
+            for field in ('refreshed', 'succeeded', 'failed'):
+                merged[field] += status.get(field, 0)
+        merged['shards'] = len(self.active_shards)
+        merged['alive'] = sum(1 for process in self._processes.values() if process.is_alive())
+        merged['restarts'] = sum(self._restarts.values())
+        return merged
+
+    def run(self, interval_hours: float = 24, jitter_minutes: float = 5):
+        """
+        Start every worker and supervise them until stop() is called.
+
+        Args:
+            interval_hours: Hours between refreshes of an account
+            jitter_minutes: Spread of first refreshes and per-cycle jitter
+        """
+        self._schedule = (interval_hours, jitter_minutes)
+        merge_shard_files(self.fleet_options['ledger'], SignInLedger)
+        if self.fleet_options.get('checkpoint'):
+            merge_shard_files(self.fleet_options['checkpoint'], DaemonCheckpoint)
+        for shard in self.active_shards:
+            self._start(shard)
+
+        last_status = time.monotonic()
+        while self.running:
+            changed = self._drain(timeout=1.0)
+            if self._supervise() or changed:
+                self._merge_metrics()
+            if time.monotonic() - last_status >= self.STATUS_INTERVAL:
+                logger.info(f'Fleet status: {self.status()}')
+                last_status = time.monotonic()
+
+        self._shutdown()
+
+    def _shutdown(self):
+        """Stop every worker, collecting their final reports."""
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + self.SHUTDOWN_TIMEOUT
+        # Keep draining so workers never block on a full pipe while exiting
+        while time.monotonic() < deadline and any(
+            process.is_alive() for process in self._processes.values()
+        ):
+            self._drain(timeout=0.2)
+        self._drain(timeout=0.2)
+
+        for shard, process in self._processes.items():
+            if process.is_alive():
+                logger.warning(f'Shard {shard} did not stop in time, killing')
+                process.kill()
+            process.join()
+        self._merge_metrics()
+        logger.info(f'Fleet status: {self.status()}')
+
+    def stop(self):
+        """Request shutdown; safe to call from a signal handler."""
+        self.running = False
+
+    def run_daemon(self, interval_hours: float = 24, jitter_minutes: float = 5):
+        """
+        Run as daemon with every shard in its own worker process.
+
+        Args:
+            interval_hours: Hours between refreshes of an account
+            jitter_minutes: Spread of first refreshes and per-cycle jitter
+        """
+        print('=' * 50)
+        print('NetEase Music World - Sharded Daemon Mode')
+        print('网易云音乐海外版 - 多进程守护进程模式')
+        print('=' * 50)
+
+        if not self.active_shards:
+            print('\n未找到任何账号')
+            print('No accounts found')
+            return
+
+        shards = len(self.active_shards)
+        print(f'\n已加载 {len(self)} 个账号，分布在 {shards} 个进程中，每 {interval_hours} 小时刷新一次')
+        print(f'Loaded {len(self)} accounts across {shards} processes, '
+              f'refreshing every {interval_hours} hours')
+        print('按 Ctrl+C 停止 / Press Ctrl+C to stop\n')
+
+        # Handle graceful shutdown
+        def signal_handler(signum, frame):
+            print('\n\n正在停止守护进程...')
+            print('Stopping daemon...')
+            self.stop()
+
+        signal.signal(signal.SIGINT, signal_handler)
+        signal.signal(signal.SIGTERM, signal_handler)
+
+        self.run(interval_hours, jitter_minutes)
+        print('守护进程已停止')
+        print('Daemon stopped')
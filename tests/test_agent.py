@@ -0,0 +1,119 @@
+"""
+Tests for the local agent's client fallback and concurrent requests.
+
+Run with:
+    python -m pytest tests
+"""
+
+import os
+import socket
+import tempfile
+import threading
+import unittest
+
+from agent import AgentServer, account_key, call_agent
+from fleet import load_account_files
+
+
+class FakeApp:
+    """Application printing its account name once every other one has started."""
+
+    def __init__(self, name: str, barrier: threading.Barrier):
+        self.name = name
+        self.barrier = barrier
+        self.force_sign_in = False
+
+    def check_status(self):
+        self.barrier.wait(timeout=5)
+        for _ in range(100):
+            print(self.name)
+        return True
+
+    def cookies_version(self):
+        return None
+
+    def close(self):
+        pass
+
+
+@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'Unix sockets required')
+class CallAgentTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'agent.sock')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def listen(self) -> socket.socket:
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.path)
+        server.listen(1)
+        self.addCleanup(server.close)
+        return server
+
+    def test_missing_socket(self):
+        self.assertIsNone(call_agent({'command': 'ping'}, self.path))
+
+    def test_path_is_not_a_socket(self):
+        with open(self.path, 'w'):
+            pass
+        self.assertIsNone(call_agent({'command': 'ping'}, self.path))
+
+    def test_agent_times_out(self):
+        self.listen()
+        self.assertIsNone(call_agent({'command': 'ping'}, self.path, timeout=0.1))
+
+    def test_agent_resets_connection(self):
+        server = self.listen()
+
+        def reset():
+            conn, _ = server.accept()
+            conn.recv(1024)
+            conn.close()
+
+        thread = threading.Thread(target=reset)
+        thread.start()
+        self.assertIsNone(call_agent({'command': 'ping'}, self.path))
+        thread.join()
+
+
+class AgentServerTest(unittest.TestCase):
+
+    def test_accounts_run_concurrently_with_separate_output(self):
+        barrier = threading.Barrier(2)
+        server = AgentServer(lambda cookies, store, ledger: FakeApp(cookies, barrier))
+        responses = {}
+
+        def request(name):
+            responses[name] = server.handle(
+                {'command': 'status', 'cookies': name, 'ledger': 'ledger.json'}
+            )
+
+        threads = [threading.Thread(target=request, args=(name,)) for name in ('a', 'b')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Both requests reached the barrier, so neither waited for the other
+        self.assertFalse(barrier.broken)
+        for name in ('a', 'b'):
+            self.assertEqual(responses[name]['output'], f'{name}\n' * 100)
+
+
+class AccountKeyTest(unittest.TestCase):
+
+    def test_fleet_paths_are_account_keys(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            open(os.path.join(tmp, 'a.json'), 'w').close()
+            manifest = os.path.join(tmp, 'accounts.txt')
+            with open(manifest, 'w') as f:
+                f.write('a.json\n')
+            expected = [account_key(os.path.join(tmp, 'a.json'))]
+            self.assertEqual(load_account_files(os.path.relpath(tmp)), expected)
+            self.assertEqual(load_account_files(manifest), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
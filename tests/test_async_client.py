@@ -0,0 +1,60 @@
+"""
+Smoke tests for AsyncNetEaseClient against the local stub server.
+
+Run with:
+    python -m pytest tests
+"""
+
+import asyncio
+import os
+import tempfile
+import unittest
+
+import aiohttp
+
+from async_client import AsyncNetEaseClient
+from benchmarks.stub_server import StubServer
+
+
+class AsyncClientSmokeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cookie_file = os.path.join(self.tmp.name, 'cookies.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_client(self, base_url: str, **kwargs) -> AsyncNetEaseClient:
+        client = AsyncNetEaseClient(self.cookie_file, **kwargs)
+        client.BASE_URL = base_url
+        return client
+
+    def test_requests_against_stub(self):
+        async def scenario(base_url):
+            async with self.make_client(base_url) as client:
+                self.assertTrue(await client.is_logged_in())
+                self.assertEqual(await client.get_qr_key(), 'stub-unikey')
+                self.assertEqual((await client.daily_sign_in(0))['code'], 200)
+                self.assertTrue(await client.refresh_ip_session())
+
+        with StubServer() as stub:
+            asyncio.run(scenario(stub.base_url))
+
+    def test_default_timeout_matches_transport(self):
+        timeout = AsyncNetEaseClient.DEFAULT_TIMEOUT
+        self.assertEqual((timeout.sock_connect, timeout.sock_read), (5.0, 15.0))
+
+    def test_stalled_response_times_out(self):
+        async def scenario(base_url):
+            timeout = aiohttp.ClientTimeout(sock_read=0.1)
+            async with self.make_client(base_url, timeout=timeout) as client:
+                return await client.get_user_account()
+
+        with StubServer(latency=1.0) as stub:
+            result = asyncio.run(scenario(stub.base_url))
+        self.assertEqual(result['code'], -1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+"""
+Tests for migrating cookie files written by earlier versions.
+
+Run with:
+    python -m pytest tests
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+from netease_client import NetEaseClient
+
+
+class CookieMigrationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cookie_file = os.path.join(self.tmp.name, 'cookies.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, cookies):
+        with open(self.cookie_file, 'w', encoding='utf-8') as f:
+            json.dump(cookies, f)
+
+    def read(self) -> list:
+        with open(self.cookie_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def test_legacy_round_trip(self):
+        self.write({'__csrf': 'old', 'MUSIC_U': 'user'})
+        client = NetEaseClient(self.cookie_file)
+        # The server refreshes __csrf for its own domain
+        client.session.cookies.set('__csrf', 'new', domain='.music.163.com', path='/')
+        client._save_cookies()
+
+        saved = self.read()
+        self.assertEqual(sorted(cookie['name'] for cookie in saved), ['MUSIC_U', '__csrf'])
+        for cookie in saved:
+            self.assertEqual((cookie['domain'], cookie['path']), ('.music.163.com', '/'))
+
+        client = NetEaseClient(self.cookie_file)
+        self.assertEqual(client.session.cookies.get('__csrf'), 'new')
+        self.assertEqual(client.session.cookies.get('MUSIC_U'), 'user')
+
+    def test_domainless_duplicates_are_dropped(self):
+        self.write([
+            {'name': '__csrf', 'value': 'old', 'domain': '', 'path': '/'},
+            {'name': '__csrf', 'value': 'new', 'domain': '.music.163.com', 'path': '/'},
+            {'name': 'MUSIC_U', 'value': 'user', 'domain': '', 'path': '/'},
+        ])
+        client = NetEaseClient(self.cookie_file)
+        self.assertEqual(client.session.cookies.get('__csrf'), 'new')
+        client._save_cookies()
+
+        saved = {cookie['name']: cookie for cookie in self.read()}
+        self.assertEqual(len(self.read()), 2)
+        self.assertEqual(saved['__csrf']['value'], 'new')
+        self.assertEqual(saved['MUSIC_U']['domain'], '.music.163.com')
+
+
+if __name__ == '__main__':
+    unittest.main()
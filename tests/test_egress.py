@@ -0,0 +1,80 @@
+"""
+Tests for egress placement and the fleet's use of egress transports.
+
+Run with:
+    python -m pytest tests
+"""
+
+import unittest
+
+from egress import EgressEntry, EgressPool
+from fleet import AccountFleet
+
+ACCOUNTS = [f'/accounts/{i}.json' for i in range(2000)]
+IPS = ('211.161.244.70', '211.161.244.71', '211.161.244.72')
+
+
+def make_pool() -> EgressPool:
+    return EgressPool([EgressEntry(ip) for ip in IPS])
+
+
+class EgressPlacementTest(unittest.TestCase):
+
+    def test_first_placement_is_deterministic(self):
+        first, second = make_pool(), make_pool()
+        for account in ACCOUNTS[:200]:
+            self.assertEqual(first.assign(account).ip, second.assign(account).ip)
+
+    def test_placement_follows_weights(self):
+        pool = make_pool()
+        fast = pool.entries[0]
+        fast.latency = 0.1
+        for entry in pool.entries[1:]:
+            entry.latency = 0.4
+        counts = {entry.ip: 0 for entry in pool.entries}
+        for account in ACCOUNTS:
+            counts[pool.assign(account).ip] += 1
+        # Weights 10:2.5:2.5, so the fast entry should get about two thirds
+        self.assertGreater(counts[fast.ip], len(ACCOUNTS) * 0.55)
+        self.assertLess(counts[fast.ip], len(ACCOUNTS) * 0.78)
+
+    def test_unhealthy_entry_gets_no_new_accounts(self):
+        pool = make_pool()
+        bad = pool.entries[1]
+        for _ in range(10):
+            bad.record(False, 1.0)
+        self.assertFalse(bad.healthy)
+        for account in ACCOUNTS[:200]:
+            self.assertIsNot(pool.assign(account), bad)
+
+    def test_removing_an_entry_only_moves_its_accounts(self):
+        before = make_pool()
+        after = EgressPool([EgressEntry(ip) for ip in IPS[:2]])
+        for account in ACCOUNTS[:500]:
+            ip = before.assign(account).ip
+            if ip in IPS[:2]:
+                self.assertEqual(after.assign(account).ip, ip)
+
+
+class FleetEgressTest(unittest.TestCase):
+
+    def test_fleet_uses_egress_transports_only(self):
+        fleet = AccountFleet([], max_workers=2, egress_entries=[EgressEntry(ip) for ip in IPS])
+        try:
+            self.assertIsNone(fleet.transport)
+            self.assertIsNone(fleet.session_pool)
+            self.assertEqual(set(fleet.transport_stats()), set(IPS))
+        finally:
+            fleet.close()
+
+    def test_fleet_without_egress_has_own_transport(self):
+        fleet = AccountFleet([], max_workers=2)
+        try:
+            self.assertIsNotNone(fleet.transport)
+            self.assertEqual(set(fleet.transport_stats()), {'default'})
+        finally:
+            fleet.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+Tests for the sign-in ledger and daemon checkpoint journals.
+
+Run with:
+    python -m pytest tests
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+from checkpoint import DaemonCheckpoint
+from journal import JsonJournal
+from ledger import SignInLedger
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.ledger_path = os.path.join(self.tmp.name, 'signin_ledger.json')
+        self.checkpoint_path = os.path.join(self.tmp.name, 'daemon_checkpoint.jsonl')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read_lines(self, path: str) -> list:
+        with open(path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_ledger_replay(self):
+        ledger = SignInLedger(self.ledger_path)
+        ledger.record('a', 0, '2024-01-01')
+        ledger.record('a', 0, '2024-01-02')
+        ledger.record('b', 1, '2024-01-02')
+        ledger.close()
+
+        ledger = SignInLedger(self.ledger_path)
+        self.assertTrue(ledger.is_signed_in('a', 0, '2024-01-02'))
+        self.assertFalse(ledger.is_signed_in('a', 1, '2024-01-02'))
+        self.assertTrue(ledger.is_signed_in('b', 1, '2024-01-02'))
+        ledger.close()
+
+    def test_legacy_ledger_is_converted(self):
+        with open(self.ledger_path, 'w', encoding='utf-8') as f:
+            json.dump({'a': {'0': '2024-01-01'}}, f)
+        ledger = SignInLedger(self.ledger_path)
+        self.assertTrue(ledger.is_signed_in('a', 0, '2024-01-01'))
+        ledger.record('a', 1, '2024-01-01')
+        ledger.close()
+
+        self.assertCountEqual(self.read_lines(self.ledger_path), [
+            {'account': 'a', 'type': 0, 'date': '2024-01-01'},
+            {'account': 'a', 'type': 1, 'date': '2024-01-01'},
+        ])
+
+    def test_checkpoint_replay_merges_fields(self):
+        checkpoint = DaemonCheckpoint(self.checkpoint_path)
+        checkpoint.record('a', last_refresh=1.0, next_due=10.0)
+        checkpoint.record('a', next_due=20.0)
+        checkpoint.close()
+
+        checkpoint = DaemonCheckpoint(self.checkpoint_path)
+        self.assertEqual(checkpoint.get('a', 'last_refresh'), 1.0)
+        self.assertEqual(checkpoint.next_due('a'), 20.0)
+        checkpoint.close()
+
+    def test_compaction_keeps_latest_values(self):
+        checkpoint = DaemonCheckpoint(self.checkpoint_path)
+        checkpoint._journal.COMPACT_MIN_LINES = 8
+        for due in range(10):
+            checkpoint.record('a', next_due=float(due))
+            checkpoint.record('b', last_refresh=float(due))
+        checkpoint.close()
+
+        self.assertLess(len(self.read_lines(self.checkpoint_path)), 8)
+        checkpoint = DaemonCheckpoint(self.checkpoint_path)
+        self.assertEqual(checkpoint.next_due('a'), 9.0)
+        self.assertEqual(checkpoint.get('b', 'last_refresh'), 9.0)
+        checkpoint.close()
+
+    def test_torn_line_is_skipped_and_terminated(self):
+        with open(self.checkpoint_path, 'w', encoding='utf-8') as f:
+            f.write('{"account":"a","next_due":1.0}\n{"account":"b","ne')
+        checkpoint = DaemonCheckpoint(self.checkpoint_path)
+        self.assertEqual(len(checkpoint), 1)
+        checkpoint.record('c', next_due=3.0)
+        checkpoint.close()
+
+        checkpoint = DaemonCheckpoint(self.checkpoint_path)
+        self.assertEqual(checkpoint.next_due('a'), 1.0)
+        self.assertEqual(checkpoint.next_due('c'), 3.0)
+        checkpoint.close()
+
+    def test_compaction_by_another_writer_loses_nothing(self):
+        first = SignInLedger(self.ledger_path)
+        second = SignInLedger(self.ledger_path)
+        first.record('a', 0, '2024-01-01')
+        second.record('b', 0, '2024-01-01')
+        second._journal.compact()
+        # The first writer's file was replaced; it must append to the new one
+        first.record('c', 0, '2024-01-01')
+        first.close()
+        second.close()
+
+        ledger = SignInLedger(self.ledger_path)
+        for account in ('a', 'b', 'c'):
+            self.assertTrue(ledger.is_signed_in(account, 0, '2024-01-01'))
+        ledger.close()
+
+    def test_journal_merges_by_key(self):
+        journal = JsonJournal(self.checkpoint_path, lambda update: update['id'])
+        journal.append({'id': 1, 'x': 1}, keys=1)
+        journal.append({'id': 1, 'y': 2}, keys=1)
+        journal.compact()
+        journal.close()
+        self.assertEqual(self.read_lines(self.checkpoint_path), [{'id': 1, 'x': 1, 'y': 2}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+"""
+Tests for the queued log pipeline's formatting and rotation.
+
+Run with:
+    python -m pytest tests
+"""
+
+import json
+import logging
+import os
+import tempfile
+import time
+import unittest
+
+from log_pipeline import LogPipeline, SizeAndTimeRotatingFileHandler
+
+
+class LogPipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.tmp.name, 'netease_music.log')
+        root = logging.getLogger()
+        self.saved = (list(root.handlers), root.level)
+
+    def tearDown(self):
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        handlers, level = self.saved
+        for handler in handlers:
+            root.addHandler(handler)
+        root.setLevel(level)
+        self.tmp.cleanup()
+
+    def run_pipeline(self, json_lines: bool) -> str:
+        pipeline = LogPipeline(self.log_file, json_lines=json_lines, console=False).start()
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            logging.getLogger('NetEaseTest').exception('Refresh %s failed', 'a')
+        pipeline.stop()
+        with open(self.log_file, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def test_json_lines_keep_exception(self):
+        entries = [json.loads(line) for line in self.run_pipeline(json_lines=True).splitlines()]
+        entry = next(entry for entry in entries if entry['logger'] == 'NetEaseTest')
+        self.assertEqual(entry['message'], 'Refresh a failed')
+        self.assertIn('ValueError: boom', entry['exception'])
+
+    def test_text_keeps_exception(self):
+        text = self.run_pipeline(json_lines=False)
+        self.assertIn('Refresh a failed\nTraceback', text)
+        self.assertIn('ValueError: boom', text)
+
+
+class TimeRotationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.tmp.name, 'netease_music.log')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def record(self) -> logging.LogRecord:
+        return logging.LogRecord('NetEaseTest', logging.INFO, __file__, 1, 'hello', None, None)
+
+    def test_rotation_is_aligned(self):
+        handler = SizeAndTimeRotatingFileHandler(self.log_file, interval=3600)
+        self.assertEqual(handler.rollover_at % 3600, 0)
+        self.assertLessEqual(handler.rollover_at - time.time(), 3600)
+        handler.close()
+
+    def test_file_from_before_the_boundary_rotates(self):
+        with open(self.log_file, 'w') as f:
+            f.write('old\n')
+        stale = time.time() - 2 * 3600
+        os.utime(self.log_file, (stale, stale))
+        handler = SizeAndTimeRotatingFileHandler(self.log_file, interval=3600)
+        self.assertTrue(handler.shouldRollover(self.record()))
+        handler.emit(self.record())
+        handler.close()
+        self.assertTrue(os.path.exists(self.log_file + '.1'))
+        self.assertGreater(handler.rollover_at, time.time())
+
+    def test_current_file_does_not_rotate(self):
+        with open(self.log_file, 'w') as f:
+            f.write('recent\n')
+        handler = SizeAndTimeRotatingFileHandler(self.log_file, interval=24 * 3600)
+        self.assertFalse(handler.shouldRollover(self.record()))
+        handler.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
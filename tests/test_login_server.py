@@ -0,0 +1,113 @@
+"""
+Tests for the batch QR login server's session handling.
+
+Run with:
+    python -m pytest tests
+"""
+
+import tempfile
+import threading
+import time
+import unittest
+
+from login_server import LoginServer, SessionLimitError
+
+
+class FakeClient:
+    """Client answering QR requests from lists of results."""
+
+    def __init__(self, qr_keys=('key',), status_delay: float = 0.0):
+        self.qr_keys = list(qr_keys)
+        self.status_delay = status_delay
+        self.released = threading.Event()
+
+    def get_qr_key(self):
+        return self.qr_keys.pop(0) if len(self.qr_keys) > 1 else self.qr_keys[0]
+
+    def check_qr_status(self, qr_key):
+        if self.status_delay:
+            self.released.wait(self.status_delay)
+        return {'code': 801}
+
+
+class LoginServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.server = LoginServer(self.tmp.name, max_workers=4)
+
+    def tearDown(self):
+        self.server.executor.shutdown()
+        self.server.crypto.stop()
+        self.tmp.cleanup()
+
+    def open_session(self, client: FakeClient):
+        session = self.server.create_session()
+        session.client = client
+        return session
+
+    def wait_idle(self, *sessions):
+        deadline = time.monotonic() + 5
+        while any(session.polling for session in sessions) and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_failed_qr_key_is_retried_with_backoff(self):
+        session = self.open_session(FakeClient(qr_keys=(None, None, 'key')))
+        self.server.poll_due()
+        self.wait_idle(session)
+        self.assertEqual(session.state, 'pending')
+        self.assertEqual(session.interval, LoginServer.POLL_START * 2)
+
+        for _ in range(2):
+            session.next_poll = 0.0
+            self.server.poll_due()
+            self.wait_idle(session)
+        self.assertEqual(session.state, 'waiting')
+        self.assertEqual(session.qr_key, 'key')
+
+    def test_slow_poll_does_not_block_others(self):
+        slow = self.open_session(FakeClient(status_delay=5.0))
+        fast = self.open_session(FakeClient())
+        for session in (slow, fast):
+            session.qr_key = 'key'
+            session.state = 'waiting'
+
+        start = time.monotonic()
+        self.server.poll_due()
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.wait_idle(fast)
+        self.assertTrue(slow.polling)
+        # The fast session is polled again while the slow one is still running
+        fast.next_poll = 0.0
+        self.server.poll_due()
+        self.wait_idle(fast)
+        self.assertTrue(slow.polling)
+        slow.client.released.set()
+        self.wait_idle(slow)
+
+    def test_live_sessions_are_capped(self):
+        for _ in range(LoginServer.MAX_SESSIONS):
+            self.server.create_session()
+        with self.assertRaises(SessionLimitError):
+            self.server.create_session()
+
+    def test_stale_sessions_expire_and_are_dropped(self):
+        session = self.open_session(FakeClient())
+        session.created_at -= LoginServer.SESSION_TTL
+        session.next_poll = time.monotonic() + 60
+        self.server.poll_due()
+        self.assertEqual(session.state, 'expired')
+        session.finished_at -= LoginServer.FINISHED_KEEP
+        self.server.poll_due()
+        self.assertNotIn(session.id, self.server.sessions)
+
+    def test_origin_check(self):
+        allowed = self.server.origin_allowed
+        self.assertTrue(allowed(None, '127.0.0.1:8765'))
+        self.assertTrue(allowed('http://127.0.0.1:8765', '127.0.0.1:8765'))
+        self.assertFalse(allowed('https://evil.example', '127.0.0.1:8765'))
+        self.assertFalse(allowed('null', '127.0.0.1:8765'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+"""
+Tests for shard partitioning and merging per-shard state files.
+
+Run with:
+    python -m pytest tests
+"""
+
+import os
+import tempfile
+import unittest
+
+from checkpoint import DaemonCheckpoint
+from ledger import SignInLedger
+from shards import merge_shard_files, partition_accounts, shard_path
+
+ACCOUNTS = [f'accounts/{i}.json' for i in range(200)]
+
+
+class PartitionTest(unittest.TestCase):
+
+    def shard_of(self, buckets) -> dict:
+        return {account: shard for shard, bucket in enumerate(buckets) for account in bucket}
+
+    def test_input_order_does_not_matter(self):
+        self.assertEqual(partition_accounts(ACCOUNTS, 4),
+                         partition_accounts(list(reversed(ACCOUNTS)), 4))
+
+    def test_adding_accounts_keeps_existing_shards(self):
+        before = self.shard_of(partition_accounts(ACCOUNTS[:100], 4))
+        after = self.shard_of(partition_accounts(ACCOUNTS, 4))
+        for account, shard in before.items():
+            self.assertEqual(after[account], shard)
+
+    def test_empty_shards_are_kept(self):
+        buckets = partition_accounts(ACCOUNTS[:1], 4)
+        self.assertEqual(len(buckets), 4)
+        self.assertEqual(sum(len(bucket) for bucket in buckets), 1)
+
+    def test_shard_path(self):
+        self.assertEqual(shard_path('logs/netease_music.log', 2), 'logs/netease_music.shard2.log')
+
+
+class MergeShardFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.ledger_path = os.path.join(self.tmp.name, 'signin_ledger.json')
+        self.checkpoint_path = os.path.join(self.tmp.name, 'daemon_checkpoint.jsonl')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_ledgers_merge_into_shared_file(self):
+        for shard, date in enumerate(('2024-01-02', '2024-01-01')):
+            ledger = SignInLedger(shard_path(self.ledger_path, shard))
+            ledger.record('a', 0, date)
+            ledger.record(f'only{shard}', 1, date)
+            ledger.close()
+
+        self.assertEqual(merge_shard_files(self.ledger_path, SignInLedger), 2)
+        self.assertFalse(os.path.exists(shard_path(self.ledger_path, 0)))
+        ledger = SignInLedger(self.ledger_path)
+        self.assertTrue(ledger.is_signed_in('a', 0, '2024-01-02'))
+        self.assertTrue(ledger.is_signed_in('only0', 1, '2024-01-02'))
+        self.assertTrue(ledger.is_signed_in('only1', 1, '2024-01-01'))
+        ledger.close()
+        self.assertEqual(merge_shard_files(self.ledger_path, SignInLedger), 0)
+
+    def test_checkpoints_keep_newest_fields(self):
+        checkpoint = DaemonCheckpoint(shard_path(self.checkpoint_path, 0))
+        checkpoint.record('a', last_refresh=5.0, next_due=50.0)
+        checkpoint.close()
+        checkpoint = DaemonCheckpoint(shard_path(self.checkpoint_path, 3))
+        checkpoint.record('a', last_refresh=9.0, next_due=10.0)
+        checkpoint.close()
+
+        merge_shard_files(self.checkpoint_path, DaemonCheckpoint)
+        checkpoint = DaemonCheckpoint(self.checkpoint_path)
+        self.assertEqual(checkpoint.get('a', 'last_refresh'), 9.0)
+        self.assertEqual(checkpoint.next_due('a'), 50.0)
+        checkpoint.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+"""
+Tests for the transport's concurrency slots and circuit breaker.
+
+Run with:
+    python -m pytest tests
+"""
+
+import threading
+import unittest
+
+import requests
+
+from transport import (
+    CircuitBreaker, CircuitOpenError, EndpointPolicy, RateLimitedError, Transport
+)
+
+ENDPOINT = '/test'
+
+
+class FakeResponse:
+    def __init__(self, status_code: int = 200):
+        self.status_code = status_code
+
+
+class FakeSession:
+    """Session answering every request from a list of responses or exceptions."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+def make_transport(policy: EndpointPolicy = None, breaker: CircuitBreaker = None,
+                   max_concurrency: int = 1) -> Transport:
+    return Transport(
+        policies={ENDPOINT: policy or EndpointPolicy(max_wait=0.0)},
+        breaker=breaker, max_concurrency=max_concurrency, backoff_base=0.0
+    )
+
+
+class ConcurrencySlotTest(unittest.TestCase):
+    """Every exit path of Transport.request frees its concurrency slot."""
+
+    def assert_no_slot_held(self, transport: Transport):
+        self.assertEqual(transport.stats()[ENDPOINT]['in_flight'], 0)
+
+    def test_other_request_exception_frees_slot(self):
+        for error in (requests.exceptions.ChunkedEncodingError('truncated'),
+                      requests.exceptions.ContentDecodingError('bad gzip'),
+                      requests.exceptions.TooManyRedirects('loop'),
+                      requests.exceptions.InvalidHeader('bad header')):
+            with self.subTest(error=type(error).__name__):
+                transport = make_transport()
+                with self.assertRaises(type(error)):
+                    transport.request(FakeSession(error), 'GET', 'http://stub/', ENDPOINT)
+                self.assert_no_slot_held(transport)
+                response = transport.request(FakeSession(FakeResponse()), 'GET',
+                                             'http://stub/', ENDPOINT)
+                self.assertEqual(response.status_code, 200)
+
+    def test_retried_failures_free_slots(self):
+        transport = make_transport(EndpointPolicy(idempotent=True, retries=2, max_wait=0.0))
+        session = FakeSession(requests.ConnectionError('reset'), FakeResponse(503),
+                              FakeResponse(200))
+        response = transport.request(session, 'GET', 'http://stub/', ENDPOINT)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(session.calls, 3)
+        self.assert_no_slot_held(transport)
+
+    def test_shed_request_takes_no_slot_or_token(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=3600)
+        breaker.record_failure()
+        transport = make_transport(EndpointPolicy(rate=0.001, burst=1, max_wait=0.0),
+                                   breaker=breaker, max_concurrency=4)
+        limit = transport.limiter_for(ENDPOINT).limit
+        with self.assertRaises(CircuitOpenError):
+            transport.request(FakeSession(FakeResponse()), 'GET', 'http://stub/', ENDPOINT)
+        self.assert_no_slot_held(transport)
+        self.assertEqual(transport.limiter_for(ENDPOINT).limit, limit)
+        # The single burst token is still there
+        self.assertEqual(transport.bucket_for(ENDPOINT).reserve(0.0), 0.0)
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    """Half-open trials always settle, so the breaker cannot stay half-open."""
+
+    def open_breaker(self) -> CircuitBreaker:
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        return breaker
+
+    def test_rate_limited_request_does_not_take_trial(self):
+        breaker = self.open_breaker()
+        transport = make_transport(EndpointPolicy(rate=0.001, burst=1, max_wait=0.0),
+                                   breaker=breaker, max_concurrency=0)
+        transport.bucket_for(ENDPOINT).reserve(0.0)
+        with self.assertRaises(RateLimitedError):
+            transport.request(FakeSession(FakeResponse()), 'GET', 'http://stub/', ENDPOINT)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        # The trial was handed back, so the next request may take it
+        self.assertTrue(breaker.allow())
+
+    def test_concurrency_limited_request_does_not_take_trial(self):
+        breaker = self.open_breaker()
+        transport = make_transport(breaker=breaker)
+        started = transport.limiter_for(ENDPOINT).acquire()
+        with self.assertRaises(RateLimitedError):
+            transport.request(FakeSession(FakeResponse()), 'GET', 'http://stub/', ENDPOINT)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        transport.limiter_for(ENDPOINT).release(started, ok=True)
+        transport.request(FakeSession(FakeResponse()), 'GET', 'http://stub/', ENDPOINT)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_trial_raising_other_exception_reopens(self):
+        breaker = self.open_breaker()
+        transport = make_transport(breaker=breaker, max_concurrency=0)
+        with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+            transport.request(FakeSession(requests.exceptions.ChunkedEncodingError('x')),
+                              'GET', 'http://stub/', ENDPOINT)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        transport.request(FakeSession(FakeResponse()), 'GET', 'http://stub/', ENDPOINT)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_lost_trial_is_replaced_after_reset_timeout(self):
+        breaker = self.open_breaker()
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        # The trial never reports back; the next one is granted after reset_timeout
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_other_thread_cannot_cancel_trial(self):
+        breaker = self.open_breaker()
+        self.assertTrue(breaker.allow())
+        thread = threading.Thread(target=breaker.cancel_trial)
+        thread.start()
+        thread.join()
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+
+    def test_half_open_sheds_until_reset_timeout(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=3600)
+        breaker.record_failure()
+        breaker._opened_at -= 3600
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+
+
+if __name__ == '__main__':
+    unittest.main()
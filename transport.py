@@ -0,0 +1,516 @@
+"""
+NetEase Cloud Music HTTP Transport
+
+This module provides the HTTP transport used by NetEaseClient:
+per-endpoint timeouts, jittered exponential retries for idempotent
+calls, per-endpoint rate limits and adaptive concurrency, a circuit
+breaker and a tunable connection pool.
+"""
+
+import logging
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger('NetEaseTransport')
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised when a request is shed because the circuit breaker is open."""
+
+
+class RateLimitedError(requests.RequestException):
+    """Raised when a request would wait too long for its rate or concurrency limit."""
+
+
+class EndpointPolicy:
+    """Timeout and retry settings for one endpoint."""
+
+    def __init__(self, connect_timeout: float = 5.0, read_timeout: float = 15.0,
+                 retries: int = 2, idempotent: bool = False,
+                 rate: Optional[float] = None, burst: int = 1, max_wait: float = 60.0):
+        """
+        Initialize the policy.
+
+        Args:
+            connect_timeout: Seconds to wait for the TCP/TLS connection
+            read_timeout: Seconds to wait between bytes of the response
+            retries: Extra attempts after the first one (idempotent only)
+            idempotent: Whether the call is safe to repeat
+            rate: Sustained requests per second allowed (None for no limit)
+            burst: Requests allowed back to back before the rate applies
+            max_wait: Longest a request may wait for its rate or
+                concurrency limit before it fails
+        """
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.idempotent = idempotent
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_wait = max_wait
+
+    @property
+    def timeout(self) -> tuple:
+        """Timeout tuple in the form requests expects."""
+        return (self.connect_timeout, self.read_timeout)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After failure_threshold consecutive failures the circuit opens and
+    requests are rejected without touching the network. Once
+    reset_timeout seconds have passed a single trial request is let
+    through; its outcome closes or re-opens the circuit. A trial that
+    never reports back is replaced by a new one after another
+    reset_timeout, so the circuit cannot stay half-open for good.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Initialize the breaker.
+
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds to stay open before a trial request
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        # When the circuit last opened, or its current trial started
+        self._opened_at = 0.0
+        # Thread that holds the current half-open trial
+        self._trial_owner: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+        Check whether a request may be sent.
+
+        Returns:
+            True if the request may proceed, False if it should be shed
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if now - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._opened_at = now
+                self._trial_owner = threading.get_ident()
+                return True
+            return False
+
+    def cancel_trial(self):
+        """Give back a half-open trial the calling thread will not send."""
+        with self._lock:
+            if self.state == self.HALF_OPEN and self._trial_owner == threading.get_ident():
+                self.state = self.OPEN
+                # Let the next request take the trial right away
+                self._opened_at = time.monotonic() - self.reset_timeout
+                self._trial_owner = None
+
+    def record_success(self):
+        """Record a successful request."""
+        with self._lock:
+            self._failures = 0
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        """Record a failed request."""
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning('Circuit breaker opened, shedding requests')
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter.
+
+    Tokens are reserved rather than polled for: a caller takes a token
+    immediately, letting the balance go negative, and sleeps for as long
+    as the bucket needs to earn it back. Waiting callers are therefore
+    released in arrival order at exactly the configured rate.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        Initialize the bucket.
+
+        Args:
+            rate: Tokens earned per second
+            burst: Bucket capacity
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait: Optional[float] = None) -> Optional[float]:
+        """
+        Reserve one token.
+
+        Args:
+            max_wait: Give up instead of reserving if the token would
+                take longer than this many seconds
+
+        Returns:
+            Seconds to wait before using the token, or None if it was not
+            reserved
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limiter.
+
+    Caps the number of requests in flight. Every request that completes
+    cleanly raises the limit by 1/limit (about +1 per limit's worth of
+    requests); an error, a throttling response or a latency far above the
+    observed baseline multiplies it by the decrease factor. Only requests
+    started after the last decrease can trigger the next one, so a burst
+    of failures from one overloaded round halves the limit once.
+    """
+
+    # A response this many times slower than the baseline counts as congestion
+    LATENCY_TOLERANCE = 2.0
+    # ... provided it is also at least this many seconds slower
+    LATENCY_MIN_EXCESS = 0.05
+
+    def __init__(self, initial: int = 4, min_limit: int = 1, max_limit: int = 64,
+                 decrease: float = 0.5):
+        """
+        Initialize the limiter.
+
+        Args:
+            initial: Starting concurrency limit
+            min_limit: Lowest limit a decrease can reach
+            max_limit: Highest limit an increase can reach
+            decrease: Factor applied to the limit on congestion
+        """
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(self.max_limit, max(self.min_limit, initial)))
+        self.decrease = decrease
+        self.in_flight = 0
+        self._baseline: Optional[float] = None
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout: Optional[float] = None) -> Optional[float]:
+        """
+        Wait for a free slot.
+
+        Args:
+            timeout: Maximum seconds to wait (None waits indefinitely)
+
+        Returns:
+            Start time to pass to release(), or None on timeout
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.in_flight < int(self.limit), timeout):
+                return None
+            self.in_flight += 1
+            return time.monotonic()
+
+    def release(self, started: float, ok: bool):
+        """
+        Free a slot and adapt the limit to the request's outcome.
+
+        Args:
+            started: Value returned by acquire()
+            ok: False if the request failed or was throttled
+        """
+        latency = time.monotonic() - started
+        with self._cond:
+            self.in_flight -= 1
+            if ok and self._baseline is not None:
+                congested = (latency > self._baseline * self.LATENCY_TOLERANCE
+                             and latency - self._baseline > self.LATENCY_MIN_EXCESS)
+            else:
+                congested = not ok
+            if ok:
+                # Track the uncongested latency, drifting up slowly
+                if self._baseline is None or latency < self._baseline:
+                    self._baseline = latency
+                else:
+                    self._baseline += (latency - self._baseline) * 0.01
+
+            if congested:
+                self._decrease(started)
+            elif self.in_flight + 1 >= int(self.limit):
+                # Only grow while the limit is actually being used
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def record_throttled(self):
+        """Shrink the limit after the server signalled throttling."""
+        with self._cond:
+            self._decrease(0.0)
+
+    def _decrease(self, started: float):
+        """Apply a multiplicative decrease. Caller must hold the lock."""
+        if started and started < self._last_decrease:
+            return
+        previous = self.limit
+        self.limit = max(self.min_limit, self.limit * self.decrease)
+        self._last_decrease = time.monotonic()
+        if int(self.limit) != int(previous):
+            logger.info(f'Concurrency limit lowered to {int(self.limit)}')
+
+
+class Transport:
+    """HTTP transport with timeouts, retries, rate limits and circuit breaking."""
+
+    # Response statuses worth retrying on an idempotent call
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+    DEFAULT_POLICIES = {
+        '/nuser/account/get': EndpointPolicy(read_timeout=10.0, idempotent=True),
+        '/discover': EndpointPolicy(read_timeout=15.0, idempotent=True, rate=5.0, burst=10),
+        '/login/qrcode/client/login': EndpointPolicy(read_timeout=10.0, idempotent=True),
+        '/login/qrcode/unikey': EndpointPolicy(read_timeout=10.0),
+        '/point/dailyTask': EndpointPolicy(read_timeout=15.0, rate=5.0, burst=10),
+    }
+
+    def __init__(self, policies: Optional[Dict[str, EndpointPolicy]] = None,
+                 default_policy: Optional[EndpointPolicy] = None,
+                 pool_connections: int = 10, pool_maxsize: int = 10,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 breaker: Optional[CircuitBreaker] = None,
+                 max_concurrency: Optional[int] = None):
+        """
+        Initialize the transport.
+
+        Args:
+            policies: Per-endpoint policies overriding DEFAULT_POLICIES
+            default_policy: Policy for endpoints without an entry
+            pool_connections: Number of host pools kept by the HTTP adapter
+            pool_maxsize: Maximum connections kept per host pool
+            backoff_base: Base delay in seconds for retry backoff
+            backoff_max: Maximum delay in seconds between retries
+            breaker: Circuit breaker (a new one is created if omitted)
+            max_concurrency: Upper bound of each endpoint's adaptive
+                concurrency limit (defaults to pool_maxsize; 0 disables
+                adaptive concurrency)
+        """
+        self.policies = dict(self.DEFAULT_POLICIES)
+        self.policies.update(policies or {})
+        self.default_policy = default_policy or EndpointPolicy()
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.max_concurrency = pool_maxsize if max_concurrency is None else max_concurrency
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._limiters: Dict[str, AdaptiveLimiter] = {}
+        self._lock = threading.Lock()
+
+    def mount(self, session: requests.Session):
+        """
+        Route a session's connections through this transport's pool.
+
+        Args:
+            session: Session to mount the adapter on
+        """
+        session.mount('https://', self.adapter)
+        session.mount('http://', self.adapter)
+
+    def policy_for(self, endpoint: str) -> EndpointPolicy:
+        """
+        Get the policy for an endpoint.
+
+        Args:
+            endpoint: API endpoint path, e.g. '/point/dailyTask'
+
+        Returns:
+            Matching endpoint policy
+        """
+        return self.policies.get(endpoint, self.default_policy)
+
+    def bucket_for(self, endpoint: str) -> Optional[TokenBucket]:
+        """
+        Get the endpoint's token bucket, creating it on first use.
+
+        Args:
+            endpoint: API endpoint path
+
+        Returns:
+            Token bucket, or None if the endpoint has no rate limit
+        """
+        bucket = self._buckets.get(endpoint)
+        if bucket is None:
+            policy = self.policy_for(endpoint)
+            if policy.rate is None:
+                return None
+            with self._lock:
+                bucket = self._buckets.setdefault(endpoint, TokenBucket(policy.rate, policy.burst))
+        return bucket
+
+    def limiter_for(self, endpoint: str) -> Optional[AdaptiveLimiter]:
+        """
+        Get the endpoint's concurrency limiter, creating it on first use.
+
+        Args:
+            endpoint: API endpoint path
+
+        Returns:
+            Limiter, or None if adaptive concurrency is disabled
+        """
+        if not self.max_concurrency:
+            return None
+        limiter = self._limiters.get(endpoint)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.setdefault(endpoint, AdaptiveLimiter(
+                    initial=max(1, self.max_concurrency // 2),
+                    max_limit=self.max_concurrency
+                ))
+        return limiter
+
+    def record_throttled(self, endpoint: str):
+        """
+        Report an application-level throttling response for an endpoint.
+
+        Args:
+            endpoint: API endpoint path
+        """
+        limiter = self.limiter_for(endpoint)
+        if limiter is not None:
+            limiter.record_throttled()
+
+    def stats(self) -> Dict[str, dict]:
+        """
+        Get the current concurrency limit of every endpoint used so far.
+
+        Returns:
+            Mapping of endpoint to its limit and requests in flight
+        """
+        with self._lock:
+            limiters = dict(self._limiters)
+        return {
+            endpoint: {'limit': int(limiter.limit), 'in_flight': limiter.in_flight}
+            for endpoint, limiter in limiters.items()
+        }
+
+    def _admit(self, endpoint: str, policy: EndpointPolicy,
+               limiter: Optional[AdaptiveLimiter]) -> Optional[float]:
+        """
+        Wait for the endpoint's rate and concurrency limits.
+
+        Returns:
+            Limiter start time, or None without a limiter
+
+        Raises:
+            RateLimitedError: If either limit would take longer than
+                policy.max_wait
+        """
+        deadline = time.monotonic() + policy.max_wait
+        bucket = self.bucket_for(endpoint)
+        if bucket is not None:
+            wait = bucket.reserve(policy.max_wait)
+            if wait is None:
+                raise RateLimitedError(f'Rate limit for {endpoint} exceeded')
+            if wait:
+                time.sleep(wait)
+        if limiter is None:
+            return None
+        started = limiter.acquire(max(0.0, deadline - time.monotonic()))
+        if started is None:
+            raise RateLimitedError(f'Concurrency limit for {endpoint} exceeded')
+        return started
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff delay for a retry attempt."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(self, session: requests.Session, method: str, url: str,
+                endpoint: str, **kwargs) -> requests.Response:
+        """
+        Send a request according to the endpoint's policy.
+
+        Args:
+            session: Session carrying the account's cookies
+            method: HTTP method
+            url: Full request URL
+            endpoint: API endpoint path used to look up the policy
+            **kwargs: Extra arguments for session.request
+
+        Returns:
+            Response of the last attempt
+
+        Raises:
+            CircuitOpenError: If the circuit breaker is open
+            RateLimitedError: If the endpoint's limits were not met in time
+            requests.RequestException: If the last attempt failed
+        """
+        policy = self.policy_for(endpoint)
+        limiter = self.limiter_for(endpoint)
+        attempts = 1 + (policy.retries if policy.idempotent else 0)
+        kwargs.setdefault('timeout', policy.timeout)
+
+        for attempt in range(attempts):
+            # Shed before waiting, so an open circuit costs no rate tokens
+            # or concurrency slots
+            if not self.breaker.allow():
+                raise CircuitOpenError(f'Circuit open, request to {endpoint} shed')
+            try:
+                started = self._admit(endpoint, policy, limiter)
+            except RateLimitedError:
+                # Never sent: hand a half-open trial to the next request
+                self.breaker.cancel_trial()
+                raise
+
+            last_attempt = attempt == attempts - 1
+            ok = False
+            try:
+                try:
+                    response = session.request(method, url, **kwargs)
+                except Exception:
+                    # Any failure must still settle a half-open trial
+                    self.breaker.record_failure()
+                    raise
+                if response.status_code >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                ok = response.status_code < 500 and response.status_code != 429
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if last_attempt:
+                    raise
+                logger.warning(f'Request to {endpoint} failed ({e}), retrying')
+            else:
+                if last_attempt or response.status_code not in self.RETRY_STATUSES:
+                    return response
+                logger.warning(f'Request to {endpoint} returned {response.status_code}, retrying')
+            finally:
+                # Free the concurrency slot on every exit path
+                if started is not None:
+                    limiter.release(started, ok=ok)
+
+            time.sleep(self._backoff(attempt))